@@ -0,0 +1,260 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import array
+import time
+import typing
+import numpy as np
+import HackFile
+from Emulator import A_INSTRUCTION, JUMP, RAM_SIZE, decode
+
+
+class BatchEmulator:
+    """Runs many instances of the Hack machine in lockstep over a single
+    ROM. Each instance has its own registers and RAM, kept as NumPy arrays
+    with one element, or one row, per instance.
+
+    Instances at the same address run each instruction together, as one
+    vector operation. When a jump sends them different ways the group
+    splits, and the group at the lowest address runs first, so instances
+    that left a loop early wait for the others at its exit and continue
+    together from there. Instances are masked off once they halt, reach
+    run_until's address or use up their cycle budget.
+
+    An instance halts when it reaches a program's final loop, an
+    A-instruction that loads its own address followed by an unconditional
+    jump that stores nothing. It stops before running that loop, so a
+    halted instance's state is what Emulator.run_until would leave at the
+    same address.
+    """
+
+    def __init__(self, instances: int, path: typing.Optional[str] = None,
+                 ram_size: int = RAM_SIZE) -> None:
+        """Creates the instances, with cleared memories.
+
+        Args:
+            instances (int): number of machine instances.
+            path (typing.Optional[str]): if given, a machine code file to
+                load into ROM.
+            ram_size (int): words of RAM per instance. Smaller RAMs let more
+                instances fit in memory; running code that accesses an
+                address past the end raises IndexError.
+        """
+        self.instances = instances
+        self.rom = array.array('H', bytes(2 * HackFile.ROM_SIZE))
+        self.program = [decode(0)] * HackFile.ROM_SIZE
+        self.program_size = 0
+        self.halts = np.zeros(HackFile.ROM_SIZE, dtype=bool)
+        self.ram = np.zeros((instances, ram_size), dtype=np.uint16)
+        self.a = np.zeros(instances, dtype=np.uint16)
+        self.d = np.zeros(instances, dtype=np.uint16)
+        self.pc = np.zeros(instances, dtype=np.int64)
+        self.cycles = np.zeros(instances, dtype=np.int64)
+        self.rows = np.arange(instances)
+        if path is not None:
+            self.load(path)
+
+    def load(self, path: str) -> None:
+        """Loads a machine code file into ROM, clears the rest of ROM, and
+        resets all instances.
+
+        Args:
+            path (str): path of a .hack file, text or packed binary.
+        """
+        self.rom[:] = array.array('H', bytes(2 * HackFile.ROM_SIZE))
+        self.program_size = HackFile.load_into(path, self.rom)
+        self.decode_rom()
+        self.reset()
+
+    def load_words(self, words: typing.Sequence[int]) -> None:
+        """Loads machine code held in memory into ROM, clears the rest of
+        ROM, and resets all instances.
+
+        Args:
+            words (typing.Sequence[int]): the instruction words.
+        """
+        if len(words) > HackFile.ROM_SIZE:
+            raise ValueError("program does not fit in memory")
+        self.rom[:] = array.array('H', bytes(2 * HackFile.ROM_SIZE))
+        self.rom[:len(words)] = array.array('H', words)
+        self.program_size = len(words)
+        self.decode_rom()
+        self.reset()
+
+    def decode_rom(self) -> None:
+        """Decodes every ROM word into `program`, and finds the addresses
+        where instances halt.
+        """
+        self.program = [decode(word) for word in self.rom]
+        self.halts[:] = False
+        for address in range(HackFile.ROM_SIZE - 1):
+            loop = self.program[address + 1]
+            if (self.rom[address] == address and loop.handler == JUMP
+                    and loop.jeq and loop.jlt and loop.jgt
+                    and not (loop.writes_m or loop.writes_a
+                             or loop.writes_d)):
+                self.halts[address] = True
+
+    def reset(self) -> None:
+        """Restarts the program on all instances. As with the hardware's
+        reset input, only PC changes.
+        """
+        self.pc[:] = 0
+
+    @property
+    def halted(self) -> np.ndarray:
+        """np.ndarray: for each instance, whether it has halted."""
+        return self.halts[self.pc]
+
+    def run(self, cycles: int) -> int:
+        """Runs every instance for the given number of instructions, or
+        until it halts.
+
+        Args:
+            cycles (int): number of instructions to run per instance.
+
+        Returns:
+            int: the number of instructions run, over all instances.
+        """
+        return self._run(cycles, -1)
+
+    def run_until(self, pc: int, max_cycles: int = -1) -> int:
+        """Runs every instance until its PC reaches the given address, or
+        until it halts.
+
+        Args:
+            pc (int): the address to stop at, before running it.
+            max_cycles (int): if not negative, stop each instance after
+                this many instructions even if the address was not reached.
+
+        Returns:
+            int: the number of instructions run, over all instances.
+        """
+        return self._run(max_cycles, pc)
+
+    def _run(self, cycles: int, stop_pc: int) -> int:
+        """The scheduling loop behind run and run_until.
+
+        Args:
+            cycles (int): stop each instance after this many instructions,
+                never if negative.
+            stop_pc (int): stop each instance when its PC reaches this
+                address, never if negative.
+
+        Returns:
+            int: the number of instructions run, over all instances.
+        """
+        program, ram, a, d, pc = self.program, self.ram, self.a, self.d, \
+            self.pc
+        stops = self.halts.copy()
+        if stop_pc >= 0:
+            stops[stop_pc] = True
+        limit = self.cycles + cycles if cycles >= 0 else None
+        executed = 0
+        while True:
+            running = ~stops[pc]
+            if limit is not None:
+                running &= self.cycles < limit
+            if not running.any():
+                break
+            # Run the group at the lowest address, until it jumps or
+            # reaches an address where other instances wait to join it
+            current = int(pc[running].min())
+            in_group = running & (pc == current)
+            members = np.flatnonzero(in_group)
+            waiting = np.zeros(HackFile.ROM_SIZE, dtype=bool)
+            waiting[pc[running & ~in_group]] = True
+            if members.size == self.instances:
+                group, rows = slice(None), self.rows
+            else:
+                group, rows = members, members
+            budget = -1 if limit is None else int(
+                (limit[members] - self.cycles[members]).min())
+
+            steps = 0
+            while True:
+                decoded = program[current]
+                steps += 1
+                if decoded.handler == A_INSTRUCTION:
+                    a[group] = decoded.value
+                    current = (current + 1) & 0x7FFF
+                else:
+                    address = a[group] & 0x7FFF
+                    out = decoded.function(
+                        d[group], ram[rows, address] if decoded.reads_m
+                        else a[group])
+                    if decoded.writes_m:
+                        ram[rows, address] = out
+                    if decoded.writes_d:
+                        d[group] = out
+                    if decoded.writes_a:
+                        a[group] = out
+                    if decoded.handler == JUMP:
+                        if decoded.jeq and decoded.jlt and decoded.jgt:
+                            pc[group] = address
+                        else:
+                            negative = out >= 0x8000
+                            zero = out == 0
+                            taken = ((decoded.jeq & zero)
+                                     | (decoded.jlt & negative)
+                                     | (decoded.jgt & ~(zero | negative)))
+                            pc[group] = np.where(
+                                taken, address, (current + 1) & 0x7FFF)
+                        break
+                    current = (current + 1) & 0x7FFF
+                if steps == budget or stops[current] or waiting[current]:
+                    pc[group] = current
+                    break
+            self.cycles[group] += steps
+            executed += steps * members.size
+        return executed
+
+
+if "__main__" == __name__:
+    argument_parser = argparse.ArgumentParser(
+        prog="BatchEmulator",
+        description="Runs a program on many RAM inputs at once.")
+    argument_parser.add_argument("path", help="a .hack or .hackbin file")
+    argument_parser.add_argument(
+        "--instances", type=int, default=1000, metavar="N",
+        help="number of instances (default 1000)")
+    argument_parser.add_argument(
+        "--random", action="append", default=[], metavar="ADDRESS=LOW-HIGH",
+        help="fill a RAM word of every instance with a random value from "
+             "LOW to HIGH, inclusive (may be repeated)")
+    argument_parser.add_argument("--seed", type=int, default=0)
+    argument_parser.add_argument(
+        "--cycles", type=int, default=-1, metavar="N",
+        help="stop each instance after N instructions")
+    argument_parser.add_argument(
+        "--until", type=int, default=-1, metavar="PC",
+        help="stop each instance when its PC reaches this address")
+    argument_parser.add_argument(
+        "--ram", default="0-15", metavar="FIRST-LAST",
+        help="range of RAM words to print for the first instances")
+    arguments = argument_parser.parse_args()
+
+    batch = BatchEmulator(arguments.instances, arguments.path)
+    generator = np.random.default_rng(arguments.seed)
+    for assignment in arguments.random:
+        ram_address, bounds = assignment.split("=")
+        low, high = bounds.split("-")
+        batch.ram[:, int(ram_address)] = generator.integers(
+            int(low), int(high), endpoint=True, size=arguments.instances)
+    start = time.perf_counter()
+    total = batch.run_until(arguments.until, arguments.cycles)
+    elapsed = time.perf_counter() - start
+
+    first, last = (int(bound) for bound in arguments.ram.split("-"))
+    for instance in range(min(arguments.instances, 5)):
+        print(f"#{instance}: PC={batch.pc[instance]} "
+              f"cycles={batch.cycles[instance]} RAM[{first}-{last}]="
+              f"{batch.ram[instance, first:last + 1].tolist()}")
+    print(f"{int(batch.halted.sum())} of {arguments.instances} halted, "
+          f"{total} instructions in {elapsed:.3f}s "
+          f"({total / max(elapsed, 1e-9):,.0f} instr/s)")
@@ -0,0 +1,582 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import array
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import typing
+import HackFile
+from Code import Code
+from HackAssembler import assemble_file, assemble_parallel, assemble_parsed
+from Parser import Parser, parse_path
+from SymbolTable import SymbolTable
+
+# Comp mnemonics of the regular ALU and of the shift extension
+COMPS = ["0", "1", "-1", "D", "A", "M", "!D", "!M", "-D", "-M", "D+1",
+         "M+1", "D-1", "M-1", "D+A", "D+M", "D-A", "D-M", "A-D", "M-D",
+         "D&A", "D&M", "D|A", "D|M", "D<<", "M>>"]
+DESTS = ["", "M", "D", "MD", "A", "AM", "AD", "AMD"]
+JUMPS = ["", "JGT", "JEQ", "JGE", "JLT", "JNE", "JLE", "JMP"]
+
+# Number of distinct variables in the variable-heavy workload; fits in RAM
+# between address 16 and the screen
+VARIABLE_COUNT = 16000
+
+
+def generate_lines(lines: int, seed: int = 0) -> typing.Iterator[str]:
+    """Lazily generates the lines of a synthetic assembly program with a
+    general mix of commands, so even huge programs can be written out
+    without holding them in memory.
+
+    Args:
+        lines (int): number of source lines to generate.
+        seed (int): seed for the random generator, so runs are repeatable.
+
+    Returns:
+        typing.Iterator[str]: the program's lines, without line breaks.
+    """
+    rng = random.Random(seed)
+    c_commands = ["M=D", "D=M", "AM=M-1", "A=M-1", "M=M+1", "D=D+A",
+                  "D;JNE", "0;JMP", "D=M-D", "M=-1", "D = D>>"]
+    label_count = 0
+    for _ in range(lines):
+        roll = rng.random()
+        if roll < 0.05:
+            yield f"(LABEL_{label_count})"
+            label_count += 1
+        elif roll < 0.10:
+            yield "// a comment line"
+        elif roll < 0.45:
+            yield f"@{rng.choice(['SP', 'LCL', 'R13', 'var', '17'])}"
+        else:
+            yield f"    {rng.choice(c_commands)}  // trailing"
+
+
+def generate_labels(lines: int, seed: int = 0) -> typing.Iterator[str]:
+    """Label-heavy workload: many distinct labels, each jumped to from a
+    random earlier or later place.
+    """
+    rng = random.Random(seed)
+    label_total = max(1, lines // 4)
+    label_count = 0
+    emitted = 0
+    while emitted < lines:
+        yield f"(L{label_count})"
+        yield f"@L{rng.randrange(label_total)}"
+        yield "D;JNE"
+        yield "D=D-1"
+        label_count += 1
+        emitted += 4
+
+
+def generate_variables(lines: int, seed: int = 0) -> typing.Iterator[str]:
+    """Variable-heavy workload: A-commands on many distinct variables."""
+    rng = random.Random(seed)
+    for line in range(lines):
+        if line % 2:
+            yield rng.choice(["M=D", "D=M", "M=M+1"])
+        else:
+            yield f"@v{rng.randrange(VARIABLE_COUNT)}"
+
+
+def generate_c_commands(lines: int, seed: int = 0) -> typing.Iterator[str]:
+    """C-instruction-heavy workload: every dest/comp/jump combination."""
+    rng = random.Random(seed)
+    for _ in range(lines):
+        dest, comp, jump = (rng.choice(DESTS), rng.choice(COMPS),
+                            rng.choice(JUMPS))
+        yield (f"{dest}=" if dest else "") + comp + (f";{jump}" if jump
+                                                     else "")
+
+
+def generate_vm(lines: int, seed: int = 0) -> typing.Iterator[str]:
+    """Realistic workload: the code 08/CodeWriter.py writes for a random mix
+    of VM commands, including its comments, calls and returns.
+    """
+    rng = random.Random(seed)
+    segments = {"local": "LCL", "argument": "ARG", "this": "THIS",
+                "that": "THAT"}
+    push_d = ["@SP", "A=M", "M=D", "@SP", "M=M+1"]
+    pop_d = ["@SP", "AM=M-1", "D=M"]
+    emitted = 0
+    counter = 0
+    while emitted < lines:
+        counter += 1
+        roll = rng.random()
+        if roll < 0.3:
+            index = rng.randrange(8)
+            output = [f"// C_PUSH constant {index}", f"@{index}", "D=A"]
+            output += push_d
+        elif roll < 0.5:
+            segment = rng.choice(list(segments))
+            index = rng.randrange(8)
+            output = [f"// C_PUSH {segment} {index}",
+                      f"@{segments[segment]}", "D=M", f"@{index}", "A=D+A",
+                      "D=M"] + push_d
+        elif roll < 0.65:
+            segment = rng.choice(list(segments))
+            index = rng.randrange(8)
+            output = [f"// C_POP {segment} {index}",
+                      f"@{segments[segment]}", "D=M", f"@{index}", "D=D+A",
+                      "@R13", "M=D"] + pop_d + ["@R13", "A=M", "M=D"]
+        elif roll < 0.8:
+            output = ["// add"] + pop_d + ["@SP", "A=M-1", "M=D+M"]
+        elif roll < 0.9:
+            output = ["// lt"] + pop_d + [
+                "@SP", "A=M-1", "D=M-D", f"@LABEL_TRUE_{counter}", "D;JLT",
+                "@SP", "A=M-1", "M=0", f"@LABEL_END_{counter}", "0;JMP",
+                f"(LABEL_TRUE_{counter})", "@SP", "A=M-1", "M=-1",
+                f"(LABEL_END_{counter})"]
+        else:
+            output = [f"// call Main.f{counter % 50} 1",
+                      f"@RETURN_{counter}", "D=A"] + push_d
+            for pointer in ["LCL", "ARG", "THIS", "THAT"]:
+                output += [f"@{pointer}", "D=M"] + push_d
+            output += ["@SP", "D=M", "@5", "D=D-A", "@1", "D=D-A", "@ARG",
+                       "M=D", "@SP", "D=M", "@LCL", "M=D",
+                       f"@Main.f{counter % 50}", "0;JMP",
+                       f"(RETURN_{counter})"]
+        yield from output
+        emitted += len(output)
+    for function in range(50):
+        yield f"(Main.f{function})"
+        yield from ["@LCL", "D=M", "@R13", "M=D", "@R14", "A=M", "0;JMP"]
+
+
+# All workloads, by name
+WORKLOADS = {
+    "mixed": generate_lines,
+    "labels": generate_labels,
+    "variables": generate_variables,
+    "c_commands": generate_c_commands,
+    "vm": generate_vm,
+}
+
+
+def generate_program(lines: int, seed: int = 0,
+                     workload: str = "mixed") -> str:
+    """Generates a synthetic assembly program.
+
+    Args:
+        lines (int): number of source lines to generate.
+        seed (int): seed for the random generator, so runs are repeatable.
+        workload (str): which generator to use, one of WORKLOADS.
+
+    Returns:
+        str: the program's source code.
+    """
+    return "\n".join(WORKLOADS[workload](lines, seed)) + "\n"
+
+
+def stage_parse(source: str, parser: Parser,
+                words: array.array) -> None:
+    """Parser: decode the whole source."""
+    Parser(io.StringIO(source))
+
+
+def stage_symbols(source: str, parser: Parser,
+                  words: array.array) -> None:
+    """SymbolTable: collect labels, then resolve every A-command symbol."""
+    symbol_table = SymbolTable()
+    address = 0
+    for instruction in parser.instructions:
+        if instruction.kind == "L_COMMAND":
+            symbol_table.add_entry(instruction.symbol, address)
+        else:
+            address += 1
+    next_var_address = 16
+    for instruction in parser.instructions:
+        if instruction.kind == "A_COMMAND":
+            symbol = instruction.symbol
+            if not symbol.isdigit() and not symbol_table.contains(symbol):
+                symbol_table.add_entry(symbol, next_var_address)
+                next_var_address += 1
+
+
+def stage_encode(source: str, parser: Parser,
+                 words: array.array) -> None:
+    """Code: encode every C-command, starting from a cold memo cache."""
+    Code.encode.cache_clear()
+    for instruction in parser.instructions:
+        if instruction.kind == "C_COMMAND":
+            Code.encode(instruction.dest, instruction.comp, instruction.jump)
+
+
+def stage_write(source: str, parser: Parser,
+                words: array.array) -> None:
+    """Output: write the finished words as .hack text."""
+    HackFile.write_text(words, io.StringIO())
+
+
+def stage_total(source: str, parser: Parser,
+                words: array.array) -> None:
+    """Everything, from source text to .hack text."""
+    words, _ = assemble_parsed(Parser(io.StringIO(source)))
+    HackFile.write_text(words, io.StringIO())
+
+
+# All stages, by name
+STAGES = {
+    "parse": stage_parse,
+    "symbols": stage_symbols,
+    "encode": stage_encode,
+    "write": stage_write,
+    "total": stage_total,
+}
+
+
+def measure(stage: typing.Callable[[str, Parser, array.array], None],
+            source: str, parser: Parser, words: array.array,
+            repeat: int) -> typing.Tuple[float, int]:
+    """Times one stage and measures its peak memory. Memory is traced in a
+    separate run, so tracing does not distort the timing.
+
+    Args:
+        stage (typing.Callable[[str, Parser, array.array], None]): the
+            stage to run.
+        source (str): the program's source code.
+        parser (Parser): the already parsed program.
+        words (array.array): the already assembled program.
+        repeat (int): how many timed runs to take the best of.
+
+    Returns:
+        typing.Tuple[float, int]: the best time in seconds, and the peak
+        memory allocated by the stage in bytes.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        stage(source, parser, words)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    stage(source, parser, words)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def run_suite(lines: int, seed: int, repeat: int,
+              workloads: typing.Iterable[str]) -> typing.Dict[str, dict]:
+    """Runs every stage on every given workload.
+
+    Args:
+        lines (int): number of source lines per workload.
+        seed (int): seed for the generators.
+        repeat (int): how many timed runs to take the best of.
+        workloads (typing.Iterable[str]): names of the workloads to run.
+
+    Returns:
+        typing.Dict[str, dict]: the results, keyed "workload/stage", each
+        with its instruction count, seconds, instructions per second and
+        peak memory in bytes.
+    """
+    results = {}
+    for workload in workloads:
+        source = generate_program(lines, seed, workload)
+        parser = Parser(io.StringIO(source))
+        words, _ = assemble_parsed(parser)
+        instructions = len(words)
+        for name, stage in STAGES.items():
+            seconds, peak = measure(stage, source, parser, words, repeat)
+            results[f"{workload}/{name}"] = {
+                "instructions": instructions,
+                "seconds": seconds,
+                "instructions_per_second": instructions / seconds,
+                "peak_bytes": peak,
+            }
+    return results
+
+
+def compare(results: typing.Dict[str, dict],
+            baseline: typing.Dict[str, dict],
+            tolerance: float) -> typing.List[str]:
+    """Compares results against a saved baseline.
+
+    Args:
+        results (typing.Dict[str, dict]): fresh results from run_suite.
+        baseline (typing.Dict[str, dict]): saved results from run_suite.
+        tolerance (float): the allowed relative slowdown or memory growth,
+            e.g. 0.2 for 20%.
+
+    Returns:
+        typing.List[str]: a description of every regression found.
+    """
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        before = baseline[key]
+        speed = (result["instructions_per_second"]
+                 / before["instructions_per_second"])
+        if speed < 1 - tolerance:
+            regressions.append(f"{key}: {speed:.0%} of baseline throughput")
+        if result["peak_bytes"] > before["peak_bytes"] * (1 + tolerance):
+            regressions.append(
+                f"{key}: peak memory {result['peak_bytes']} bytes, "
+                f"baseline {before['peak_bytes']} bytes")
+    return regressions
+
+
+def streaming_peak_rss(lines: int) -> float:
+    """Assembles a generated program of the given size with the streaming
+    assembler in a fresh process, and measures that process's peak memory.
+
+    Args:
+        lines (int): number of source lines to generate.
+
+    Returns:
+        float: the peak resident set size of the assembler, in megabytes.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, "Huge.asm")
+        with open(input_path, 'w') as input_file:
+            for line in generate_lines(lines):
+                input_file.write(line + "\n")
+        subprocess.run(
+            [sys.executable, "Main.py", "--stream", input_path],
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+    # ru_maxrss is in kilobytes on Linux, and covers only the child here
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+
+def parallel_speedup(lines: int, jobs: int, seed: int = 0,
+                     workload: str = "mixed") -> typing.Tuple[float, float]:
+    """Assembles a generated program serially and with assemble_parallel,
+    and checks that both give the same output.
+
+    Args:
+        lines (int): number of source lines to generate.
+        jobs (int): number of worker processes for assemble_parallel.
+        seed (int): seed for the generator.
+        workload (str): which generator to use, one of WORKLOADS.
+
+    Returns:
+        typing.Tuple[float, float]: the serial and parallel times in seconds.
+    """
+    source = generate_program(lines, seed, workload)
+    serial_output, parallel_output = io.StringIO(), io.StringIO()
+    start = time.perf_counter()
+    assemble_file(io.StringIO(source), serial_output)
+    serial = time.perf_counter() - start
+    start = time.perf_counter()
+    assemble_parallel(io.StringIO(source), parallel_output, jobs=jobs)
+    parallel = time.perf_counter() - start
+    if serial_output.getvalue() != parallel_output.getvalue():
+        raise AssertionError("parallel output differs from serial output")
+    return serial, parallel
+
+
+def input_speeds(megabytes: float, seed: int = 0, workload: str = "vm",
+                 newline: str = "\n") -> typing.Tuple[float, float]:
+    """Parses a generated file of the given size both by decoding it as text
+    and through the memory-mapped bytes path, and checks that both give the
+    same records.
+
+    Args:
+        megabytes (float): size of the generated file.
+        seed (int): seed for the generator.
+        workload (str): which generator to use, one of WORKLOADS.
+        newline (str): the line ending the file is written with, "\n",
+            "\r\n" or "\r".
+
+    Returns:
+        typing.Tuple[float, float]: the text and bytes parse times in
+        seconds.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, "Huge.asm")
+        with open(input_path, 'w', newline=newline) as input_file:
+            # Generate in batches until the file is big enough
+            batch = 0
+            while input_file.tell() < megabytes * 1024 * 1024:
+                for line in WORKLOADS[workload](100000, seed + batch):
+                    input_file.write(line + "\n")
+                batch += 1
+        start = time.perf_counter()
+        with open(input_path, 'r') as input_file:
+            text_parser = Parser(input_file)
+        text = time.perf_counter() - start
+        start = time.perf_counter()
+        bytes_parser = parse_path(input_path)
+        mapped = time.perf_counter() - start
+    if (text_parser.instructions != bytes_parser.instructions
+            or text_parser.line_numbers != bytes_parser.line_numbers):
+        raise AssertionError("bytes parser differs from text parser")
+    return text, mapped
+
+
+def load_parser(revision: str) -> type:
+    """
+    Args:
+        revision (str): a git revision, e.g. "HEAD~3".
+
+    Returns:
+        type: the Parser class of this directory's Parser.py as it was at
+        that revision, for measuring changes against.
+    """
+    source = subprocess.run(
+        ["git", "show", f"{revision}:./Parser.py"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True).stdout
+    namespace: typing.Dict[str, typing.Any] = {"__name__": "BaselineParser"}
+    exec(compile(source, f"{revision}:Parser.py", "exec"), namespace)
+    return namespace["Parser"]
+
+
+def walk_commands(parser_class: type, source: str) -> float:
+    """Parses the source and reads every field of every command through the
+    command-at-a-time interface, which every version of Parser has.
+
+    Args:
+        parser_class (type): the Parser class to use.
+        source (str): the program to parse.
+
+    Returns:
+        float: the time taken, in seconds.
+    """
+    start = time.perf_counter()
+    parser = parser_class(io.StringIO(source))
+    while parser.has_more_commands():
+        if parser.command_type() == "C_COMMAND":
+            parser.dest(), parser.comp(), parser.jump()
+        else:
+            parser.symbol()
+        parser.advance()
+    return time.perf_counter() - start
+
+
+def parser_speeds(lines: int, seed: int, revision: str,
+                  repeat: int) -> typing.Tuple[float, float]:
+    """Compares the parser against its version at a git revision.
+
+    Args:
+        lines (int): number of source lines to generate.
+        seed (int): seed for the generator.
+        revision (str): the git revision of the baseline parser.
+        repeat (int): how many timed runs to take the best of.
+
+    Returns:
+        typing.Tuple[float, float]: the lines per second of the baseline
+        parser and of the current one.
+    """
+    source = generate_program(lines, seed)
+    speeds = []
+    for parser_class in (load_parser(revision), Parser):
+        seconds = min(walk_commands(parser_class, source)
+                      for _ in range(repeat))
+        speeds.append(lines / seconds)
+    return speeds[0], speeds[1]
+
+
+if "__main__" == __name__:
+    argument_parser = argparse.ArgumentParser(
+        description="Assembler throughput benchmarks. Runs the stage suite "
+                    "unless one of the \"instead\" options is given.")
+    argument_parser.add_argument(
+        "--lines", type=int, default=200000,
+        help="source lines per generated workload")
+    argument_parser.add_argument("--seed", type=int, default=0)
+    argument_parser.add_argument(
+        "--repeat", type=int, default=3,
+        help="timed runs per stage, the best one counts")
+    argument_parser.add_argument(
+        "--workload", action="append", choices=list(WORKLOADS),
+        help="run only the given workload (may be repeated)")
+    argument_parser.add_argument(
+        "--save", metavar="FILE", help="save the results as a JSON baseline")
+    argument_parser.add_argument(
+        "--compare", metavar="FILE",
+        help="compare against a JSON baseline and fail on regressions")
+    argument_parser.add_argument(
+        "--tolerance", type=float, default=0.2,
+        help="allowed relative regression when comparing (default 0.2)")
+    argument_parser.add_argument(
+        "--stream-rss", type=float, metavar="MB",
+        help="instead, check that the streaming assembler stays within "
+             "this peak RSS on a --lines sized input")
+    argument_parser.add_argument(
+        "--parallel", type=int, metavar="JOBS",
+        help="instead, compare assemble_parallel on JOBS workers against "
+             "the serial assembler on a --lines sized mixed workload")
+    argument_parser.add_argument(
+        "--input-mb", type=float, metavar="MB",
+        help="instead, compare the text and memory-mapped input paths on "
+             "generated files of this size, with each line ending")
+    argument_parser.add_argument(
+        "--parser-baseline", metavar="REVISION",
+        help="instead, compare the parser against Parser.py at this git "
+             "revision on a --lines sized mixed workload")
+    arguments = argument_parser.parse_args()
+
+    if arguments.parser_baseline is not None:
+        baseline_speed, current_speed = parser_speeds(
+            arguments.lines, arguments.seed, arguments.parser_baseline,
+            arguments.repeat)
+        print(f"parser: {arguments.parser_baseline} {baseline_speed:,.0f} "
+              f"lines/s, now {current_speed:,.0f} lines/s "
+              f"({current_speed / baseline_speed:.2f}x, "
+              f"{arguments.lines:,} lines)")
+        sys.exit(0)
+
+    if arguments.input_mb is not None:
+        # Every line ending, so the two paths are checked to split lines
+        # the same way
+        for line_ending in ("\n", "\r\n", "\r"):
+            text_time, bytes_time = input_speeds(
+                arguments.input_mb, arguments.seed, newline=line_ending)
+            print(f"{line_ending!r:6} text "
+                  f"{arguments.input_mb / text_time:.1f} MB/s, mmap "
+                  f"{arguments.input_mb / bytes_time:.1f} MB/s "
+                  f"({text_time / bytes_time:.2f}x, identical records)")
+        sys.exit(0)
+
+    if arguments.parallel is not None:
+        serial_time, parallel_time = parallel_speedup(
+            arguments.lines, arguments.parallel, arguments.seed)
+        print(f"serial {serial_time:.2f}s, parallel {parallel_time:.2f}s "
+              f"on {arguments.parallel} workers "
+              f"({serial_time / parallel_time:.2f}x, {arguments.lines:,} "
+              f"lines, identical output)")
+        sys.exit(0)
+
+    if arguments.stream_rss is not None:
+        peak_rss = streaming_peak_rss(arguments.lines)
+        print(f"streaming assembler: {peak_rss:.1f} MB peak RSS "
+              f"({arguments.lines:,} lines, budget "
+              f"{arguments.stream_rss:.0f} MB)")
+        if peak_rss > arguments.stream_rss:
+            sys.exit("streaming assembler exceeded its memory budget")
+        sys.exit(0)
+
+    suite_results = run_suite(arguments.lines, arguments.seed,
+                              arguments.repeat,
+                              arguments.workload or list(WORKLOADS))
+    for result_key, suite_result in suite_results.items():
+        print(f"{result_key:22} "
+              f"{suite_result['instructions_per_second']:>14,.0f} instr/s "
+              f"{suite_result['peak_bytes'] / 1024 / 1024:>9.1f} MB peak")
+    if arguments.save:
+        with open(arguments.save, 'w') as baseline_file:
+            json.dump({"lines": arguments.lines, "seed": arguments.seed,
+                       "results": suite_results}, baseline_file, indent=2)
+    if arguments.compare:
+        with open(arguments.compare, 'r') as baseline_file:
+            saved = json.load(baseline_file)
+        found = compare(suite_results, saved["results"], arguments.tolerance)
+        for regression in found:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if found:
+            sys.exit(1)
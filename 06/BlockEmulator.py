@@ -0,0 +1,250 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+import HackFile
+from Code import COMP_CODES
+from Emulator import (
+    A_INSTRUCTION, COMP_FUNCTIONS, EXTENDED_MASK, EXTENDED_PREFIX, JUMP,
+    LEFT_BIT, X_BIT, Emulator, alu, shift)
+
+# Blocks end after this many instructions even without a jump
+MAX_BLOCK_SIZE = 256
+
+# Python expressions for the comps of the instruction set, in terms of the
+# ALU's inputs x (D) and y (A or M)
+COMP_EXPRESSIONS = {
+    "0": "0",
+    "1": "1",
+    "-1": "0xFFFF",
+    "D": "{x}",
+    "A": "{y}",
+    "!D": "{x} ^ 0xFFFF",
+    "!A": "{y} ^ 0xFFFF",
+    "-D": "-{x} & 0xFFFF",
+    "-A": "-{y} & 0xFFFF",
+    "D+1": "({x} + 1) & 0xFFFF",
+    "A+1": "({y} + 1) & 0xFFFF",
+    "D-1": "({x} - 1) & 0xFFFF",
+    "A-1": "({y} - 1) & 0xFFFF",
+    "D+A": "({x} + {y}) & 0xFFFF",
+    "D-A": "({x} - {y}) & 0xFFFF",
+    "A-D": "({y} - {x}) & 0xFFFF",
+    "D&A": "{x} & {y}",
+    "D|A": "{x} | {y}",
+}
+# The same, by the comp field's six control bits
+CONTROL_EXPRESSIONS = {
+    int(COMP_CODES[mnemonic], 2) & 0x3F: expression
+    for mnemonic, expression in COMP_EXPRESSIONS.items()}
+
+# Python conditions on the result for each jump field
+JUMP_CONDITIONS = {
+    0b001: "0 < out < 0x8000",
+    0b010: "not out",
+    0b011: "out < 0x8000",
+    0b100: "out >= 0x8000",
+    0b101: "out",
+    0b110: "not out or out >= 0x8000",
+    0b111: "True",
+}
+
+
+class Block(typing.NamedTuple):
+    """A compiled basic block."""
+    function: typing.Callable  # f(a, d, ram) -> (a, d, pc)
+    start: int                 # address of the first instruction
+    end: int                   # one past the address of the last one
+    source: str                # the generated Python code, for debugging
+
+
+class BlockEmulator(Emulator):
+    """An Emulator that translates the program into Python. Straight-line
+    runs of instructions, ending at a jump or before a jump target, are
+    compiled into functions the first time they are reached, and cached by
+    their start address. The cache is cleared whenever ROM is reloaded.
+
+    Runs that would stop in the middle of a block, either because of the
+    cycle budget or because of run_until's address, finish their last
+    instructions on the interpreter, so results are cycle-exact.
+    """
+
+    def __init__(self, path: typing.Optional[str] = None) -> None:
+        """Creates a machine with cleared memories.
+
+        Args:
+            path (typing.Optional[str]): if given, a machine code file to
+                load into ROM.
+        """
+        self.blocks: typing.Dict[int, Block] = {}
+        self.jump_targets: typing.Set[int] = set()
+        super().__init__(path)
+
+    def decode_rom(self) -> None:
+        """Decodes every ROM word, and drops all blocks compiled from the
+        previous contents of ROM.
+        """
+        super().decode_rom()
+        self.blocks = {}
+        # Addresses loaded into A right before a jump start new blocks, so
+        # the code of loops is not compiled again for every entry point
+        self.jump_targets = set()
+        for address in range(1, self.program_size):
+            previous = self.program[address - 1]
+            if (self.program[address].handler == JUMP
+                    and previous.handler == A_INSTRUCTION):
+                self.jump_targets.add(previous.value & 0x7FFF)
+
+    def compile_block(self, start: int) -> Block:
+        """Translates the block starting at the given address into a Python
+        function. The value of A is tracked while translating, so constant
+        addresses and operands are folded into the generated code.
+
+        Args:
+            start (int): address of the block's first instruction.
+
+        Returns:
+            Block: the compiled block.
+        """
+        lines = [f"def block_{start}(a, d, ram):"]
+        # The value of A when known at translation time, its name otherwise
+        known_a: typing.Optional[int] = None
+        pc = start
+        while True:
+            decoded = self.program[pc]
+            word = self.rom[pc]
+            pc += 1
+            if decoded.handler == A_INSTRUCTION:
+                known_a = decoded.value
+            else:
+                if known_a is None:
+                    lines.append("    address = a & 0x7FFF")
+                    address, a_value = "address", "a"
+                else:
+                    address, a_value = str(known_a & 0x7FFF), str(known_a)
+                y = f"ram[{address}]" if decoded.reads_m else a_value
+                value = self._comp_expression(word, y)
+                lines.append(f"    out = {value}")
+                if decoded.writes_m:
+                    lines.append(f"    ram[{address}] = out")
+                if decoded.writes_d:
+                    lines.append("    d = out")
+                if decoded.writes_a:
+                    if known_a is not None:
+                        lines.append(f"    address = {known_a & 0x7FFF}")
+                        address = "address"
+                    lines.append("    a = out")
+                    known_a = None
+                if decoded.handler == JUMP:
+                    a_value = "a" if known_a is None else str(known_a)
+                    lines.append(f"    if {JUMP_CONDITIONS[word & 0x7]}:")
+                    lines.append(f"        return {a_value}, d, {address}")
+                    break
+            if (pc == HackFile.ROM_SIZE or pc in self.jump_targets
+                    or pc - start >= MAX_BLOCK_SIZE):
+                break
+        a_value = "a" if known_a is None else str(known_a)
+        lines.append(f"    return {a_value}, d, {pc & 0x7FFF}")
+
+        source = "\n".join(lines) + "\n"
+        namespace = {"alu": alu, "shift": shift}
+        exec(compile(source, f"<block {start}>", "exec"), namespace)
+        return Block(namespace[f"block_{start}"], start, pc, source)
+
+    @staticmethod
+    def _comp_expression(word: int, y: str) -> str:
+        """
+        Args:
+            word (int): a C-instruction word.
+            y (str): Python expression of the ALU's y input, A or M.
+
+        Returns:
+            str: a Python expression of the instruction's result, in terms
+            of d and y. Results that do not depend on d are folded into a
+            constant when y is one.
+        """
+        if word & EXTENDED_MASK == EXTENDED_PREFIX:
+            operand = "d" if word & X_BIT else y
+            return f"shift({operand}, {word & LEFT_BIT})"
+        control = (word >> 6) & 0x3F
+        expression = CONTROL_EXPRESSIONS.get(control)
+        if expression is None:
+            return f"alu(d, {y}, {control})"
+        if "{x}" not in expression and y.isdigit():
+            return str(COMP_FUNCTIONS[control](0, int(y)))
+        return expression.format(x="d", y=y)
+
+    def _on_block(self, block: Block, cycles: int, stop_pc: int) -> int:
+        """Called by the dispatch loop after it runs a whole block, with
+        the machine's state up to date. Subclasses override it to watch or
+        steer the run; the dispatch loop only calls it for those that do,
+        so the others pay nothing for it.
+
+        Args:
+            block (Block): the block that just ran.
+            cycles (int): the run's remaining instructions, unlimited if
+                negative.
+            stop_pc (int): the run's stop address, or negative.
+
+        Returns:
+            int: the number of further instructions the hook ran or
+            skipped, within the run's limits.
+        """
+        return 0
+
+    def _step(self) -> int:
+        """Runs a single instruction on the interpreter, where the run ends
+        inside a block.
+
+        Returns:
+            int: the number of instructions run.
+        """
+        return Emulator._run(self, 1, -1)
+
+    def _run(self, cycles: int, stop_pc: int) -> int:
+        """The block dispatch loop behind run and run_until.
+
+        Args:
+            cycles (int): stop after this many instructions, never if
+                negative.
+            stop_pc (int): stop when PC reaches this address, never if
+                negative.
+
+        Returns:
+            int: the number of instructions run.
+        """
+        blocks, ram = self.blocks, self.ram
+        hooked = type(self)._on_block is not BlockEmulator._on_block
+        a, d, pc = self.a, self.d, self.pc
+        executed = 0
+        compiled = 0
+        while executed != cycles and pc != stop_pc:
+            block = blocks.get(pc)
+            if block is None:
+                block = blocks[pc] = self.compile_block(pc)
+            length = block.end - pc
+            if ((cycles < 0 or executed + length <= cycles)
+                    and not pc < stop_pc < block.end):
+                a, d, pc = block.function(a, d, ram)
+                executed += length
+                compiled += length
+                if hooked:
+                    self.a, self.d, self.pc = a, d, pc
+                    self.cycles += compiled
+                    compiled = 0
+                    executed += self._on_block(
+                        block, cycles - executed if cycles >= 0 else -1,
+                        stop_pc)
+                    a, d, pc = self.a, self.d, self.pc
+            else:
+                # The run ends inside this block: step through it
+                self.a, self.d, self.pc = a, d, pc
+                executed += self._step()
+                a, d, pc = self.a, self.d, self.pc
+        self.a, self.d, self.pc = a, d, pc
+        self.cycles += compiled
+        return executed
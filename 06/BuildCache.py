@@ -0,0 +1,176 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import typing
+
+# Where the cache lives unless told otherwise
+DEFAULT_DIRECTORY = os.path.join(
+    os.path.expanduser("~"), ".cache", "nand2tetris-assembler")
+
+# Default size limit of the cache, in bytes
+DEFAULT_LIMIT = 256 * 1024 * 1024
+
+# Size of the blocks input files are hashed in
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Prefix of entries still being written, which are not entries yet
+TEMPORARY_PREFIX = ".tmp-"
+
+
+class BuildCache:
+    """A persistent, content-addressed cache of assembler outputs. Entries
+    are keyed on a hash of the input file's contents together with a
+    fingerprint of the assembler version and options, so an unchanged
+    input is never assembled twice. Each entry is a single file; its
+    modification time records when it was last used, and the least
+    recently used entries are evicted once the cache grows past its limit.
+    """
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY,
+                 limit: int = DEFAULT_LIMIT) -> None:
+        """Opens the cache, creating its directory if needed.
+
+        Args:
+            directory (str): the directory holding the cache entries.
+            limit (int): the maximal total size of all entries, in bytes.
+        """
+        self.directory = directory
+        self.limit = limit
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(input_path: str, fingerprint: str) -> str:
+        """
+        Args:
+            input_path (str): path of the input file.
+            fingerprint (str): identifies everything besides the input that
+                affects the output, e.g. the assembler version and options.
+
+        Returns:
+            str: the cache key of the input file's output.
+        """
+        digest = hashlib.sha256(fingerprint.encode() + b"\0")
+        with open(input_path, 'rb') as input_file:
+            for block in iter(lambda: input_file.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        """
+        Args:
+            key (str): a cache key.
+
+        Returns:
+            str: the path of the entry with the given key.
+        """
+        return os.path.join(self.directory, key)
+
+    def fetch(self, key: str, output_path: str) -> bool:
+        """Copies the cached output with the given key to output_path.
+
+        Args:
+            key (str): a cache key.
+            output_path (str): where to write the output on a hit.
+
+        Returns:
+            bool: True on a cache hit, False on a miss.
+        """
+        entry_path = self.path(key)
+        try:
+            shutil.copyfile(entry_path, output_path)
+            # Mark the entry as recently used
+            os.utime(entry_path)
+        except FileNotFoundError:
+            # Never stored, or evicted by a concurrent build meanwhile
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def store(self, key: str, output_path: str) -> None:
+        """Adds a freshly built output to the cache.
+
+        Args:
+            key (str): the cache key of the output.
+            output_path (str): path of the output file to cache.
+        """
+        # Write to a temporary file first, so concurrent builds never see
+        # a partially written entry, nor evict it
+        descriptor, temporary_path = tempfile.mkstemp(
+            dir=self.directory, prefix=TEMPORARY_PREFIX)
+        os.close(descriptor)
+        try:
+            shutil.copyfile(output_path, temporary_path)
+            os.replace(temporary_path, self.path(key))
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+        self.stores += 1
+
+    def entries(self) -> typing.List[os.DirEntry]:
+        """
+        Returns:
+            typing.List[os.DirEntry]: all cache entries, least recently used
+            first. Files still being stored are not entries.
+        """
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.startswith(TEMPORARY_PREFIX):
+                    continue
+                try:
+                    if entry.is_file():
+                        # Cached by the entry, for sorting and sizes
+                        entry.stat()
+                        entries.append(entry)
+                except FileNotFoundError:
+                    pass  # removed by a concurrent build meanwhile
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        return entries
+
+    def size(self) -> int:
+        """
+        Returns:
+            int: the total size of all cache entries, in bytes.
+        """
+        return sum(entry.stat().st_size for entry in self.entries())
+
+    def evict(self) -> None:
+        """Removes least recently used entries until the cache fits within
+        its size limit.
+        """
+        entries = self.entries()
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if total <= self.limit:
+                break
+            total -= entry.stat().st_size
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue  # already evicted by a concurrent build
+            self.evictions += 1
+
+    def summary(self) -> str:
+        """
+        Returns:
+            str: a one-line summary of this run's statistics and the cache's
+            current size.
+        """
+        entries = self.entries()
+        size = sum(entry.stat().st_size for entry in entries)
+        return (f"cache: {self.hits} hits, {self.misses} misses, "
+                f"{self.stores} stored, {self.evictions} evicted, "
+                f"{len(entries)} entries, {size} bytes")
@@ -7,6 +7,70 @@ Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
 
 
+import functools
+
+
+# The tables below are shared by all encoders and built once, at import time
+DEST_CODES = {
+    "": "000",      # No destination
+    "M": "001",     # Memory[A]
+    "D": "010",     # D register
+    "MD": "011",    # Memory[A] and D register
+    "A": "100",     # A register
+    "AM": "101",    # A register and Memory[A]
+    "AD": "110",    # A register and D register
+    "AMD": "111"    # A register, Memory[A], and D register
+}
+
+COMP_CODES = {
+    '0':   '0101010', '1':   '0111111', '-1':  '0111010',
+    'D':   '0001100', 'A':   '0110000', 'M':   '1110000',
+    '!D':  '0001101', '!A':  '0110001', '!M':  '1110001',
+    '-D':  '0001111', '-A':  '0110011', '-M':  '1110011',
+    'D+1': '0011111', 'A+1': '0110111', 'M+1': '1110111',
+    'D-1': '0001110', 'A-1': '0110010', 'M-1': '1110010',
+    'D+A': '0000010', 'D+M': '1000010',
+    'D-A': '0010011', 'D-M': '1010011',
+    'A-D': '0000111', 'M-D': '1000111',
+    'D&A': '0000000', 'D&M': '1000000',
+    'D|A': '0010101', 'D|M': '1010101',
+    # Commutative operations may also be written with their operands
+    # swapped, as the course's CPU emulator accepts, e.g. M=M+D
+    'A+D': '0000010', 'M+D': '1000010',
+    'A&D': '0000000', 'M&D': '1000000',
+    'A|D': '0010101', 'M|D': '1010101',
+}
+
+# Shift extension, see 05/CpuMul.hdl and 05/ExtendAlu.hdl
+SHIFT_CODES = {
+    'A<<': '0100000',
+    'D<<': '0110000',
+    'M<<': '1100000',
+    'A>>': '0000000',
+    'D>>': '0010000',
+    'M>>': '1000000',
+}
+
+JUMP_CODES = {
+    "": "000",     # No jump
+    "JGT": "001",  # If out > 0, jump
+    "JEQ": "010",  # If out = 0, jump
+    "JGE": "011",  # If out >= 0, jump
+    "JLT": "100",  # If out < 0, jump
+    "JNE": "101",  # If out != 0, jump
+    "JLE": "110",  # If out <= 0, jump
+    "JMP": "111"   # Unconditional jump
+}
+
+# Regular C-instructions start with "111", shifts with "101" (CpuMul.hdl)
+C_PREFIX = 0b111 << 13
+SHIFT_PREFIX = 0b101 << 13
+
+# Generated code only uses a few dozen distinct C-instructions, so a small
+# memo cache catches virtually every lookup
+ENCODE_CACHE_SIZE = 4096
+
+
 class Code:
     """Translates Hack assembly language mnemonics into binary codes."""
     
@@ -19,18 +83,7 @@ class Code:
         Returns:
             str: 3-bit long binary code of the given mnemonic.
         """
-        dest_codes = {
-            "": "000",      # No destination
-            "M": "001",     # Memory[A]
-            "D": "010",     # D register
-            "MD": "011",    # Memory[A] and D register
-            "A": "100",     # A register
-            "AM": "101",    # A register and Memory[A]
-            "AD": "110",    # A register and D register
-            "AMD": "111"    # A register, Memory[A], and D register
-        }
-
-        return dest_codes.get(mnemonic, "000")  # Default to "000" if mnemonic not found
+        return DEST_CODES.get(mnemonic, "000")  # Default to "000" if mnemonic not found
 
     @staticmethod
     def comp(mnemonic: str) -> str:
@@ -41,31 +94,11 @@ class Code:
         Returns:
             str: 7-bit long binary code of the given mnemonic.
         """
-        # 1. clean up whitespace (both leading/trailing and internal)
-        m = mnemonic.strip()
-        m = ''.join(m.split())  # Remove all whitespace
-
-        # 2. handle the 6 shift ops
-        if Code.is_shift(m):
-            return Code.shift_comp(m)
-
-        # 3. standard ALU ops
-        comp_codes = {
-            '0':   '0101010', '1':   '0111111', '-1':  '0111010',
-            'D':   '0001100', 'A':   '0110000', 'M':   '1110000',
-            '!D':  '0001101', '!A':  '0110001', '!M':  '1110001',
-            '-D':  '0001111', '-A':  '0110011', '-M':  '1110011',
-            'D+1': '0011111', 'A+1': '0110111', 'M+1': '1110111',
-            'D-1': '0001110', 'A-1': '0110010', 'M-1': '1110010',
-            'D+A': '0000010', 'D+M': '1000010',
-            'D-A': '0010011', 'D-M': '1010011',
-            'A-D': '0000111', 'M-D': '1000111',
-            'D&A': '0000000', 'D&M': '1000000',
-            'D|A': '0010101', 'D|M': '1010101',
-        }
-
-        # 4. lookup
-        return comp_codes.get(m, "0000000")  # Default to "0000000" if mnemonic not found
+        # Remove all whitespace (both leading/trailing and internal)
+        m = ''.join(mnemonic.split())
+        if m in SHIFT_CODES:
+            return SHIFT_CODES[m]
+        return COMP_CODES.get(m, "0000000")  # Default to "0000000" if mnemonic not found
 
     @staticmethod
     def is_shift(mnemonic: str) -> bool:
@@ -78,8 +111,7 @@ class Code:
         Returns:
             bool: True if it's a shift operation, False otherwise.
         """
-        shifts = {'A<<', 'D<<', 'M<<', 'A>>', 'D>>', 'M>>'}
-        return mnemonic in shifts
+        return mnemonic in SHIFT_CODES
     
     @staticmethod
     def jump(mnemonic: str) -> str:
@@ -90,17 +122,7 @@ class Code:
         Returns:
             str: 3-bit long binary code of the given mnemonic.
         """
-        jump_codes = {
-            "": "000",     # No jump
-            "JGT": "001",  # If out > 0, jump
-            "JEQ": "010",  # If out = 0, jump
-            "JGE": "011",  # If out >= 0, jump
-            "JLT": "100",  # If out < 0, jump
-            "JNE": "101",  # If out != 0, jump
-            "JLE": "110",  # If out <= 0, jump
-            "JMP": "111"   # Unconditional jump
-        }
-        return jump_codes.get(mnemonic.strip(), "000")  # Default to "000" if mnemonic not found, and strip whitespace
+        return JUMP_CODES.get(mnemonic.strip(), "000")  # Default to "000" if mnemonic not found, and strip whitespace
 
     @staticmethod
     def shift_comp(mnemonic: str) -> str:
@@ -111,12 +133,45 @@ class Code:
         Returns:
             str: 7-bit long binary code for the given shift operation.
         """
-        shift_codes = {
-            'A<<': '0100000',
-            'D<<': '0110000',
-            'M<<': '1100000',
-            'A>>': '0000000',
-            'D>>': '0010000',
-            'M>>': '1000000',
-        }
-        return shift_codes.get(mnemonic, "0000000")  # Default to "0000000" if mnemonic not found
+        return SHIFT_CODES.get(mnemonic, "0000000")  # Default to "0000000" if mnemonic not found
+
+    @staticmethod
+    @functools.lru_cache(maxsize=ENCODE_CACHE_SIZE)
+    def encode(dest: str, comp: str, jump: str) -> int:
+        """Encodes a whole C-instruction from its already split fields.
+
+        Args:
+            dest (str): a dest mnemonic string.
+            comp (str): a comp mnemonic string, may be a shift.
+            jump (str): a jump mnemonic string.
+
+        Returns:
+            int: the 16-bit instruction word.
+        """
+        comp = ''.join(comp.split())
+        prefix = SHIFT_PREFIX if comp in SHIFT_CODES else C_PREFIX
+        return (prefix
+                | int(Code.comp(comp), 2) << 6
+                | int(Code.dest(dest.strip()), 2) << 3
+                | int(Code.jump(jump), 2))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=ENCODE_CACHE_SIZE)
+    def encode_command(command: str) -> int:
+        """Encodes a whole C-instruction given as a single string.
+
+        Args:
+            command (str): a "dest=comp;jump" string, where dest and jump are
+            optional and whitespace is ignored.
+
+        Returns:
+            int: the 16-bit instruction word.
+        """
+        dest, jump = "", ""
+        comp = command
+        if '=' in comp:
+            dest, comp = comp.split('=', 1)
+        if ';' in comp:
+            comp, jump = comp.split(';', 1)
+            jump = jump.split(';')[0]
+        return Code.encode(dest, comp, jump)
@@ -0,0 +1,161 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+import typing
+from Parser import Instruction, Parser
+from Optimizer import uses_absolute_jumps
+
+
+def label_positions(
+        instructions: typing.List[Instruction]) -> typing.Dict[str, int]:
+    """
+    Args:
+        instructions (typing.List[Instruction]): a parsed program.
+
+    Returns:
+        typing.Dict[str, int]: the index of the instruction each label
+        points at. Labels at the very end point one past the last index.
+    """
+    positions = {}
+    pending = []
+    for index, instruction in enumerate(instructions):
+        if instruction.kind == "L_COMMAND":
+            pending.append(instruction.symbol)
+        else:
+            for label in pending:
+                positions[label] = index
+            pending.clear()
+    for label in pending:
+        positions[label] = len(instructions)
+    return positions
+
+
+def jump_targets(instructions: typing.List[Instruction], index: int,
+                 jumps_set_a: bool = True) -> typing.Set[typing.Optional[str]]:
+    """Finds the symbols a jump instruction may jump to, by looking back for
+    the A-commands that set A. A label between them does not hide the
+    A-command: code that jumps to the label arrives with A holding the
+    label's own address, so the label is a possible target too, and the
+    walk goes on through the code that falls through into it.
+
+    Args:
+        instructions (typing.List[Instruction]): a parsed program.
+        index (int): index of a C-command with a jump.
+        jumps_set_a (bool): whether any jump of the program also writes A,
+            in which case A may be computed after a jump to a label.
+
+    Returns:
+        typing.Set[typing.Optional[str]]: the symbols of the @Xxx that may
+        have set A, with None standing for a computed A.
+    """
+    targets: typing.Set[typing.Optional[str]] = set()
+    index -= 1
+    while index >= 0:
+        instruction = instructions[index]
+        if instruction.kind == "L_COMMAND":
+            targets.add(instruction.symbol)
+            if jumps_set_a:
+                targets.add(None)
+        elif instruction.kind == "A_COMMAND":
+            targets.add(instruction.symbol)
+            return targets
+        elif "A" in instruction.dest:
+            break
+        elif instruction.jump == "JMP" and targets:
+            # Reached only through the labels in between
+            return targets
+        index -= 1
+    targets.add(None)
+    return targets
+
+
+def address_taken_labels(
+        instructions: typing.List[Instruction],
+        labels: typing.Dict[str, int]) -> typing.Set[str]:
+    """Finds the labels whose address is used as a value, e.g. the return
+    addresses the VM translator loads into D and pushes on the stack. Such
+    labels may be the target of any computed jump.
+
+    Args:
+        instructions (typing.List[Instruction]): a parsed program.
+        labels (typing.Dict[str, int]): the label positions.
+
+    Returns:
+        typing.Set[str]: the address-taken labels.
+    """
+    taken = set()
+    loaded = None
+    for instruction in instructions:
+        if instruction.kind == "A_COMMAND":
+            loaded = instruction.symbol if instruction.symbol in labels \
+                else None
+        elif instruction.kind == "C_COMMAND":
+            if loaded is not None and "A" in instruction.comp:
+                taken.add(loaded)
+            if "A" in instruction.dest:
+                loaded = None
+    return taken
+
+
+def eliminate_dead_code(parser: Parser) -> int:
+    """Removes the instructions that cannot be reached from address 0,
+    before addresses are assigned. Control flow follows fallthrough and
+    @LABEL + jump pairs, also across labels in between (see jump_targets);
+    computed jumps (such as returns) may go to any address-taken label.
+    Labels themselves are kept, so every symbol stays defined. Programs
+    that jump to numeric addresses are left untouched.
+
+    Args:
+        parser (Parser): the parsed program, rewritten in place.
+
+    Returns:
+        int: the number of instructions removed.
+    """
+    instructions = parser.instructions
+    if not instructions or uses_absolute_jumps(instructions):
+        return 0
+    labels = label_positions(instructions)
+    jumps_set_a = any(
+        instruction.kind == "C_COMMAND" and instruction.jump
+        and "A" in instruction.dest for instruction in instructions)
+    computed_targets = [
+        labels[label] for label in address_taken_labels(instructions, labels)]
+
+    reachable = bytearray(len(instructions))
+    worklist = [0]
+    while worklist:
+        index = worklist.pop()
+        # Walk straight-line code until it ends or joins known code
+        while index < len(instructions) and not reachable[index]:
+            reachable[index] = 1
+            instruction = instructions[index]
+            if instruction.kind == "C_COMMAND" and instruction.jump:
+                targets = jump_targets(instructions, index, jumps_set_a)
+                if None in targets:
+                    worklist.extend(computed_targets)
+                    targets.discard(None)
+                if targets <= labels.keys():
+                    worklist.extend(labels[target] for target in targets)
+                else:
+                    # A jump to a fixed address such as @R14 cannot be
+                    # followed safely once code moves
+                    return 0
+                if instruction.jump == "JMP":
+                    break
+            index += 1
+
+    kept = []
+    kept_lines = array.array('L')
+    for index, instruction in enumerate(instructions):
+        if reachable[index] or instruction.kind == "L_COMMAND":
+            kept.append(instruction)
+            kept_lines.append(parser.line_numbers[index])
+    removed = len(instructions) - len(kept)
+    parser.instructions = kept
+    parser.line_numbers = kept_lines
+    return removed
@@ -0,0 +1,348 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import array
+import time
+import typing
+import HackFile
+from Code import COMP_CODES
+
+# Size of the Hack data memory, in words. Only the first 24577 words are
+# wired up in the hardware, but a full 32K keeps every address in range.
+RAM_SIZE = 32768
+
+# Memory maps of the screen and the keyboard
+SCREEN = 16384
+SCREEN_SIZE = 8192
+KBD = 24576
+
+# Instruction word fields
+C_BIT = 0x8000       # set for C-instructions, clear for A-instructions
+EXTENDED_MASK = 0xC000  # the two top bits, which tell C and extended apart
+EXTENDED_PREFIX = 0x8000
+A_BIT = 0x1000       # the ALU's y input is M rather than A
+LEFT_BIT = 0x0800    # shifts go left rather than right
+X_BIT = 0x0400       # shifts act on D rather than on A or M
+DEST_A = 0x20
+DEST_D = 0x10
+DEST_M = 0x08
+JUMP_LT = 0x4
+JUMP_EQ = 0x2
+JUMP_GT = 0x1
+
+
+def alu(x: int, y: int, control: int) -> int:
+    """Computes the Hack ALU's output, exactly as the hardware does, for any
+    of the 64 combinations of its control bits. The inputs are never
+    modified in place, so they may also be NumPy arrays of 16-bit words.
+
+    Args:
+        x (int): the 16-bit x input, D.
+        y (int): the 16-bit y input, A or M.
+        control (int): the six control bits zx nx zy ny f no, as the comp
+            field of a C-instruction without its a-bit.
+
+    Returns:
+        int: the 16-bit output.
+    """
+    if control & 0x20:
+        x = 0
+    if control & 0x10:
+        x = x ^ 0xFFFF
+    if control & 0x08:
+        y = 0
+    if control & 0x04:
+        y = y ^ 0xFFFF
+    out = (x + y) & 0xFFFF if control & 0x02 else x & y
+    if control & 0x01:
+        out = out ^ 0xFFFF
+    return out
+
+
+def shift(value: int, left: int) -> int:
+    """Shifts a 16-bit value as 02/ShiftLeft.hdl and 02/ShiftRight.hdl do:
+    left shifts (if left is nonzero) drop the top bit, right shifts keep
+    the sign bit.
+    """
+    if left:
+        return (value << 1) & 0xFFFF
+    return (value >> 1) | (value & 0x8000)
+
+
+# The ALU operation of every comp field (a-bit included), as a function of
+# D and of A or M. The comps of the instruction set get dedicated functions,
+# all others fall back on the general ALU.
+COMP_FUNCTIONS: typing.List[typing.Callable[[int, int], int]] = [
+    (lambda x, y, control=comp & 0x3F: alu(x, y, control))
+    for comp in range(128)]
+for _mnemonic, _function in {
+        "0": lambda x, y: 0,
+        "1": lambda x, y: 1,
+        "-1": lambda x, y: 0xFFFF,
+        "D": lambda x, y: x,
+        "A": lambda x, y: y,
+        "!D": lambda x, y: x ^ 0xFFFF,
+        "!A": lambda x, y: y ^ 0xFFFF,
+        "-D": lambda x, y: -x & 0xFFFF,
+        "-A": lambda x, y: -y & 0xFFFF,
+        "D+1": lambda x, y: (x + 1) & 0xFFFF,
+        "A+1": lambda x, y: (y + 1) & 0xFFFF,
+        "D-1": lambda x, y: (x - 1) & 0xFFFF,
+        "A-1": lambda x, y: (y - 1) & 0xFFFF,
+        "D+A": lambda x, y: (x + y) & 0xFFFF,
+        "D-A": lambda x, y: (x - y) & 0xFFFF,
+        "A-D": lambda x, y: (y - x) & 0xFFFF,
+        "D&A": lambda x, y: x & y,
+        "D|A": lambda x, y: x | y}.items():
+    COMP_FUNCTIONS[int(COMP_CODES[_mnemonic], 2)] = _function
+    if "A" in _mnemonic:
+        COMP_FUNCTIONS[int(COMP_CODES[_mnemonic.replace("A", "M")], 2)] = \
+            _function
+
+
+# Shift operations, by whether they go left and whether they act on D
+SHIFT_FUNCTIONS = {
+    (False, False): lambda x, y: shift(y, 0),
+    (True, False): lambda x, y: shift(y, 1),
+    (False, True): lambda x, y: shift(x, 0),
+    (True, True): lambda x, y: shift(x, 1),
+}
+
+# Handlers of decoded instruction words
+A_INSTRUCTION = 0  # load a constant into A
+COMPUTE = 1        # compute and store, then go on to the next instruction
+JUMP = 2           # compute and store, then maybe jump
+
+
+class DecodedWord(typing.NamedTuple):
+    """An instruction word with all its fields extracted ahead of time, so
+    running it needs no bit twiddling. A-instructions only use handler and
+    value.
+    """
+    handler: int   # A_INSTRUCTION, COMPUTE or JUMP
+    value: int     # the constant of an A-instruction
+    function: typing.Optional[typing.Callable[[int, int], int]]  # f(D, y)
+    reads_m: bool  # y is M rather than A
+    writes_m: bool
+    writes_d: bool
+    writes_a: bool
+    jeq: bool      # jump if the result is zero
+    jlt: bool      # jump if the result is negative
+    jgt: bool      # jump if the result is positive
+
+
+# Decoded form of every possible instruction word, filled in on first use
+# and shared by all emulators
+DECODE_TABLE: typing.List[typing.Optional[DecodedWord]] = [None] * 65536
+
+
+def decode(word: int) -> DecodedWord:
+    """
+    Args:
+        word (int): a 16-bit instruction word.
+
+    Returns:
+        DecodedWord: the word's decoded form, from DECODE_TABLE.
+    """
+    decoded = DECODE_TABLE[word]
+    if decoded is not None:
+        return decoded
+    if word < C_BIT:
+        decoded = DecodedWord(A_INSTRUCTION, word, None, False, False, False,
+                              False, False, False, False)
+    else:
+        if word & EXTENDED_MASK == EXTENDED_PREFIX:
+            function = SHIFT_FUNCTIONS[
+                bool(word & LEFT_BIT), bool(word & X_BIT)]
+        else:
+            function = COMP_FUNCTIONS[(word >> 6) & 0x7F]
+        decoded = DecodedWord(
+            JUMP if word & 0x7 else COMPUTE, 0, function,
+            bool(word & A_BIT), bool(word & DEST_M), bool(word & DEST_D),
+            bool(word & DEST_A), bool(word & JUMP_EQ), bool(word & JUMP_LT),
+            bool(word & JUMP_GT))
+    DECODE_TABLE[word] = decoded
+    return decoded
+
+
+class Emulator:
+    """Runs Hack machine code, including the shift instructions of
+    05/CpuMul.hdl. Both memories are compact arrays of 16-bit words, and
+    the program is loaded from a .hack file in either format.
+
+    Every ROM word is decoded once, when it is loaded, into the parallel
+    list `program`; code that changes `rom` directly must call decode_rom
+    afterwards. Every instruction takes one cycle. As in the hardware, a
+    C-instruction reads and writes M and jumps using the value A held
+    before it, even when it also writes A.
+    """
+
+    def __init__(self, path: typing.Optional[str] = None) -> None:
+        """Creates a machine with cleared memories.
+
+        Args:
+            path (typing.Optional[str]): if given, a machine code file to
+                load into ROM.
+        """
+        self.rom = array.array('H', bytes(2 * HackFile.ROM_SIZE))
+        self.ram = array.array('H', bytes(2 * RAM_SIZE))
+        self.program = [decode(0)] * HackFile.ROM_SIZE
+        self.a = 0
+        self.d = 0
+        self.pc = 0
+        self.cycles = 0
+        self.program_size = 0
+        if path is not None:
+            self.load(path)
+
+    def load(self, path: str) -> None:
+        """Loads a machine code file into ROM, clears the rest of ROM, and
+        resets the machine.
+
+        Args:
+            path (str): path of a .hack file, text or packed binary.
+        """
+        self.rom[:] = array.array('H', bytes(2 * HackFile.ROM_SIZE))
+        self.program_size = HackFile.load_into(path, self.rom)
+        self.decode_rom()
+        self.reset()
+
+    def load_words(self, words: typing.Sequence[int]) -> None:
+        """Loads machine code held in memory into ROM, clears the rest of
+        ROM, and resets the machine.
+
+        Args:
+            words (typing.Sequence[int]): the instruction words.
+        """
+        if len(words) > HackFile.ROM_SIZE:
+            raise ValueError("program does not fit in memory")
+        self.rom[:] = array.array('H', bytes(2 * HackFile.ROM_SIZE))
+        self.rom[:len(words)] = array.array('H', words)
+        self.program_size = len(words)
+        self.decode_rom()
+        self.reset()
+
+    def decode_rom(self) -> None:
+        """Decodes every ROM word into `program`."""
+        self.program = [decode(word) for word in self.rom]
+
+    def reset(self) -> None:
+        """Restarts the program. As with the hardware's reset input, only PC
+        changes; the registers and RAM keep their values.
+        """
+        self.pc = 0
+
+    def step(self) -> None:
+        """Runs a single instruction."""
+        self.run(1)
+
+    def run(self, cycles: int) -> int:
+        """Runs the given number of instructions.
+
+        Args:
+            cycles (int): number of instructions to run.
+
+        Returns:
+            int: the number of instructions run.
+        """
+        return self._run(cycles, -1)
+
+    def run_until(self, pc: int, max_cycles: int = -1) -> int:
+        """Runs until PC reaches the given address, e.g. a program's final
+        infinite loop.
+
+        Args:
+            pc (int): the address to stop at, before running it.
+            max_cycles (int): if not negative, stop after this many
+                instructions even if the address was not reached.
+
+        Returns:
+            int: the number of instructions run.
+        """
+        return self._run(max_cycles, pc)
+
+    def _run(self, cycles: int, stop_pc: int) -> int:
+        """The interpreter loop behind run and run_until. Machine state lives
+        in local variables while it runs, and is stored back at the end.
+
+        Args:
+            cycles (int): stop after this many instructions, never if
+                negative.
+            stop_pc (int): stop when PC reaches this address, never if
+                negative.
+
+        Returns:
+            int: the number of instructions run.
+        """
+        program, ram = self.program, self.ram
+        a, d, pc = self.a, self.d, self.pc
+        executed = 0
+        limit = cycles if cycles >= 0 else 1 << 62
+        for executed in range(1, limit + 1):
+            if pc == stop_pc:
+                executed -= 1
+                break
+            decoded = program[pc]
+            if decoded[0] == A_INSTRUCTION:
+                a = decoded[1]
+                pc = (pc + 1) & 0x7FFF
+                continue
+
+            (handler, _, function, reads_m, writes_m, writes_d, writes_a,
+             jeq, jlt, jgt) = decoded
+            address = a & 0x7FFF
+            out = function(d, ram[address] if reads_m else a)
+            if writes_m:
+                ram[address] = out
+            if writes_d:
+                d = out
+            if writes_a:
+                a = out
+            if handler == JUMP and (
+                    jeq if not out else jlt if out & 0x8000 else jgt):
+                pc = address
+            else:
+                pc = (pc + 1) & 0x7FFF
+
+        self.a, self.d, self.pc = a, d, pc
+        self.cycles += executed
+        return executed
+
+
+if "__main__" == __name__:
+    argument_parser = argparse.ArgumentParser(prog="Emulator")
+    argument_parser.add_argument("path", help="a .hack or .hackbin file")
+    argument_parser.add_argument(
+        "--cycles", type=int, default=-1, metavar="N",
+        help="stop after N instructions")
+    argument_parser.add_argument(
+        "--until", type=int, default=-1, metavar="PC",
+        help="stop when PC reaches this address")
+    argument_parser.add_argument(
+        "--set", action="append", default=[], metavar="ADDRESS=VALUE",
+        help="set a RAM word before running (may be repeated)")
+    argument_parser.add_argument(
+        "--ram", default="0-15", metavar="FIRST-LAST",
+        help="range of RAM words to print afterwards (default 0-15)")
+    arguments = argument_parser.parse_args()
+    if arguments.cycles < 0 and arguments.until < 0:
+        argument_parser.error("give --cycles, --until or both")
+
+    emulator = Emulator(arguments.path)
+    for assignment in arguments.set:
+        ram_address, ram_value = assignment.split("=")
+        emulator.ram[int(ram_address)] = int(ram_value) & 0xFFFF
+    start = time.perf_counter()
+    emulator.run_until(arguments.until, arguments.cycles)
+    elapsed = time.perf_counter() - start
+    first, last = (int(bound) for bound in arguments.ram.split("-"))
+    for ram_address in range(first, last + 1):
+        print(f"RAM[{ram_address}] = {emulator.ram[ram_address]}")
+    print(f"A = {emulator.a}, D = {emulator.d}, PC = {emulator.pc}, "
+          f"{emulator.cycles} cycles, "
+          f"{emulator.cycles / max(elapsed, 1e-9):,.0f} instructions/s")
@@ -0,0 +1,186 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import os
+import random
+import time
+import typing
+from BatchEmulator import BatchEmulator
+from BlockEmulator import BlockEmulator
+from Emulator import Emulator
+from FastForwardEmulator import FastForwardEmulator
+from HackAssembler import assemble_parsed
+from Keyboard import Player, load_timeline
+from Parser import parse_path
+
+# The benchmarked programs are found relative to this directory
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+def emulator_speeds(cycles: int) -> typing.Dict[str, typing.Tuple[
+        float, float]]:
+    """Runs 04/mult/Mult.asm and the compiled Pong on the plain interpreter
+    and on the basic-block translator, and checks that both end in the same
+    state.
+
+    Args:
+        cycles (int): roughly how many instructions to run per program.
+
+    Returns:
+        typing.Dict[str, typing.Tuple[float, float]]: for each program, the
+        interpreter's and the translator's instructions per second.
+    """
+    speeds = {}
+
+    # Mult: multiply 3 by 10000 over and over, until its final loop
+    words, symbol_table = assemble_parsed(parse_path(
+        os.path.join(DIRECTORY, "..", "04", "mult", "Mult.asm")))
+    end = symbol_table.get_address("END")
+    states = []
+    speeds["Mult"] = []
+    for engine in (Emulator, BlockEmulator):
+        emulator = engine()
+        emulator.load_words(words)
+        start = time.perf_counter()
+        while emulator.cycles < cycles:
+            emulator.reset()
+            emulator.ram[0], emulator.ram[1] = 3, 10000
+            emulator.run_until(end)
+        speeds["Mult"].append(
+            emulator.cycles / (time.perf_counter() - start))
+        states.append((emulator.cycles, emulator.d, emulator.ram[:3]))
+
+    # Pong: run the game itself from reset
+    words, _ = assemble_parsed(parse_path(
+        os.path.join(DIRECTORY, "pong", "Pong.asm")))
+    speeds["Pong"] = []
+    for engine in (Emulator, BlockEmulator):
+        emulator = engine()
+        emulator.load_words(words)
+        start = time.perf_counter()
+        emulator.run(cycles)
+        speeds["Pong"].append(cycles / (time.perf_counter() - start))
+        states.append((emulator.a, emulator.d, emulator.pc, emulator.ram))
+
+    if states[0] != states[1] or states[2] != states[3]:
+        raise AssertionError("block translator differs from interpreter")
+    return {name: tuple(speed) for name, speed in speeds.items()}
+
+
+def batch_speed(instances: int, seed: int) -> typing.Tuple[float, float]:
+    """Runs 04/mult/Mult.asm on random inputs, once on a BatchEmulator with
+    one instance per input and once per input on the plain interpreter, and
+    checks that every instance ends in the same state as its scalar run.
+
+    Args:
+        instances (int): number of inputs.
+        seed (int): seed of the inputs.
+
+    Returns:
+        typing.Tuple[float, float]: seconds taken by the batch run and by
+        the scalar runs.
+    """
+    words, symbol_table = assemble_parsed(parse_path(
+        os.path.join(DIRECTORY, "..", "04", "mult", "Mult.asm")))
+    end = symbol_table.get_address("END")
+    generator = random.Random(seed)
+    inputs = [(generator.randrange(1000), generator.randrange(1000))
+              for _ in range(instances)]
+
+    batch = BatchEmulator(instances, ram_size=32)
+    batch.load_words(words)
+    batch.ram[:, 0], batch.ram[:, 1] = zip(*inputs)
+    start = time.perf_counter()
+    batch.run_until(end)
+    batch_time = time.perf_counter() - start
+
+    emulator = Emulator()
+    emulator.load_words(words)
+    start = time.perf_counter()
+    for instance, (first, second) in enumerate(inputs):
+        emulator.reset()
+        emulator.cycles = 0
+        emulator.ram[0], emulator.ram[1] = first, second
+        emulator.run_until(end)
+        if (emulator.cycles, emulator.d, emulator.ram[:3].tolist()) != (
+                batch.cycles[instance], batch.d[instance],
+                batch.ram[instance, :3].tolist()):
+            raise AssertionError(f"instance {instance} differs from a "
+                                 f"scalar run")
+    return batch_time, time.perf_counter() - start
+
+
+def game_speed(cycles: int) -> typing.Tuple[float, float]:
+    """Plays the compiled Pong with the scripted input of pong/Pong.kbd, on
+    the basic-block translator and with idle loops fast-forwarded, and
+    checks that both runs end in the same state.
+
+    Args:
+        cycles (int): number of instructions to run.
+
+    Returns:
+        typing.Tuple[float, float]: instructions per second without and
+        with fast-forwarding.
+    """
+    words, _ = assemble_parsed(parse_path(
+        os.path.join(DIRECTORY, "pong", "Pong.asm")))
+    timeline = load_timeline(os.path.join(DIRECTORY, "pong", "Pong.kbd"))
+    states = []
+    speeds = []
+    for engine in (BlockEmulator, FastForwardEmulator):
+        emulator = engine()
+        emulator.load_words(words)
+        start = time.perf_counter()
+        Player(emulator, timeline).run(cycles)
+        speeds.append(cycles / (time.perf_counter() - start))
+        states.append((emulator.a, emulator.d, emulator.pc, emulator.cycles,
+                       emulator.ram))
+    if states[0] != states[1]:
+        raise AssertionError("fast-forwarded game differs from the "
+                             "translator's")
+    return speeds[0], speeds[1]
+
+
+if "__main__" == __name__:
+    argument_parser = argparse.ArgumentParser(
+        prog="EmulatorBenchmark",
+        description="Emulator throughput benchmarks. Every mode checks that "
+                    "the engines it compares end in the same state.")
+    argument_parser.add_argument(
+        "mode", choices=("blocks", "game", "batch"),
+        help="blocks: the interpreter against the basic-block translator on "
+             "Mult and Pong; game: Pong with the scripted input of "
+             "pong/Pong.kbd, with and without fast-forwarding; batch: a "
+             "lockstep batch run of Mult against one interpreter run per "
+             "random input")
+    argument_parser.add_argument(
+        "--cycles", type=int, default=5000000, metavar="N",
+        help="instructions to run per program (default 5000000)")
+    argument_parser.add_argument(
+        "--instances", type=int, default=1000, metavar="N",
+        help="random inputs of the batch mode (default 1000)")
+    argument_parser.add_argument("--seed", type=int, default=0)
+    arguments = argument_parser.parse_args()
+
+    if arguments.mode == "blocks":
+        for program, (interpreted, translated) in emulator_speeds(
+                arguments.cycles).items():
+            print(f"{program}: interpreter {interpreted:,.0f} instr/s, "
+                  f"blocks {translated:,.0f} instr/s "
+                  f"({translated / interpreted:.2f}x, identical state)")
+    elif arguments.mode == "game":
+        translated, fast_forwarded = game_speed(arguments.cycles)
+        print(f"Pong with scripted input: blocks {translated:,.0f} instr/s, "
+              f"fast-forward {fast_forwarded:,.0f} instr/s "
+              f"({fast_forwarded / translated:.1f}x, identical state)")
+    else:
+        batch_seconds, scalar_seconds = batch_speed(arguments.instances,
+                                                    arguments.seed)
+        print(f"Mult x{arguments.instances}: batch {batch_seconds:.3f}s, "
+              f"scalar {scalar_seconds:.3f}s "
+              f"({scalar_seconds / batch_seconds:.1f}x, identical state)")
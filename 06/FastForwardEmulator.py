@@ -0,0 +1,311 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+from BlockEmulator import Block, BlockEmulator
+from Code import COMP_CODES
+from Emulator import A_INSTRUCTION, COMP_FUNCTIONS, JUMP, Emulator
+
+# Times a loop must come around before it is analysed, and the largest
+# number of those it waits after an analysis that found nothing to skip
+LOOP_THRESHOLD = 8
+MAX_LOOP_BACKOFF = 1 << 16
+
+# Iterations longer than this are not traced instruction by instruction,
+# only checked for coming back to exactly the same state
+MAX_TRACE = 1024
+
+# Iterations longer than this are not analysed at all
+MAX_PERIOD = 1 << 20
+
+# ALU operations whose result is x + y, -x, x + c or c - x modulo 2**16 for
+# some constant c, or a constant: running them on inputs that change by a
+# fixed step every iteration gives results that do too
+AFFINE_FUNCTIONS = frozenset(
+    COMP_FUNCTIONS[int(code, 2)] for mnemonic, code in COMP_CODES.items()
+    if "&" not in mnemonic and "|" not in mnemonic)
+
+
+def signed(value: int) -> int:
+    """
+    Args:
+        value (int): a 16-bit word.
+
+    Returns:
+        int: the word as a two's complement number.
+    """
+    return value - 0x10000 if value & 0x8000 else value
+
+
+def steps_in_sign(value: int, step: int) -> typing.Optional[int]:
+    """
+    Args:
+        value (int): a 16-bit word.
+        step (int): a 16-bit word, added to the value again and again.
+
+    Returns:
+        typing.Optional[int]: how many steps keep the value's sign class,
+        negative, zero or positive, unchanged; None if all of them do.
+    """
+    value, step = signed(value), signed(step)
+    if not step:
+        return None
+    if value > 0:
+        low, high = 1, 0x7FFF
+    elif value < 0:
+        low, high = -0x8000, -1
+    else:
+        return 0
+    return (high - value) // step if step > 0 else (value - low) // -step
+
+
+class FastForwardEmulator(BlockEmulator):
+    """A BlockEmulator that skips over the iterations of idle loops, such
+    as busy-waits, delay counters and keyboard polling, without running
+    them, while keeping results and cycle counts exact.
+
+    Loops are found at the targets of backward jumps. Once one comes
+    around often enough, two of its iterations are traced instruction by
+    instruction. The loop can be skipped if both took the same path, every
+    word they changed changed by the same amount both times, and every
+    value the path computes from those words is an affine function of
+    them: sums, differences, negations and constants, and addresses that
+    stay fixed. Every further iteration then changes the same words by the
+    same amounts, until some conditional jump's result changes sign, which
+    can be worked out directly. Iterations that change nothing, as in
+    polling loops, are the special case where the amounts are all zero.
+
+    Iterations too long to trace, such as a scan of the whole screen, are
+    skipped if one brings the machine back to exactly the state it started
+    from, since every further one must then do the same.
+
+    Nothing from outside the machine can change during a run, so a loop
+    that reads the keyboard is only skipped up to the end of the run; play
+    a timeline with Keyboard.Player to run up to the next key event.
+    """
+
+    def __init__(self, path: typing.Optional[str] = None) -> None:
+        """Creates a machine with cleared memories.
+
+        Args:
+            path (typing.Optional[str]): if given, a machine code file to
+                load into ROM.
+        """
+        # Times each backward jump target was reached since its last
+        # analysis, negative while backing off after an unsuccessful one
+        self.loop_hits: typing.Dict[int, int] = {}
+        self.loop_backoff: typing.Dict[int, int] = {}
+        # Set while a whole iteration runs for _skip_periods, which must
+        # not be analysed in turn
+        self.measuring_period = False
+        self.skipped = 0
+        super().__init__(path)
+
+    def decode_rom(self) -> None:
+        """Decodes every ROM word, and forgets the loops of the previous
+        contents of ROM.
+        """
+        super().decode_rom()
+        self.loop_hits = {}
+        self.loop_backoff = {}
+
+    def _on_block(self, block: Block, cycles: int, stop_pc: int) -> int:
+        """Counts the loop at PC if the block that just ran jumped back to
+        it, and analyses the loop once it has come around often enough.
+
+        Args:
+            block (Block): the block that just ran.
+            cycles (int): the run's remaining instructions, unlimited if
+                negative.
+            stop_pc (int): the run's stop address, or negative.
+
+        Returns:
+            int: the number of instructions run or skipped.
+        """
+        pc = self.pc
+        if pc > block.start or self.measuring_period:
+            return 0
+        hits = self.loop_hits.get(pc, 0) + 1
+        self.loop_hits[pc] = hits
+        if hits < LOOP_THRESHOLD:
+            return 0
+        return self._fast_forward(cycles, stop_pc)
+
+    def _fast_forward(self, cycles: int, stop_pc: int) -> int:
+        """Analyses the loop whose first instruction PC is at, and skips as
+        many of its iterations as it can.
+
+        Args:
+            cycles (int): the run's remaining instructions, unlimited if
+                negative.
+            stop_pc (int): the run's stop address, or negative.
+
+        Returns:
+            int: the number of instructions run or skipped.
+        """
+        header = self.pc
+        start_cycles = self.cycles
+        start = (self.a, self.d, self.ram[:])
+        skipped = 0
+        trace_budget = MAX_TRACE if cycles < 0 else min(MAX_TRACE, cycles)
+        first = self._trace(header, trace_budget, stop_pc)
+        if first is not None:
+            middle = (self.a, self.d, self.ram[:])
+            second = self._trace(header, min(len(first), cycles - len(first))
+                                 if cycles >= 0 else len(first), stop_pc)
+            if second is not None:
+                skipped = self._skip_affine(
+                    first, second, start, middle,
+                    cycles - 2 * len(first) if cycles >= 0 else -1)
+        elif self.cycles - start_cycles == MAX_TRACE and stop_pc < 0:
+            skipped = self._skip_periods(
+                header, start, cycles - MAX_TRACE if cycles >= 0 else -1)
+
+        if skipped:
+            self.loop_hits[header] = 0
+            self.loop_backoff.pop(header, None)
+        else:
+            backoff = min(2 * self.loop_backoff.get(header, LOOP_THRESHOLD),
+                          MAX_LOOP_BACKOFF)
+            self.loop_backoff[header] = backoff
+            self.loop_hits[header] = -backoff
+        return self.cycles - start_cycles
+
+    def _trace(self, header: int, limit: int, stop_pc: int
+               ) -> typing.Optional[list]:
+        """Runs instructions one at a time until PC comes back to the given
+        address, recording the operands and result of each.
+
+        Args:
+            header (int): the address of the loop's first instruction.
+            limit (int): the most instructions to run.
+            stop_pc (int): stop early at this address, if not negative.
+
+        Returns:
+            typing.Optional[list]: a (pc, a, x, y, out) tuple per
+            instruction, or None if PC did not come back in time.
+        """
+        program, ram = self.program, self.ram
+        records = []
+        while len(records) < limit and self.pc != stop_pc:
+            pc, a, d = self.pc, self.a, self.d
+            decoded = program[pc]
+            if decoded.handler == A_INSTRUCTION:
+                records.append((pc, a, d, 0, 0))
+            else:
+                y = ram[a & 0x7FFF] if decoded.reads_m else a
+                records.append((pc, a, d, y, decoded.function(d, y)))
+            Emulator._run(self, 1, -1)
+            if self.pc == header:
+                return records
+        return None
+
+    def _skip_affine(self, first: list, second: list,
+                     start: typing.Tuple[int, int, typing.Any],
+                     middle: typing.Tuple[int, int, typing.Any],
+                     cycles: int) -> int:
+        """Skips the iterations that will follow the two traced ones, if
+        the loop is affine as described in the class's documentation.
+
+        Args:
+            first (list): the first traced iteration.
+            second (list): the second traced iteration.
+            start (typing.Tuple[int, int, typing.Any]): A, D and a copy of
+                RAM before the first iteration.
+            middle (typing.Tuple[int, int, typing.Any]): the same before
+                the second iteration.
+            cycles (int): the run's remaining instructions, unlimited if
+                negative.
+
+        Returns:
+            int: the number of instructions skipped.
+        """
+        if [record[0] for record in first] != [record[0] for record in second]:
+            return 0
+        program = self.program
+        iterations = None
+        written = set()
+        for (pc, a1, x1, y1, out1), (_, a2, x2, y2, out2) in zip(first,
+                                                                 second):
+            decoded = program[pc]
+            if decoded.handler == A_INSTRUCTION:
+                continue
+            if decoded.reads_m or decoded.writes_m or decoded.handler == JUMP:
+                # Addresses and jump targets must not move
+                if a1 != a2:
+                    return 0
+            if decoded.writes_m:
+                written.add(a1 & 0x7FFF)
+            if decoded.function not in AFFINE_FUNCTIONS and (
+                    x1 != x2 or y1 != y2):
+                return 0
+            if decoded.handler == JUMP and not (
+                    decoded.jeq and decoded.jlt and decoded.jgt):
+                steps = steps_in_sign(out2, (out2 - out1) & 0xFFFF)
+                if steps is not None:
+                    iterations = steps if iterations is None \
+                        else min(iterations, steps)
+
+        # Each iteration must change the machine's state by the same amount
+        state = [self.a, self.d] + [self.ram[address] for address in written]
+        before = [middle[0], middle[1]] + [
+            middle[2][address] for address in written]
+        initial = [start[0], start[1]] + [
+            start[2][address] for address in written]
+        deltas = [(after - previous) & 0xFFFF
+                  for after, previous in zip(state, before)]
+        if deltas != [(previous - first_value) & 0xFFFF
+                      for previous, first_value in zip(before, initial)]:
+            return 0
+
+        period = len(first)
+        if cycles >= 0:
+            budget = cycles // period
+            iterations = budget if iterations is None \
+                else min(iterations, budget)
+        if not iterations:
+            return 0
+        self.a = (self.a + iterations * deltas[0]) & 0xFFFF
+        self.d = (self.d + iterations * deltas[1]) & 0xFFFF
+        for address, delta in zip(written, deltas[2:]):
+            self.ram[address] = (self.ram[address] + iterations * delta) \
+                & 0xFFFF
+        self.cycles += iterations * period
+        self.skipped += iterations * period
+        return iterations * period
+
+    def _skip_periods(self, header: int,
+                      start: typing.Tuple[int, int, typing.Any],
+                      cycles: int) -> int:
+        """Finishes the current iteration, and skips as many iterations as
+        the run has room for if it ended in the state it started from.
+
+        Args:
+            header (int): the address of the loop's first instruction.
+            start (typing.Tuple[int, int, typing.Any]): A, D and a copy of
+                RAM before the iteration.
+            cycles (int): the run's remaining instructions, unlimited if
+                negative.
+
+        Returns:
+            int: the number of instructions skipped.
+        """
+        if cycles < 0:
+            return 0
+        self.measuring_period = True
+        try:
+            period = MAX_TRACE + BlockEmulator._run(
+                self, min(cycles, MAX_PERIOD - MAX_TRACE), header)
+        finally:
+            self.measuring_period = False
+        if (self.pc != header or (self.a, self.d) != start[:2]
+                or self.ram != start[2]):
+            return 0
+        iterations = (cycles - period + MAX_TRACE) // period
+        self.cycles += iterations * period
+        self.skipped += iterations * period
+        return iterations * period
@@ -0,0 +1,143 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import os
+import struct
+import zlib
+import numpy as np
+from BlockEmulator import BlockEmulator
+from Emulator import SCREEN, SCREEN_SIZE, Emulator
+
+# Size of the Hack screen, in pixels
+WIDTH = 512
+HEIGHT = 256
+WORDS_PER_ROW = WIDTH // 16
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def png_chunk(kind: bytes, data: bytes) -> bytes:
+    """
+    Args:
+        kind (bytes): the chunk's four-letter type.
+        data (bytes): the chunk's contents.
+
+    Returns:
+        bytes: the chunk, with its length and checksum.
+    """
+    return (struct.pack(">I", len(data)) + kind + data
+            + struct.pack(">I", zlib.crc32(kind + data)))
+
+
+class Framebuffer:
+    """A view of an emulator's screen memory as a 256x512 bitmap, which can
+    be written out as PBM or PNG frames.
+
+    Each refresh compares screen memory with what it held at the previous
+    refresh, and only unpacks the rows that changed, all with vectorized
+    NumPy operations. The packed rows of both image formats are kept up to
+    date the same way, so writing many frames of a mostly still screen
+    costs little more than the comparison.
+    """
+
+    def __init__(self, emulator: Emulator) -> None:
+        """Creates a framebuffer for the given emulator's screen.
+
+        Args:
+            emulator (Emulator): the emulator whose screen to show.
+        """
+        # Screen memory, without copying it out of RAM
+        self.words = np.frombuffer(
+            emulator.ram, dtype=np.uint16, count=SCREEN_SIZE,
+            offset=SCREEN * emulator.ram.itemsize).reshape(
+                HEIGHT, WORDS_PER_ROW)
+        self.previous = np.zeros((HEIGHT, WORDS_PER_ROW), dtype=np.uint16)
+        # 1 for black pixels, 0 for white ones
+        self.bitmap = np.zeros((HEIGHT, WIDTH), dtype=np.uint8)
+        # PBM rows are packed MSB first with 1 for black; PNG rows also
+        # start with a filter byte, and use 1 for white
+        self.pbm_rows = np.zeros((HEIGHT, WIDTH // 8), dtype=np.uint8)
+        self.png_rows = np.zeros((HEIGHT, 1 + WIDTH // 8), dtype=np.uint8)
+        self.png_rows[:, 1:] = 0xFF
+
+    def refresh(self) -> np.ndarray:
+        """Brings the bitmap up to date with screen memory.
+
+        Returns:
+            np.ndarray: indices of the rows that changed since the last
+            refresh.
+        """
+        rows = np.flatnonzero((self.words != self.previous).any(axis=1))
+        if rows.size:
+            words = self.words[rows]
+            self.previous[rows] = words
+            # The leftmost pixel of each word is its least significant bit
+            pixels = np.unpackbits(
+                words.astype("<u2").view(np.uint8), axis=1,
+                bitorder="little")
+            self.bitmap[rows] = pixels
+            packed = np.packbits(pixels, axis=1)
+            self.pbm_rows[rows] = packed
+            self.png_rows[rows, 1:] = ~packed
+        return rows
+
+    def pbm(self) -> bytes:
+        """
+        Returns:
+            bytes: the current frame, as a binary PBM image.
+        """
+        self.refresh()
+        return f"P4\n{WIDTH} {HEIGHT}\n".encode() + self.pbm_rows.tobytes()
+
+    def png(self, level: int = 6) -> bytes:
+        """
+        Args:
+            level (int): the zlib compression level.
+
+        Returns:
+            bytes: the current frame, as a 1-bit grayscale PNG image.
+        """
+        self.refresh()
+        header = struct.pack(">IIBBBBB", WIDTH, HEIGHT, 1, 0, 0, 0, 0)
+        return (PNG_SIGNATURE + png_chunk(b"IHDR", header)
+                + png_chunk(b"IDAT", zlib.compress(
+                    self.png_rows.tobytes(), level))
+                + png_chunk(b"IEND", b""))
+
+    def save(self, path: str) -> None:
+        """Writes the current frame, as PNG if the path ends with .png and
+        as PBM otherwise.
+
+        Args:
+            path (str): path of the image file.
+        """
+        is_png = os.path.splitext(path)[1].lower() == ".png"
+        with open(path, 'wb') as image_file:
+            image_file.write(self.png() if is_png else self.pbm())
+
+
+if "__main__" == __name__:
+    argument_parser = argparse.ArgumentParser(prog="Framebuffer")
+    argument_parser.add_argument("path", help="a .hack or .hackbin file")
+    argument_parser.add_argument(
+        "output", help="image path, with a %%d for the frame number when "
+                       "writing several frames, e.g. frames/%%05d.png")
+    argument_parser.add_argument(
+        "--cycles", type=int, default=1000000, metavar="N",
+        help="instructions to run before each frame")
+    argument_parser.add_argument(
+        "--frames", type=int, default=1, metavar="N",
+        help="number of frames to write")
+    arguments = argument_parser.parse_args()
+
+    emulator = BlockEmulator(arguments.path)
+    framebuffer = Framebuffer(emulator)
+    for frame in range(arguments.frames):
+        emulator.run(arguments.cycles)
+        framebuffer.save(arguments.output % frame if "%" in arguments.output
+                         else arguments.output)
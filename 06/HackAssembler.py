@@ -0,0 +1,396 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+import concurrent.futures
+import io
+import typing
+import HackFile
+from SymbolTable import SymbolTable
+from Parser import Parser, decode, stream
+from Code import Code
+from Optimizer import Optimizer
+from DeadCode import eliminate_dead_code
+
+# Bump whenever a change to the assembler changes its output, so build
+# caches do not hand out stale machine code
+ASSEMBLER_VERSION = "4"
+
+# A-instructions carry a 15-bit constant
+MAX_CONSTANT = 32767
+
+# Number of words assemble_stream buffers before writing them out
+STREAM_CHUNK_SIZE = 65536
+
+# Approximate number of source characters per assemble_parallel work unit
+PARALLEL_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Formats assemble() can return the machine code in
+OUTPUT_FORMATS = ("words", "bytes", "text")
+
+
+def assemble_parsed(parser: Parser) -> typing.Tuple[array.array, SymbolTable]:
+    """Assembles an already parsed program in a single pass.
+
+    Labels may be used before they are defined, so every A-command that
+    refers to a still-unknown symbol is recorded and backpatched once the
+    matching (LABEL) is seen. Symbols that are never defined as labels are
+    allocated as variables at the end of the pass, in order of first use,
+    which yields exactly the same output as the classic two-pass scheme.
+    The input is read only once, so it does not have to be seekable.
+
+    Args:
+        parser (Parser): the parsed program.
+
+    Returns:
+        typing.Tuple[array.array, SymbolTable]: the machine code, one 16-bit
+        word per instruction, and the final symbol table.
+    """
+    symbol_table = SymbolTable()
+    code = Code()
+    words = array.array('H')
+    # Maps each unresolved symbol to the indices of the words that use it
+    unresolved = {}
+
+    for index, instruction in enumerate(parser.instructions):
+        kind = instruction.kind
+
+        if kind == "A_COMMAND":
+            symbol = instruction.symbol
+            if symbol.isdigit():
+                address = int(symbol)
+                if address > MAX_CONSTANT:
+                    raise ValueError(
+                        f"line {parser.line_numbers[index]}: constant "
+                        f"{symbol} does not fit in an A-instruction")
+                words.append(address)
+            elif symbol_table.contains(symbol):
+                words.append(symbol_table.get_address(symbol))
+            else:
+                # Unknown for now: emit a placeholder and patch it later
+                unresolved.setdefault(symbol, []).append(len(words))
+                words.append(0)
+
+        elif kind == "C_COMMAND":
+            words.append(code.encode(
+                instruction.dest, instruction.comp, instruction.jump))
+
+        elif kind == "L_COMMAND":
+            symbol = instruction.symbol
+            symbol_table.add_entry(symbol, len(words))
+            # Backpatch every earlier forward reference to this label
+            for position in unresolved.pop(symbol, ()):
+                words[position] = len(words)
+
+    # Whatever is still unresolved is a variable, allocated by first use
+    next_var_address = 16
+    for symbol, positions in unresolved.items():
+        symbol_table.add_entry(symbol, next_var_address)
+        for position in positions:
+            words[position] = next_var_address
+        next_var_address += 1
+
+    return words, symbol_table
+
+
+def transform(parser: Parser, optimizer: typing.Optional[Optimizer] = None,
+              dead_code: bool = False) -> int:
+    """Runs the optional program transformations over a parsed program,
+    before it is encoded.
+
+    Args:
+        parser (Parser): the parsed program, rewritten in place.
+        optimizer (typing.Optional[Optimizer]): if given, runs its peephole
+            rules over the program.
+        dead_code (bool): remove code unreachable from address 0 first.
+
+    Returns:
+        int: the number of instructions removed as dead code.
+    """
+    removed = eliminate_dead_code(parser) if dead_code else 0
+    if optimizer is not None:
+        optimizer.optimize(parser)
+    return removed
+
+
+def assemble(
+        source: typing.Union[str, typing.Iterable[str]],
+        output_format: str = "words",
+        optimizer: typing.Optional[Optimizer] = None,
+        dead_code: bool = False) -> typing.Tuple[
+            typing.Union[array.array, bytes, str], SymbolTable]:
+    """Assembles a program held in memory, without touching the disk.
+
+    Args:
+        source (typing.Union[str, typing.Iterable[str]]): the program, either
+            as one string or as an iterable of lines (with or without line
+            breaks), e.g. the output of a VM translator kept in memory.
+        output_format (str): "words" for an array('H') with one word per
+            instruction, "bytes" for a packed binary image as written by
+            HackFile.write_binary, or "text" for the contents of a .hack file.
+        optimizer (typing.Optional[Optimizer]): if given, runs over the parsed
+            program before it is encoded.
+        dead_code (bool): remove code unreachable from address 0.
+
+    Returns:
+        typing.Tuple[typing.Union[array.array, bytes, str], SymbolTable]: the
+        machine code in the requested format, and the final symbol table.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    if isinstance(source, str):
+        source = source.splitlines()
+    parser = Parser(source)
+    transform(parser, optimizer, dead_code)
+    words, symbol_table = assemble_parsed(parser)
+
+    if output_format == "bytes":
+        output = io.BytesIO()
+        HackFile.write_binary(words, output)
+        return output.getvalue(), symbol_table
+    if output_format == "text":
+        output = io.StringIO()
+        HackFile.write_text(words, output)
+        return output.getvalue(), symbol_table
+    return words, symbol_table
+
+
+def assemble_file(
+        input_file: typing.TextIO, output_file: typing.IO,
+        binary: bool = False,
+        optimizer: typing.Optional[Optimizer] = None,
+        dead_code: bool = False) -> int:
+    """Assembles a single file.
+
+    Args:
+        input_file (typing.TextIO): the file to assemble.
+        output_file (typing.IO): writes all output to this file. Must be
+            opened in binary mode if binary is True.
+        binary (bool): write a packed binary image instead of the course's
+            text format.
+        optimizer (typing.Optional[Optimizer]): if given, runs over the parsed
+            program before it is encoded.
+        dead_code (bool): remove code unreachable from address 0.
+
+    Returns:
+        int: the number of instructions assembled.
+    """
+    parser = Parser(input_file)
+    transform(parser, optimizer, dead_code)
+    words, _ = assemble_parsed(parser)
+    if binary:
+        HackFile.write_binary(words, output_file)
+    else:
+        HackFile.write_text(words, output_file)
+    return len(words)
+
+
+def assemble_stream(
+        input_file: typing.TextIO, output_file: typing.IO,
+        binary: bool = False) -> int:
+    """Assembles a single file with bounded memory use: the input is decoded
+    lazily in two streaming passes and the output is written in chunks, so
+    memory grows with the symbol table rather than with the file's size.
+    The input must be seekable; use assemble_file for pipes.
+
+    Args:
+        input_file (typing.TextIO): the file to assemble.
+        output_file (typing.IO): writes all output to this file. Must be
+            opened in binary mode if binary is True.
+        binary (bool): write a packed binary image instead of the course's
+            text format.
+
+    Returns:
+        int: the number of instructions assembled.
+    """
+    symbol_table = SymbolTable()
+    code = Code()
+
+    # First pass: collect all labels and count the instructions
+    instruction_address = 0
+    for _, instruction in stream(input_file):
+        if instruction.kind == "L_COMMAND":
+            symbol_table.add_entry(instruction.symbol, instruction_address)
+        else:
+            instruction_address += 1
+
+    if binary:
+        output_file.write(HackFile.HEADER.pack(
+            HackFile.MAGIC, HackFile.VERSION, instruction_address))
+        write_words = HackFile.write_words
+    else:
+        write_words = HackFile.write_text
+
+    # Second pass: translate commands, flushing every STREAM_CHUNK_SIZE words
+    input_file.seek(0)
+    next_var_address = 16
+    words = array.array('H')
+    for line_number, instruction in stream(input_file):
+        kind = instruction.kind
+
+        if kind == "A_COMMAND":
+            symbol = instruction.symbol
+            if symbol.isdigit():
+                address = int(symbol)
+                if address > MAX_CONSTANT:
+                    raise ValueError(
+                        f"line {line_number}: constant {symbol} does not "
+                        f"fit in an A-instruction")
+            else:
+                if not symbol_table.contains(symbol):
+                    symbol_table.add_entry(symbol, next_var_address)
+                    next_var_address += 1
+                address = symbol_table.get_address(symbol)
+            words.append(address)
+
+        elif kind == "C_COMMAND":
+            words.append(code.encode(
+                instruction.dest, instruction.comp, instruction.jump))
+
+        if len(words) >= STREAM_CHUNK_SIZE:
+            write_words(words, output_file)
+            del words[:]
+
+    write_words(words, output_file)
+    return instruction_address
+
+
+def resolve_symbols(lines: typing.Iterable[str]) -> SymbolTable:
+    """Finds the address of every label and variable with a cheap scan that
+    only looks at each distinct line's kind and symbol, without encoding.
+    Variables get addresses in order of first use, as in assemble_parsed.
+
+    Args:
+        lines (typing.Iterable[str]): the program's source lines.
+
+    Returns:
+        SymbolTable: the complete symbol table.
+    """
+    symbol_table = SymbolTable()
+    # Every A-command symbol in order of first use; dicts keep that order
+    used = {}
+    decoded = {}
+    missing = object()
+    instruction_address = 0
+    for line in lines:
+        instruction = decoded.get(line, missing)
+        if instruction is missing:
+            instruction = decoded[line] = decode(line)
+        if instruction is None:
+            continue
+        if instruction.kind == "L_COMMAND":
+            symbol_table.add_entry(instruction.symbol, instruction_address)
+            continue
+        if instruction.kind == "A_COMMAND" \
+                and not instruction.symbol.isdigit():
+            used[instruction.symbol] = None
+        instruction_address += 1
+
+    next_var_address = 16
+    for symbol in used:
+        if not symbol_table.contains(symbol):
+            symbol_table.add_entry(symbol, next_var_address)
+            next_var_address += 1
+    return symbol_table
+
+
+# The symbol table of the program being assembled, set once per worker
+# process by _start_worker so it is not sent along with every chunk
+_worker_symbols: typing.Dict[str, int] = {}
+
+
+def _start_worker(symbols: typing.Dict[str, int]) -> None:
+    global _worker_symbols
+    _worker_symbols = symbols
+
+
+def _encode_chunk(chunk: str, first_line: int) -> bytes:
+    """Encodes one chunk of source lines in a worker process.
+
+    Args:
+        chunk (str): whole source lines, as one string.
+        first_line (int): the 1-based line number of the chunk's first line.
+
+    Returns:
+        bytes: the chunk's machine code, as the raw bytes of an array('H').
+    """
+    parser = Parser(chunk.splitlines())
+    code = Code()
+    words = array.array('H')
+    for index, instruction in enumerate(parser.instructions):
+        kind = instruction.kind
+        if kind == "A_COMMAND":
+            symbol = instruction.symbol
+            if symbol.isdigit():
+                address = int(symbol)
+                if address > MAX_CONSTANT:
+                    line_number = parser.line_numbers[index] + first_line - 1
+                    raise ValueError(
+                        f"line {line_number}: constant {symbol} does not "
+                        f"fit in an A-instruction")
+                words.append(address)
+            else:
+                words.append(_worker_symbols[symbol])
+        elif kind == "C_COMMAND":
+            words.append(code.encode(
+                instruction.dest, instruction.comp, instruction.jump))
+    return words.tobytes()
+
+
+def assemble_parallel(
+        input_file: typing.TextIO, output_file: typing.IO,
+        binary: bool = False, jobs: typing.Optional[int] = None,
+        chunk_size: int = PARALLEL_CHUNK_SIZE) -> int:
+    """Assembles a single large file on a pool of worker processes.
+
+    Once every label is known and variables have their addresses, no line
+    depends on any other, so the symbols are resolved first by a cheap
+    serial scan, and then chunks of whole lines are parsed and encoded in
+    parallel and joined in order. The output is identical to that of
+    assemble_file.
+
+    Args:
+        input_file (typing.TextIO): the file to assemble.
+        output_file (typing.IO): writes all output to this file. Must be
+            opened in binary mode if binary is True.
+        binary (bool): write a packed binary image instead of the course's
+            text format.
+        jobs (typing.Optional[int]): number of worker processes, the number
+            of CPUs if None.
+        chunk_size (int): approximate number of source characters per chunk.
+
+    Returns:
+        int: the number of instructions assembled.
+    """
+    source = input_file.read()
+    symbol_table = resolve_symbols(source.splitlines())
+
+    # Cut the source into chunks of whole lines, numbering their first lines
+    chunks = []
+    start, first_line = 0, 1
+    while start < len(source):
+        end = source.find('\n', start + chunk_size)
+        end = len(source) if end == -1 else end + 1
+        chunks.append((source[start:end], first_line))
+        first_line += source.count('\n', start, end)
+        start = end
+
+    words = array.array('H')
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=jobs, initializer=_start_worker,
+            initargs=(symbol_table.table,)) as pool:
+        futures = [pool.submit(_encode_chunk, chunk, line)
+                   for chunk, line in chunks]
+        # Joining in submission order keeps the words in source order
+        for future in futures:
+            words.frombytes(future.result())
+
+    if binary:
+        HackFile.write_binary(words, output_file)
+    else:
+        HackFile.write_text(words, output_file)
+    return len(words)
@@ -0,0 +1,134 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+import mmap
+import struct
+import sys
+import typing
+
+# Packed binary images start with this header: magic, format version and
+# the number of 16-bit words that follow. All words are little-endian.
+MAGIC = b"HACK"
+VERSION = 1
+HEADER = struct.Struct("<4sHI")
+
+# Extension of packed binary images, the text format keeps ".hack"
+BINARY_EXTENSION = ".hackbin"
+
+# Size of the Hack instruction memory, in words
+ROM_SIZE = 32768
+
+
+def write_text(words: typing.Sequence[int],
+               output_file: typing.TextIO) -> None:
+    """Writes machine code in the course's text format, one 16-character
+    binary string per line.
+
+    Args:
+        words (typing.Sequence[int]): the instruction words.
+        output_file (typing.TextIO): writes all output to this file.
+    """
+    output_file.writelines(format(word, '016b') + "\n" for word in words)
+
+
+def write_binary(words: array.array, output_file: typing.BinaryIO) -> None:
+    """Writes machine code as a packed binary image, using a single bulk
+    write for all the words.
+
+    Args:
+        words (array.array): the instruction words, of typecode 'H'.
+        output_file (typing.BinaryIO): writes all output to this file.
+    """
+    output_file.write(HEADER.pack(MAGIC, VERSION, len(words)))
+    write_words(words, output_file)
+
+
+def write_words(words: array.array, output_file: typing.BinaryIO) -> None:
+    """Writes raw little-endian words, without a header. Lets a packed image
+    be written in several chunks after its header.
+
+    Args:
+        words (array.array): the instruction words, of typecode 'H'.
+        output_file (typing.BinaryIO): writes all output to this file.
+    """
+    if sys.byteorder != "little":
+        words = array.array('H', words)
+        words.byteswap()
+    output_file.write(memoryview(words).cast('B'))
+
+
+def is_binary(path: str) -> bool:
+    """Does the given file hold a packed binary image?
+
+    Args:
+        path (str): path of a machine code file.
+
+    Returns:
+        bool: True for a packed binary image, False for the text format.
+    """
+    with open(path, 'rb') as machine_file:
+        return machine_file.read(len(MAGIC)) == MAGIC
+
+
+def load_into(path: str, rom: array.array) -> int:
+    """Loads a machine code file, in either format, into the beginning of
+    the given memory. Packed images are memory-mapped and copied in with a
+    single memcpy, without creating a Python object per word.
+
+    Args:
+        path (str): path of a machine code file.
+        rom (array.array): memory of typecode 'H' to load the program into,
+            usually ROM_SIZE words long.
+
+    Returns:
+        int: the number of words loaded.
+    """
+    if not is_binary(path):
+        with open(path, 'r') as text_file:
+            words = array.array('H', (
+                int(line, 2) for line in text_file if line.strip()))
+        if len(words) > len(rom):
+            raise ValueError(f"{path}: program does not fit in memory")
+        rom[:len(words)] = words
+        return len(words)
+
+    with open(path, 'rb') as binary_file, \
+            mmap.mmap(binary_file.fileno(), 0,
+                      access=mmap.ACCESS_READ) as image:
+        magic, version, count = HEADER.unpack_from(image)
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported image version {version}")
+        if count > len(rom):
+            raise ValueError(f"{path}: program does not fit in memory")
+        size = count * rom.itemsize
+        if HEADER.size + size > len(image):
+            raise ValueError(f"{path}: truncated image")
+        with memoryview(image) as view, \
+                view[HEADER.size:HEADER.size + size] as source, \
+                memoryview(rom) as target, target.cast('B') as target_bytes:
+            target_bytes[:size] = source
+    if sys.byteorder != "little":
+        loaded = rom[:count]
+        loaded.byteswap()
+        rom[:count] = loaded
+    return count
+
+
+def load(path: str) -> array.array:
+    """Loads a machine code file, in either format.
+
+    Args:
+        path (str): path of a machine code file.
+
+    Returns:
+        array.array: a full ROM_SIZE words ROM of typecode 'H', with the
+        program at its beginning and zeros after it.
+    """
+    rom = array.array('H', bytes(2 * ROM_SIZE))
+    load_into(path, rom)
+    return rom
@@ -0,0 +1,302 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import os
+import select
+import sys
+import time
+import typing
+from Emulator import KBD, Emulator
+from FastForwardEmulator import FastForwardEmulator
+from Framebuffer import Framebuffer
+
+# Codes of the Hack keyboard's special keys, section 5.2.5 of the book.
+# Letters and other printable keys use their (upper case) ASCII codes.
+KEY_CODES = {
+    "none": 0, "space": 32, "newline": 128, "backspace": 129, "left": 130,
+    "up": 131, "right": 132, "down": 133, "home": 134, "end": 135,
+    "pageup": 136, "pagedown": 137, "insert": 138, "delete": 139,
+    "esc": 140,
+}
+KEY_CODES.update({f"f{number}": 140 + number for number in range(1, 13)})
+
+# Length of a frame, for timelines that count time in frames
+FRAME_CYCLES = 100000
+
+# Terminal input sequences of the special keys, for recording
+TERMINAL_KEYS = {
+    "\x1b[A": KEY_CODES["up"], "\x1b[B": KEY_CODES["down"],
+    "\x1b[C": KEY_CODES["right"], "\x1b[D": KEY_CODES["left"],
+    "\x1b[H": KEY_CODES["home"], "\x1b[F": KEY_CODES["end"],
+    "\x1b[5~": KEY_CODES["pageup"], "\x1b[6~": KEY_CODES["pagedown"],
+    "\x1b[2~": KEY_CODES["insert"], "\x1b[3~": KEY_CODES["delete"],
+    "\x1b": KEY_CODES["esc"], "\r": KEY_CODES["newline"],
+    "\n": KEY_CODES["newline"], "\x7f": KEY_CODES["backspace"],
+}
+
+
+class KeyEvent(typing.NamedTuple):
+    """The keyboard register taking a new value, held until the next
+    event."""
+    cycle: int   # number of instructions run before the key changes
+    key: int     # the new key code, 0 once the key is released
+
+
+def parse_key(word: str) -> int:
+    """
+    Args:
+        word (str): a key code, a name from KEY_CODES, or a single
+            printable character.
+
+    Returns:
+        int: the key code.
+    """
+    if word.isdigit():
+        return int(word)
+    if word.lower() in KEY_CODES:
+        return KEY_CODES[word.lower()]
+    if len(word) == 1 and word.isprintable():
+        return ord(word.upper())
+    raise ValueError(f"unknown key: {word}")
+
+
+def parse_timeline(lines: typing.Iterable[str]) -> typing.List[KeyEvent]:
+    """Parses an input timeline. Every line holds a time and a key, e.g.
+    "1500000 left" or "40f 0"; times are in cycles, or in frames when they
+    end with "f". A "frame N" line sets the number of cycles per frame for
+    the lines after it, FRAME_CYCLES by default. Comments start with "//".
+
+    Args:
+        lines (typing.Iterable[str]): the timeline's lines.
+
+    Returns:
+        typing.List[KeyEvent]: the events, in time order.
+    """
+    events = []
+    frame_cycles = FRAME_CYCLES
+    for number, line in enumerate(lines, 1):
+        words = line.split("//")[0].split()
+        if not words:
+            continue
+        try:
+            if len(words) != 2:
+                raise ValueError("expected a time and a key")
+            time_word, key_word = words
+            if time_word == "frame":
+                frame_cycles = int(key_word)
+                continue
+            if time_word.endswith("f"):
+                cycle = int(time_word[:-1]) * frame_cycles
+            else:
+                cycle = int(time_word)
+            events.append(KeyEvent(cycle, parse_key(key_word)))
+        except ValueError as error:
+            raise ValueError(f"line {number}: {error}") from None
+    events.sort(key=lambda event: event.cycle)
+    return events
+
+
+def load_timeline(path: str) -> typing.List[KeyEvent]:
+    """
+    Args:
+        path (str): path of a timeline file.
+
+    Returns:
+        typing.List[KeyEvent]: the events, in time order.
+    """
+    with open(path, 'r') as timeline_file:
+        try:
+            return parse_timeline(timeline_file)
+        except ValueError as error:
+            raise ValueError(f"{path}: {error}") from None
+
+
+def write_timeline(events: typing.Iterable[KeyEvent],
+                   output_file: typing.TextIO) -> None:
+    """Writes events in the timeline format, with times in cycles.
+
+    Args:
+        events (typing.Iterable[KeyEvent]): the events.
+        output_file (typing.TextIO): writes all output to this file.
+    """
+    output_file.writelines(f"{event.cycle} {event.key}\n" for event in events)
+
+
+class Player:
+    """Runs an emulator while replaying an input timeline into its keyboard
+    register. The emulator runs uninterrupted from one event to the next,
+    so replaying costs nothing per instruction, and every key changes
+    exactly at its cycle whatever the emulator's speed.
+    """
+
+    def __init__(self, emulator: Emulator,
+                 events: typing.Sequence[KeyEvent]) -> None:
+        """
+        Args:
+            emulator (Emulator): the machine. Event times count from its
+                cycle 0.
+            events (typing.Sequence[KeyEvent]): the timeline, in time order.
+        """
+        self.emulator = emulator
+        self.events = events
+        self.position = 0
+
+    @property
+    def next_event(self) -> typing.Optional[KeyEvent]:
+        """typing.Optional[KeyEvent]: the next event to replay, or None
+        once the timeline is over."""
+        if self.position < len(self.events):
+            return self.events[self.position]
+        return None
+
+    def run(self, cycles: int) -> int:
+        """Runs the given number of instructions, replaying the events
+        that fall within them.
+
+        Args:
+            cycles (int): number of instructions to run.
+
+        Returns:
+            int: the number of instructions run.
+        """
+        emulator, events = self.emulator, self.events
+        end = emulator.cycles + cycles
+        while True:
+            while (self.position < len(events)
+                   and events[self.position].cycle <= emulator.cycles):
+                emulator.ram[KBD] = events[self.position].key
+                self.position += 1
+            if emulator.cycles >= end:
+                return cycles
+            stop = end
+            if self.position < len(events):
+                stop = min(stop, events[self.position].cycle)
+            emulator.run(stop - emulator.cycles)
+
+
+class Recorder:
+    """Records the keys pressed during a live session, for replaying it
+    later."""
+
+    def __init__(self, emulator: Emulator) -> None:
+        """
+        Args:
+            emulator (Emulator): the machine, whose cycle count times the
+                events.
+        """
+        self.emulator = emulator
+        self.events: typing.List[KeyEvent] = []
+
+    def press(self, key: int) -> None:
+        """Sets the keyboard register, and records the change if it is one.
+
+        Args:
+            key (int): the key code, 0 to release all keys.
+        """
+        if self.emulator.ram[KBD] != key:
+            self.emulator.ram[KBD] = key
+            self.events.append(KeyEvent(self.emulator.cycles, key))
+
+    def save(self, path: str) -> None:
+        """Writes the recorded events as a timeline file.
+
+        Args:
+            path (str): path of the timeline file.
+        """
+        with open(path, 'w') as timeline_file:
+            write_timeline(self.events, timeline_file)
+
+
+def record_terminal(recorder: Recorder, hold: int, slice_cycles: int,
+                    on_slice: typing.Callable[[], None]) -> None:
+    """Runs the emulator while reading keys from the terminal, until
+    Ctrl-C. Terminals only report key presses, so every key is held
+    for a fixed number of cycles and then released.
+
+    Args:
+        recorder (Recorder): records the keys.
+        hold (int): number of cycles each key is held for.
+        slice_cycles (int): number of cycles to run between keyboard checks.
+        on_slice (typing.Callable[[], None]): called after every slice,
+            e.g. to show the screen.
+    """
+    # Only available on Unix, and only needed here
+    import termios
+    import tty
+    emulator = recorder.emulator
+    settings = termios.tcgetattr(sys.stdin)
+    tty.setcbreak(sys.stdin.fileno())
+    release_at = -1
+    try:
+        while True:
+            if select.select([sys.stdin], [], [], 0)[0]:
+                typed = os.read(sys.stdin.fileno(), 16).decode(
+                    errors="replace")
+                if "\x03" in typed:
+                    break
+                key = TERMINAL_KEYS.get(typed)
+                if key is None and len(typed) == 1 and typed.isprintable():
+                    key = ord(typed.upper())
+                if key is not None:
+                    recorder.press(key)
+                    release_at = emulator.cycles + hold
+            if 0 <= release_at <= emulator.cycles:
+                recorder.press(0)
+                release_at = -1
+            emulator.run(slice_cycles)
+            on_slice()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        termios.tcsetattr(sys.stdin, termios.TCSADRAIN, settings)
+    recorder.press(0)
+
+
+if "__main__" == __name__:
+    argument_parser = argparse.ArgumentParser(
+        prog="Keyboard",
+        description="Replays or records keyboard input of a Hack program.")
+    argument_parser.add_argument("mode", choices=("play", "record"))
+    argument_parser.add_argument("path", help="a .hack or .hackbin file")
+    argument_parser.add_argument("timeline", help="the timeline file")
+    argument_parser.add_argument(
+        "--cycles", type=int, default=10000000, metavar="N",
+        help="instructions to run when playing (default 10000000)")
+    argument_parser.add_argument(
+        "--screen", metavar="FILE",
+        help="write the screen to this .png or .pbm file when done, and "
+             "every slice while recording")
+    argument_parser.add_argument(
+        "--hold", type=int, default=FRAME_CYCLES, metavar="N",
+        help="cycles a recorded key is held for (default one frame)")
+    argument_parser.add_argument(
+        "--slice", type=int, default=20000, metavar="N",
+        help="cycles run between keyboard checks while recording")
+    arguments = argument_parser.parse_args()
+
+    emulator = FastForwardEmulator(arguments.path)
+    framebuffer = Framebuffer(emulator)
+
+    def show_screen() -> None:
+        if arguments.screen:
+            framebuffer.save(arguments.screen)
+
+    if arguments.mode == "play":
+        player = Player(emulator, load_timeline(arguments.timeline))
+        start = time.perf_counter()
+        player.run(arguments.cycles)
+        elapsed = time.perf_counter() - start
+        print(f"{arguments.cycles} cycles in {elapsed:.3f}s "
+              f"({arguments.cycles / elapsed:,.0f} instr/s)")
+    else:
+        recorder = Recorder(emulator)
+        record_terminal(recorder, arguments.hold, arguments.slice,
+                        show_screen)
+        recorder.save(arguments.timeline)
+        print(f"{len(recorder.events)} events in {emulator.cycles} cycles")
+    show_screen()
@@ -1,110 +1,252 @@
-"""
-This file is part of nand2tetris, as taught in The Hebrew University, and
-was written by Aviv Yaish. It is an extension to the specifications given
-[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
-as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
-Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
-"""
-import os
-import sys
-import typing
-from SymbolTable import SymbolTable
-from Parser import Parser
-from Code import Code
-
-
-def assemble_file(
-        input_file: typing.TextIO, output_file: typing.TextIO) -> None:
-    """Assembles a single file.
-
-    Args:
-        input_file (typing.TextIO): the file to assemble.
-        output_file (typing.TextIO): writes all output to this file.
-    """
-    # Initialize a new parser and symbol table
-    parser = Parser(input_file)
-    symbol_table = SymbolTable()
-    instruction_address = 0
-
-    # First pass: collect all symbols
-    while parser.has_more_commands():
-        command_type = parser.command_type()
-
-        if command_type == "A_COMMAND" or command_type == "C_COMMAND":
-            instruction_address += 1
-        
-        elif command_type == "L_COMMAND":
-            symbol = parser.symbol()
-            symbol_table.add_entry(symbol, instruction_address)
-        
-        parser.advance()
-    
-    # Reset the file for second pass
-    input_file.seek(0)
-
-    # Second pass: translate commands to binary
-    parser = Parser(input_file)
-    code = Code()
-    next_var_address = 16
-
-    while parser.has_more_commands():
-        command_type = parser.command_type()
-
-        if command_type == "A_COMMAND":
-            symbol = parser.symbol()
-            if symbol.isdigit():
-                # Convert to int
-                address = int(symbol)
-            else:
-                if not symbol_table.contains(symbol):
-                    # Add to symbol table
-                    symbol_table.add_entry(symbol, next_var_address)
-                    next_var_address += 1
-                
-                address = symbol_table.get_address(symbol)
-            
-            # Write to output file
-            binary = format(address, '016b')
-            output_file.write(binary + "\n")
-        
-        elif command_type == "C_COMMAND":
-            dest = parser.dest()
-            comp = parser.comp()
-            jump = parser.jump()
-
-            # Get binary codes for all components
-            dest_bits = code.dest(dest)
-            comp_bits = code.comp(comp)
-            jump_bits = code.jump(jump)
-            
-            # All C-commands (including shifts) start with "111"
-            binary = "111" + comp_bits + dest_bits + jump_bits
-                
-            output_file.write(binary + '\n')
-        
-        parser.advance()
-
-
-if "__main__" == __name__:
-    # Parses the input path and calls assemble_file on each input file.
-    # This opens both the input and the output files!
-    # Both are closed automatically when the code finishes running.
-    # If the output file does not exist, it is created automatically in the
-    # correct path, using the correct filename.
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: Assembler <input path>")
-    argument_path = os.path.abspath(sys.argv[1])
-    if os.path.isdir(argument_path):
-        files_to_assemble = [
-            os.path.join(argument_path, filename)
-            for filename in os.listdir(argument_path)]
-    else:
-        files_to_assemble = [argument_path]
-    for input_path in files_to_assemble:
-        filename, extension = os.path.splitext(input_path)
-        if extension.lower() != ".asm":
-            continue
-        output_path = filename + ".hack"
-        with open(input_path, 'r') as input_file, \
-                open(output_path, 'w') as output_file:
-            assemble_file(input_file, output_file)
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import concurrent.futures
+import os
+import sys
+import time
+import typing
+import HackFile
+from BuildCache import BuildCache, DEFAULT_DIRECTORY, DEFAULT_LIMIT
+from HackAssembler import (
+    ASSEMBLER_VERSION, assemble_file, assemble_parallel, assemble_parsed,
+    assemble_stream, transform)
+from Optimizer import Optimizer, RULES
+from Parser import parse_path
+
+
+class Options(typing.NamedTuple):
+    """Command line options that affect how each file is assembled."""
+    binary: bool = False    # write packed binary images instead of text
+    streaming: bool = False  # use the bounded-memory assemble_stream
+    # names of the peephole optimizer rules to apply, None to not optimize
+    rules: typing.Optional[typing.Tuple[str, ...]] = None
+    dead_code: bool = False  # remove code unreachable from address 0
+    parallel: int = 0  # encode each file on this many worker processes
+
+    def output_path(self, input_path: str) -> str:
+        """
+        Args:
+            input_path (str): path of an .asm file.
+
+        Returns:
+            str: path of the file its machine code is written to.
+        """
+        filename, _ = os.path.splitext(input_path)
+        return filename + (HackFile.BINARY_EXTENSION if self.binary
+                           else ".hack")
+
+    def fingerprint(self) -> str:
+        """
+        Returns:
+            str: identifies the assembler version and the options that
+            change its output, for use in build cache keys. Streaming and
+            parallel assembly produce the same output, so they are left
+            out.
+        """
+        return (f"{ASSEMBLER_VERSION} binary={self.binary} "
+                f"rules={self.rules} dead_code={self.dead_code}")
+
+
+def assemble_path(input_path: str, options: Options = Options()) -> int:
+    """Assembles the .asm file at the given path into a .hack file (or a
+    packed image) next to it.
+
+    Args:
+        input_path (str): path of the file to assemble.
+        options (Options): how to assemble it.
+
+    Returns:
+        int: the number of instructions assembled.
+    """
+    output_mode = 'wb' if options.binary else 'w'
+    if options.streaming or options.parallel:
+        with open(input_path, 'r') as input_file, \
+                open(options.output_path(input_path),
+                     output_mode) as output_file:
+            if options.streaming:
+                return assemble_stream(input_file, output_file,
+                                       options.binary)
+            return assemble_parallel(input_file, output_file, options.binary,
+                                     options.parallel)
+
+    parser = parse_path(input_path)
+    optimizer = None if options.rules is None else Optimizer(options.rules)
+    removed = transform(parser, optimizer, options.dead_code)
+    words, _ = assemble_parsed(parser)
+    with open(options.output_path(input_path), output_mode) as output_file:
+        if options.binary:
+            HackFile.write_binary(words, output_file)
+        else:
+            HackFile.write_text(words, output_file)
+
+    if options.dead_code:
+        print(f"{input_path}: {removed} unreachable words removed",
+              file=sys.stderr)
+    if optimizer is not None:
+        hits = ", ".join(
+            f"{name} {hits}" for name, hits in optimizer.hits.items())
+        print(f"{input_path}: {len(words)} words after optimization ({hits})",
+              file=sys.stderr)
+    return len(words)
+
+
+def assemble_batch(
+        input_paths: typing.List[str], jobs: int,
+        options: Options = Options()) -> typing.List[str]:
+    """Assembles many files on a pool of worker processes. A file that fails
+    to assemble is reported and skipped, the rest of the batch goes on.
+
+    Args:
+        input_paths (typing.List[str]): paths of the files to assemble.
+        jobs (int): number of worker processes.
+        options (Options): how to assemble them.
+
+    Returns:
+        typing.List[str]: the paths of the files that failed to assemble.
+    """
+    start = time.perf_counter()
+    instructions = 0
+    failed = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(assemble_path, input_path, options): input_path
+            for input_path in input_paths}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                instructions += future.result()
+            except Exception as error:
+                failed.append(futures[future])
+                print(f"{futures[future]}: {error}", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    print(f"{len(input_paths) - len(failed)}/{len(input_paths)} files, "
+          f"{instructions} instructions, {elapsed:.2f}s")
+    return failed
+
+
+def build(input_paths: typing.List[str], jobs: int, options: Options,
+          cache: typing.Optional[BuildCache] = None) -> bool:
+    """Assembles the given files, serially or on a process pool, skipping
+    those whose output is already in the build cache.
+
+    Args:
+        input_paths (typing.List[str]): paths of the files to assemble.
+        jobs (int): number of worker processes, 0 to assemble serially.
+        options (Options): how to assemble them.
+        cache (typing.Optional[BuildCache]): the build cache, if any.
+
+    Returns:
+        bool: True if every file was assembled successfully.
+    """
+    keys = {}
+    if cache is not None:
+        fingerprint = options.fingerprint()
+        missing = []
+        for input_path in input_paths:
+            key = BuildCache.key(input_path, fingerprint)
+            if not cache.fetch(key, options.output_path(input_path)):
+                keys[input_path] = key
+                missing.append(input_path)
+        input_paths = missing
+
+    failed = []
+    if jobs > 0:
+        failed = assemble_batch(input_paths, jobs, options)
+    else:
+        for input_path in input_paths:
+            assemble_path(input_path, options)
+
+    if cache is not None:
+        for input_path, key in keys.items():
+            if input_path not in failed:
+                cache.store(key, options.output_path(input_path))
+        cache.evict()
+        print(cache.summary(), file=sys.stderr)
+    return not failed
+
+
+if "__main__" == __name__:
+    # Parses the input path and calls assemble_file on each input file.
+    # This opens both the input and the output files!
+    # Both are closed automatically when the code finishes running.
+    # If the output file does not exist, it is created automatically in the
+    # correct path, using the correct filename.
+    argument_parser = argparse.ArgumentParser(prog="Assembler")
+    argument_parser.add_argument(
+        "path", help="an .asm file, a directory of them, or - for stdin")
+    argument_parser.add_argument(
+        "--binary", action="store_true",
+        help=f"write packed {HackFile.BINARY_EXTENSION} images instead of "
+             f"text .hack files")
+    argument_parser.add_argument(
+        "--jobs", type=int, default=0, metavar="N",
+        help="assemble files on N worker processes and print a summary")
+    argument_parser.add_argument(
+        "--stream", action="store_true",
+        help="assemble with bounded memory, for very large inputs")
+    argument_parser.add_argument(
+        "--parallel", type=int, default=0, metavar="N",
+        help="split each file into chunks and encode them on N worker "
+             "processes, for very large inputs")
+    argument_parser.add_argument(
+        "--cache", nargs="?", const=DEFAULT_DIRECTORY, metavar="DIR",
+        help=f"reuse outputs of unchanged inputs from a build cache "
+             f"(default {DEFAULT_DIRECTORY})")
+    argument_parser.add_argument(
+        "--cache-limit", type=int, default=DEFAULT_LIMIT, metavar="BYTES",
+        help="evict least recently used cache entries beyond this size")
+    argument_parser.add_argument(
+        "--dead-code", action="store_true",
+        help="remove code unreachable from address 0 and report how much")
+    argument_parser.add_argument(
+        "--optimize", action="store_true",
+        help="run the peephole optimizer and report its rule hits")
+    for rule_name in RULES:
+        argument_parser.add_argument(
+            f"--no-{rule_name.replace('_', '-')}", action="append_const",
+            dest="disabled_rules", const=rule_name, default=[],
+            help=f"with --optimize, skip the {rule_name} rule")
+    arguments = argument_parser.parse_args()
+    if arguments.stream and (arguments.optimize or arguments.dead_code):
+        argument_parser.error(
+            "--optimize and --dead-code cannot be combined with --stream")
+    if arguments.parallel and (arguments.stream or arguments.optimize
+                               or arguments.dead_code or arguments.jobs):
+        argument_parser.error(
+            "--parallel cannot be combined with --stream, --optimize, "
+            "--dead-code or --jobs")
+    enabled_rules = None
+    if arguments.optimize:
+        enabled_rules = tuple(rule_name for rule_name in RULES
+                              if rule_name not in arguments.disabled_rules)
+    options = Options(arguments.binary, arguments.stream, enabled_rules,
+                      arguments.dead_code, arguments.parallel)
+    if arguments.path == "-":
+        # Assemble from a pipe: read stdin, write to stdout
+        assemble_file(
+            sys.stdin,
+            sys.stdout.buffer if arguments.binary else sys.stdout,
+            arguments.binary,
+            None if enabled_rules is None else Optimizer(enabled_rules),
+            arguments.dead_code)
+        sys.exit(0)
+    argument_path = os.path.abspath(arguments.path)
+    if os.path.isdir(argument_path):
+        files_to_assemble = [
+            os.path.join(argument_path, filename)
+            for filename in os.listdir(argument_path)]
+    else:
+        files_to_assemble = [argument_path]
+    files_to_assemble = [
+        input_path for input_path in files_to_assemble
+        if os.path.splitext(input_path)[1].lower() == ".asm"]
+    build_cache = None
+    if arguments.cache is not None:
+        build_cache = BuildCache(arguments.cache, arguments.cache_limit)
+    if not build(files_to_assemble, arguments.jobs, options, build_cache):
+        sys.exit(1)
@@ -0,0 +1,310 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+import typing
+from Parser import Instruction, Parser
+
+# A rule looks at the instructions starting at the given index. If it
+# applies, it returns how many instructions it consumed and what to put in
+# their place; otherwise it returns None.
+Rule = typing.Callable[
+    [typing.List[Instruction], int],
+    typing.Optional[typing.Tuple[int, typing.List[Instruction]]]]
+
+# All known rules by name, in the order they are tried
+RULES: typing.Dict[str, Rule] = {}
+
+# How far back rules that look for an earlier definition of A may search
+LOOKBEHIND = 8
+
+
+def rule(name: str) -> typing.Callable[[Rule], Rule]:
+    """Registers a peephole rule under the given name. New rules can be
+    added from anywhere by decorating a function with @rule("name").
+
+    Args:
+        name (str): the rule's name, used for flags and statistics.
+
+    Returns:
+        typing.Callable[[Rule], Rule]: the decorator.
+    """
+    def register(function: Rule) -> Rule:
+        RULES[name] = function
+        return function
+    return register
+
+
+def c_command(dest: str, comp: str, jump: str = "") -> Instruction:
+    """
+    Args:
+        dest (str): a dest mnemonic string.
+        comp (str): a comp mnemonic string.
+        jump (str): a jump mnemonic string.
+
+    Returns:
+        Instruction: the record of the C-command dest=comp;jump.
+    """
+    return Instruction("C_COMMAND", "", dest, comp, jump)
+
+
+def a_command(symbol: str) -> Instruction:
+    """
+    Args:
+        symbol (str): a symbol or decimal constant.
+
+    Returns:
+        Instruction: the record of the A-command @symbol.
+    """
+    return Instruction("A_COMMAND", symbol, "", "", "")
+
+
+def sets_a(instruction: Instruction) -> bool:
+    """Does the instruction change the A register?"""
+    return instruction.kind == "A_COMMAND" or "A" in instruction.dest
+
+
+def a_is_dead(instructions: typing.List[Instruction], index: int) -> bool:
+    """Is the value of A at the given index overwritten before being used?
+    Only the common case of an A-command coming next (or the program
+    ending) is recognized.
+    """
+    return (index >= len(instructions)
+            or instructions[index].kind == "A_COMMAND")
+
+
+def matches(instructions: typing.List[Instruction], index: int,
+            pattern: typing.Sequence[Instruction]) -> bool:
+    """Are the instructions starting at the given index exactly the given
+    pattern?
+    """
+    return instructions[index:index + len(pattern)] == list(pattern)
+
+
+def holds_a(instructions: typing.List[Instruction], index: int,
+            definition: typing.Sequence[Instruction]) -> bool:
+    """Is A, just before the given index, still the value set by the given
+    instruction sequence, without any label in between?
+    """
+    start = index - 1
+    while start >= max(0, index - LOOKBEHIND):
+        instruction = instructions[start]
+        if instruction.kind == "L_COMMAND":
+            return False
+        if sets_a(instruction):
+            start -= len(definition) - 1
+            return start >= 0 and matches(instructions, start, definition)
+        start -= 1
+    return False
+
+
+def uses_absolute_jumps(instructions: typing.List[Instruction]) -> bool:
+    """Does the program jump to numeric addresses, e.g. @10 / D;JGT? Such
+    programs break if any instruction is removed, so they are left alone.
+    """
+    numeric_a = False
+    for instruction in instructions:
+        if instruction.kind == "A_COMMAND":
+            numeric_a = instruction.symbol.isdigit()
+        elif instruction.kind == "C_COMMAND":
+            if instruction.jump and numeric_a:
+                return True
+            if "A" in instruction.dest:
+                numeric_a = False
+    return False
+
+
+PUSH_D = [a_command("SP"), c_command("A", "M"), c_command("M", "D"),
+          a_command("SP"), c_command("M", "M+1")]
+POPS_TO_D = [
+    # As written by 08/CodeWriter.py
+    [a_command("SP"), c_command("AM", "M-1"), c_command("D", "M")],
+    # As written by 07/CodeWriter.py
+    [a_command("SP"), c_command("M", "M-1"), c_command("A", "M"),
+     c_command("D", "M")],
+]
+
+
+# Tried first, as redundant_load would otherwise remove the push's @SP
+# and break the pattern
+@rule("push_pop")
+def push_pop(instructions: typing.List[Instruction], index: int):
+    """Pushing D and popping it right back into D, when A is dead afterwards.
+    The only other effect is on the stack slot just above the top, which
+    is garbage anyway.
+    """
+    if (instructions[index].kind == "A_COMMAND"
+            and matches(instructions, index, PUSH_D)):
+        for pop in POPS_TO_D:
+            end = index + len(PUSH_D) + len(pop)
+            if (matches(instructions, index + len(PUSH_D), pop)
+                    and a_is_dead(instructions, end)):
+                return end - index, []
+    return None
+
+
+@rule("constant_d")
+def constant_d(instructions: typing.List[Instruction], index: int):
+    """@0 / D=A  ->  D=0, and likewise for 1, when A is dead afterwards."""
+    instruction = instructions[index]
+    if (instruction.kind == "A_COMMAND" and instruction.symbol in ("0", "1")
+            and matches(instructions, index + 1, [c_command("D", "A")])
+            and a_is_dead(instructions, index + 2)):
+        return 2, [c_command("D", instruction.symbol)]
+    return None
+
+
+@rule("redundant_load")
+def redundant_load(instructions: typing.List[Instruction], index: int):
+    """@X when A already holds X."""
+    instruction = instructions[index]
+    if (instruction.kind == "A_COMMAND"
+            and holds_a(instructions, index, [instruction])):
+        return 1, []
+    return None
+
+
+STACK_TOP = [a_command("SP"), c_command("A", "M-1")]
+
+
+@rule("stack_top_reload")
+def stack_top_reload(instructions: typing.List[Instruction], index: int):
+    """@SP / A=M-1 when A already points at the top of the stack. Writes to
+    M in between go to the stack, never to SP itself, in VM generated code.
+    """
+    if (instructions[index].kind == "A_COMMAND"
+            and matches(instructions, index, STACK_TOP)
+            and holds_a(instructions, index, STACK_TOP)):
+        return 2, []
+    return None
+
+
+@rule("jump_to_next")
+def jump_to_next(instructions: typing.List[Instruction], index: int):
+    """@L / comp;jump immediately followed by (L), when the jump has no
+    destination and A is dead after the label.
+    """
+    instruction = instructions[index]
+    if instruction.kind != "A_COMMAND" or index + 1 >= len(instructions):
+        return None
+    jump = instructions[index + 1]
+    if jump.kind != "C_COMMAND" or not jump.jump or jump.dest:
+        return None
+    end = index + 2
+    found = False
+    while end < len(instructions) and instructions[end].kind == "L_COMMAND":
+        found = found or instructions[end].symbol == instruction.symbol
+        end += 1
+    if found and a_is_dead(instructions, end):
+        return 2, []
+    return None
+
+
+class Spliced:
+    """The instructions a pass has emitted so far, followed by those it has
+    not reached yet, seen as a single list. Rules run on this rather than
+    on the pass's input, so rules that look back for an earlier definition
+    of A see the code as already rewritten by this pass.
+    """
+
+    def __init__(self, emitted: typing.List[Instruction],
+                 remaining: typing.List[Instruction]) -> None:
+        """
+        Args:
+            emitted (typing.List[Instruction]): the pass's output, which
+                grows as the pass goes on.
+            remaining (typing.List[Instruction]): the pass's input.
+        """
+        self.emitted = emitted
+        self.remaining = remaining
+        self.position = 0  # index in remaining of the next instruction
+
+    def __len__(self) -> int:
+        return len(self.emitted) + len(self.remaining) - self.position
+
+    def __getitem__(self, index: typing.Union[int, slice]) -> typing.Any:
+        emitted = len(self.emitted)
+        if isinstance(index, int):
+            if index < 0:
+                index += len(self)
+            if index < emitted:
+                return self.emitted[index]
+            return self.remaining[index - emitted + self.position]
+        start, stop, _ = index.indices(len(self))
+        head = self.emitted[start:min(stop, emitted)]
+        if stop <= emitted:
+            return head
+        offset = self.position - emitted
+        return head + self.remaining[max(start, emitted) + offset:
+                                     stop + offset]
+
+
+class Optimizer:
+    """Peephole optimizer for parsed Hack assembly. Rewrites a Parser's
+    instruction records in place, before they are encoded, using a set of
+    named rules that can be switched on and off individually.
+    """
+
+    def __init__(self, enabled: typing.Optional[typing.Iterable[str]] = None
+                 ) -> None:
+        """Creates an optimizer.
+
+        Args:
+            enabled (typing.Optional[typing.Iterable[str]]): names of the
+                rules to apply, all registered rules if None.
+        """
+        names = list(RULES) if enabled is None else list(enabled)
+        for name in names:
+            if name not in RULES:
+                raise ValueError(f"Unknown optimizer rule: {name}")
+        self.rules = [(name, RULES[name]) for name in names]
+        self.hits = {name: 0 for name in names}
+
+    def optimize(self, parser: Parser) -> int:
+        """Applies the enabled rules until none of them applies anymore.
+
+        Args:
+            parser (Parser): the parsed program, rewritten in place.
+
+        Returns:
+            int: the number of instructions removed.
+        """
+        instructions = parser.instructions
+        line_numbers = parser.line_numbers
+        original_size = len(instructions)
+        if uses_absolute_jumps(instructions):
+            return 0
+
+        changed = True
+        while changed:
+            changed = False
+            optimized: typing.List[Instruction] = []
+            optimized_lines = array.array('L')
+            spliced = Spliced(optimized, instructions)
+            index = 0
+            while index < len(instructions):
+                spliced.position = index
+                for name, apply in self.rules:
+                    result = apply(spliced, len(optimized))
+                    if result is not None:
+                        consumed, replacement = result
+                        self.hits[name] += 1
+                        optimized.extend(replacement)
+                        optimized_lines.extend(
+                            [line_numbers[index]] * len(replacement))
+                        index += consumed
+                        changed = True
+                        break
+                else:
+                    optimized.append(instructions[index])
+                    optimized_lines.append(line_numbers[index])
+                    index += 1
+            instructions, line_numbers = optimized, optimized_lines
+
+        parser.instructions = instructions
+        parser.line_numbers = line_numbers
+        return original_size - len(instructions)
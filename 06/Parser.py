@@ -1,166 +1,288 @@
-"""
-This file is part of nand2tetris, as taught in The Hebrew University, and
-was written by Aviv Yaish. It is an extension to the specifications given
-[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
-as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
-Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
-"""
-import typing
-
-
-class Parser:
-    """Encapsulates access to the input code. Reads an assembly program
-    by reading each command line-by-line, parses the current command,
-    and provides convenient access to the commands components (fields
-    and symbols). In addition, removes all white space and comments.
-    """
-    
-    def __init__(self, input_file: typing.TextIO) -> None:
-        """Opens the input file and gets ready to parse it.
-        
-        Args:
-            input_file (typing.TextIO): input file.
-        """
-        # Read all lines from the input file
-        self.lines = input_file.read().splitlines()
-        
-        # Initialize variables
-        self.current_command = ""
-        self.current_index = -1  # We'll advance to the first command
-        
-        # Advance to the first command
-        self.advance()
-    
-    def has_more_commands(self) -> bool:
-        """Are there more commands in the input?
-        
-        Returns:
-            bool: True if there are more commands, False otherwise.
-        """
-        # If current_command is not empty, we have a current command
-        # Otherwise, we've reached the end of the file
-        return self.current_command != ""
-    
-    def advance(self) -> None:
-        """Reads the next command from the input and makes it the current command.
-        Should be called only if has_more_commands() is true.
-        """
-        # Initialize current_command to empty
-        self.current_command = ""
-        
-        # Look for the next valid command
-        while self.current_index < len(self.lines) - 1:
-            self.current_index += 1
-            line = self.lines[self.current_index]
-            
-            # Remove comments (anything after //)
-            comment_index = line.find('//')
-            if comment_index != -1:
-                line = line[:comment_index]
-            
-            # Remove whitespace
-            line = line.strip()
-            
-            # If the line is not empty after removing comments and whitespace, it's a valid command
-            if line:
-                self.current_command = line
-                return
-        
-        # If we get here, we've reached the end of the file without finding another command
-        self.current_command = ""
-    
-    def command_type(self) -> str:
-        """
-        Returns:
-            str: the type of the current command:
-            "A_COMMAND" for @Xxx where Xxx is either a symbol or a decimal number
-            "C_COMMAND" for dest=comp;jump
-            "L_COMMAND" (actually, pseudo-command) for (Xxx) where Xxx is a symbol
-        """
-        if not self.current_command:
-            return ""
-        
-        # Check if it's an A-command (starts with @)
-        if self.current_command.startswith('@'):
-            return "A_COMMAND"
-        
-        # Check if it's an L-command (enclosed in parentheses)
-        if self.current_command.startswith('(') and self.current_command.endswith(')'):
-            return "L_COMMAND"
-        
-        # Otherwise, it's a C-command
-        return "C_COMMAND"
-    
-    def symbol(self) -> str:
-        """
-        Returns:
-            str: the symbol or decimal Xxx of the current command @Xxx or
-            (Xxx). Should be called only when command_type() is "A_COMMAND" or 
-            "L_COMMAND".
-        """
-        cmd_type = self.command_type()
-        
-        if cmd_type == "A_COMMAND":
-            # Extract symbol from @Xxx (remove the @ symbol)
-            return self.current_command[1:]
-            
-        elif cmd_type == "L_COMMAND":
-            # Extract symbol from (Xxx) (remove the parentheses)
-            return self.current_command[1:-1]
-        
-        return ""
-    
-    def dest(self) -> str:
-        """
-        Returns:
-            str: the dest mnemonic in the current C-command. Should be called 
-            only when commandType() is "C_COMMAND".
-        """
-        if self.command_type() != "C_COMMAND":
-            return ""
-        
-        # Check if there's a destination (contains =)
-        if '=' in self.current_command:
-            return self.current_command.split('=')[0].strip()
-        
-        # No destination
-        return ""
-    
-    def comp(self) -> str:
-        """
-        Returns:
-            str: the comp mnemonic in the current C-command. Should be called 
-            only when commandType() is "C_COMMAND".
-        """
-        if self.command_type() != "C_COMMAND":
-            return ""
-        
-        # Start with the full command
-        cmd = self.current_command
-        
-        # Remove dest= if present
-        if '=' in cmd:
-            _, cmd = cmd.split('=', 1)
-        
-        # Remove ;jump if present
-        if ';' in cmd:
-            cmd, _ = cmd.split(';', 1)
-        
-        # Strip off any stray whitespace
-        return cmd.strip()
-     
-    def jump(self) -> str:
-        """
-        Returns:
-            str: the jump mnemonic in the current C-command. Should be called 
-            only when commandType() is "C_COMMAND".
-        """
-        if self.command_type() != "C_COMMAND":
-            return ""
-        
-        # Check if there's a jump (contains ;)
-        if ';' in self.current_command:
-            return self.current_command.split(';')[1].strip()  # Added .strip() to handle whitespace
-        
-        # No jump
-        return ""
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+import mmap
+import os
+import typing
+
+
+class Instruction(typing.NamedTuple):
+    """A single pre-decoded assembly command.
+
+    Only the fields relevant to the command's kind are filled in, the rest
+    are empty strings. Instructions are immutable, so identical source
+    lines share a single record.
+    """
+    kind: str    # "A_COMMAND", "C_COMMAND" or "L_COMMAND"
+    symbol: str  # Xxx of @Xxx or (Xxx)
+    dest: str    # dest mnemonic of a C-command
+    comp: str    # comp mnemonic of a C-command, without any whitespace
+    jump: str    # jump mnemonic of a C-command
+
+
+# Stands in for the current command once the end of the input is reached
+NO_INSTRUCTION = Instruction("", "", "", "", "")
+
+
+def decode(line: str) -> typing.Optional[Instruction]:
+    """Decodes a single source line.
+
+    Args:
+        line (str): a raw line of assembly code.
+
+    Returns:
+        typing.Optional[Instruction]: the decoded command, or None if the
+        line holds nothing but whitespace and comments.
+    """
+    # Remove comments (anything after //) and whitespace
+    comment_index = line.find('//')
+    if comment_index != -1:
+        line = line[:comment_index]
+    line = line.strip()
+    if not line:
+        return None
+
+    if line[0] == '@':
+        return Instruction("A_COMMAND", line[1:], "", "", "")
+
+    if line[0] == '(' and line[-1] == ')':
+        return Instruction("L_COMMAND", line[1:-1], "", "", "")
+
+    # C-command: dest=comp;jump, where dest and jump are optional
+    dest, jump = "", ""
+    comp = line
+    if '=' in comp:
+        dest, comp = comp.split('=', 1)
+        dest = dest.strip()
+    if ';' in comp:
+        comp, jump = comp.split(';', 1)
+        jump = jump.split(';')[0].strip()
+    comp = ''.join(comp.split())
+    return Instruction("C_COMMAND", "", dest, comp, jump)
+
+
+def decode_bytes(line: bytes) -> typing.Optional[Instruction]:
+    """Decodes a single raw source line. Comments are cut off before the
+    line is turned into a string, so they may hold any bytes.
+
+    Args:
+        line (bytes): a raw line of assembly code.
+
+    Returns:
+        typing.Optional[Instruction]: the decoded command, or None if the
+        line holds nothing but whitespace and comments.
+    """
+    comment_index = line.find(b'//')
+    if comment_index != -1:
+        line = line[:comment_index]
+    line = line.strip()
+    if not line:
+        return None
+    return decode(line.decode())
+
+
+# Buffers are split into lines this many bytes at a time
+SCAN_BLOCK_SIZE = 1024 * 1024
+
+# Streaming decoders keep at most this many distinct lines in their cache,
+# so memory does not grow with the number of unique comments in the input
+STREAM_CACHE_SIZE = 4096
+
+
+def stream(input_file: typing.TextIO) -> typing.Iterator[
+        typing.Tuple[int, Instruction]]:
+    """Lazily decodes the input, reading it in buffered chunks instead of
+    loading it whole, so memory use does not depend on the file's size.
+
+    Args:
+        input_file (typing.TextIO): input file.
+
+    Returns:
+        typing.Iterator[typing.Tuple[int, Instruction]]: the 1-based source
+        line number and decoded record of each command, in source order.
+    """
+    decoded = {}
+    missing = object()
+    for line_number, line in enumerate(input_file, 1):
+        instruction = decoded.get(line, missing)
+        if instruction is missing:
+            if len(decoded) >= STREAM_CACHE_SIZE:
+                decoded.clear()
+            instruction = decoded[line] = decode(line)
+        if instruction is not None:
+            yield line_number, instruction
+
+
+class Parser:
+    """Encapsulates access to the input code. Reads an assembly program
+    by reading each command line-by-line, parses the current command,
+    and provides convenient access to the commands components (fields
+    and symbols). In addition, removes all white space and comments.
+
+    Every distinct source line is decoded exactly once, when the parser is
+    created, into the Instruction records in `instructions`; the 1-based
+    source line of each record is kept in the parallel array
+    `line_numbers`. Tools that process the whole program should iterate
+    over these directly; the command-at-a-time interface below is a thin
+    view over them.
+    """
+    
+    def __init__(self, input_file: typing.Union[
+            typing.TextIO, typing.Iterable[str], bytes, mmap.mmap]) -> None:
+        """Opens the input file and gets ready to parse it.
+        
+        Args:
+            input_file (typing.Union[typing.TextIO, typing.Iterable[str],
+                bytes, mmap.mmap]): input file, any iterable of source
+                lines, or the raw contents of a file, e.g. memory-mapped.
+        """
+        self.instructions = []
+        self.line_numbers = array.array('L')
+        # Generated code repeats the same few lines over and over, so each
+        # distinct raw line is decoded once and its record shared
+        decoded = {}
+        if isinstance(input_file, (bytes, bytearray, mmap.mmap)):
+            # Split the raw bytes a block at a time, so no string is made
+            # for lines that were seen before. Lines end with \n, \r\n or
+            # \r, as with universal newlines in text mode; a line ending
+            # with \r at the end of a block waits for the next block, which
+            # may start with its \n
+            line_number = 0
+            remainder = b""
+            for start in range(0, len(input_file), SCAN_BLOCK_SIZE):
+                lines = (remainder + input_file[
+                    start:start + SCAN_BLOCK_SIZE]).splitlines(True)
+                remainder = b""
+                if lines and not lines[-1].endswith(b'\n'):
+                    remainder = lines.pop()
+                line_number = self._decode_lines(
+                    lines, line_number, decoded, decode_bytes)
+            if remainder:
+                self._decode_lines([remainder], line_number, decoded,
+                                   decode_bytes)
+        else:
+            if hasattr(input_file, "read"):
+                input_file = input_file.read().splitlines()
+            self._decode_lines(input_file, 0, decoded, decode)
+
+        # The parser starts positioned on the first command
+        self.current_index = -1
+        self.current_instruction = NO_INSTRUCTION
+        self.advance()
+
+    def _decode_lines(
+            self, lines: typing.Iterable[typing.AnyStr], line_number: int,
+            decoded: typing.Dict[typing.AnyStr, typing.Optional[Instruction]],
+            decode_line: typing.Callable[
+                [typing.AnyStr], typing.Optional[Instruction]]) -> int:
+        """Decodes the given lines and appends their commands.
+
+        Args:
+            lines (typing.Iterable[typing.AnyStr]): raw source lines.
+            line_number (int): number of lines decoded so far.
+            decoded (typing.Dict[typing.AnyStr, typing.Optional[Instruction]]):
+                cache of already decoded lines, updated in place.
+            decode_line (typing.Callable[[typing.AnyStr],
+                typing.Optional[Instruction]]): decodes a single line.
+
+        Returns:
+            int: the number of lines decoded so far, including these.
+        """
+        missing = object()
+        for line_number, line in enumerate(lines, line_number + 1):
+            instruction = decoded.get(line, missing)
+            if instruction is missing:
+                instruction = decoded[line] = decode_line(line)
+            if instruction is not None:
+                self.instructions.append(instruction)
+                self.line_numbers.append(line_number)
+        return line_number
+
+    def __iter__(self) -> typing.Iterator[Instruction]:
+        """Iterates over all decoded commands, in source order."""
+        return iter(self.instructions)
+
+    def has_more_commands(self) -> bool:
+        """Are there more commands in the input?
+        
+        Returns:
+            bool: True if there are more commands, False otherwise.
+        """
+        return self.current_instruction is not NO_INSTRUCTION
+    
+    def advance(self) -> None:
+        """Reads the next command from the input and makes it the current command.
+        Should be called only if has_more_commands() is true.
+        """
+        self.current_index += 1
+        if self.current_index < len(self.instructions):
+            self.current_instruction = self.instructions[self.current_index]
+        else:
+            self.current_instruction = NO_INSTRUCTION
+    
+    def command_type(self) -> str:
+        """
+        Returns:
+            str: the type of the current command:
+            "A_COMMAND" for @Xxx where Xxx is either a symbol or a decimal number
+            "C_COMMAND" for dest=comp;jump
+            "L_COMMAND" (actually, pseudo-command) for (Xxx) where Xxx is a symbol
+        """
+        return self.current_instruction.kind
+    
+    def symbol(self) -> str:
+        """
+        Returns:
+            str: the symbol or decimal Xxx of the current command @Xxx or
+            (Xxx). Should be called only when command_type() is "A_COMMAND" or 
+            "L_COMMAND".
+        """
+        return self.current_instruction.symbol
+    
+    def dest(self) -> str:
+        """
+        Returns:
+            str: the dest mnemonic in the current C-command. Should be called 
+            only when commandType() is "C_COMMAND".
+        """
+        return self.current_instruction.dest
+    
+    def comp(self) -> str:
+        """
+        Returns:
+            str: the comp mnemonic in the current C-command. Should be called 
+            only when commandType() is "C_COMMAND".
+        """
+        return self.current_instruction.comp
+     
+    def jump(self) -> str:
+        """
+        Returns:
+            str: the jump mnemonic in the current C-command. Should be called 
+            only when commandType() is "C_COMMAND".
+        """
+        return self.current_instruction.jump
+
+
+def parse_path(path: str) -> Parser:
+    """Parses the file at the given path, memory-mapping it instead of
+    reading and decoding it whole.
+
+    Args:
+        path (str): path of an assembly file.
+
+    Returns:
+        Parser: the parsed program.
+    """
+    if os.path.getsize(path) == 0:
+        # Empty files cannot be memory-mapped
+        return Parser([])
+    with open(path, 'rb') as input_file, \
+            mmap.mmap(input_file.fileno(), 0,
+                      access=mmap.ACCESS_READ) as buffer:
+        return Parser(buffer)
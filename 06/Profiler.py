@@ -0,0 +1,250 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import typing
+import numpy as np
+import HackFile
+from BlockEmulator import Block, BlockEmulator
+from HackAssembler import assemble_parsed
+from Parser import Parser, parse_path
+from SymbolTable import SymbolTable
+
+# Name of the code before a program's first label
+START = "(start)"
+
+
+def find_labels(parser: Parser, symbol_table: SymbolTable
+                ) -> typing.List[typing.Tuple[int, str]]:
+    """
+    Args:
+        parser (Parser): the parsed program.
+        symbol_table (SymbolTable): the program's symbol table, as returned
+            by assemble_parsed.
+
+    Returns:
+        typing.List[typing.Tuple[int, str]]: the address and name of every
+        label, in source order, which is also address order.
+    """
+    return [(symbol_table.get_address(instruction.symbol), instruction.symbol)
+            for instruction in parser
+            if instruction.kind == "L_COMMAND"]
+
+
+class ProfilingEmulator(BlockEmulator):
+    """A BlockEmulator that counts how many times each ROM address runs.
+
+    Profiling is opt-in by using this class: the other emulators are left
+    untouched, so they pay nothing for it. Rather than counting single
+    instructions, it overrides BlockEmulator's hooks to count how many
+    times each block runs, and those counts are spread over the blocks'
+    addresses with NumPy only when `counts` is read, or before ROM is
+    reloaded.
+    """
+
+    def __init__(self, path: typing.Optional[str] = None) -> None:
+        """Creates a machine with cleared memories and counts.
+
+        Args:
+            path (typing.Optional[str]): if given, a machine code file to
+                load into ROM.
+        """
+        self.block_entries = [0] * HackFile.ROM_SIZE
+        self.step_counts = [0] * HackFile.ROM_SIZE
+        self._counts = np.zeros(HackFile.ROM_SIZE, dtype=np.int64)
+        super().__init__(path)
+
+    @property
+    def counts(self) -> np.ndarray:
+        """np.ndarray: the number of times each ROM address ran."""
+        self._fold_counts()
+        return self._counts
+
+    def clear_counts(self) -> None:
+        """Starts counting from zero again."""
+        self._fold_counts()
+        self._counts[:] = 0
+
+    def _fold_counts(self) -> None:
+        """Adds the block entries and interpreted steps counted so far to
+        the per-address counts, and clears them.
+        """
+        entries = np.array(self.block_entries, dtype=np.int64)
+        starts = np.flatnonzero(entries)
+        if starts.size:
+            ends = np.array([self.blocks[start].end for start in starts])
+            # Every entry runs the block to its end: add the entry count
+            # at the block's start and take it back at its end
+            difference = np.zeros(HackFile.ROM_SIZE + 1, dtype=np.int64)
+            np.add.at(difference, starts, entries[starts])
+            np.add.at(difference, ends, -entries[starts])
+            self._counts += np.cumsum(difference[:-1])
+            self.block_entries = [0] * HackFile.ROM_SIZE
+        self._counts += np.array(self.step_counts, dtype=np.int64)
+        self.step_counts = [0] * HackFile.ROM_SIZE
+
+    def decode_rom(self) -> None:
+        """Decodes every ROM word, after counting the runs of the blocks
+        that are about to be dropped.
+        """
+        if self.blocks:
+            self._fold_counts()
+        super().decode_rom()
+
+    def _on_block(self, block: Block, cycles: int, stop_pc: int) -> int:
+        """Counts a run of the given block.
+
+        Args:
+            block (Block): the block that just ran.
+            cycles (int): the run's remaining instructions, unused.
+            stop_pc (int): the run's stop address, unused.
+
+        Returns:
+            int: 0, as nothing else is run.
+        """
+        self.block_entries[block.start] += 1
+        return 0
+
+    def _step(self) -> int:
+        """Counts and runs a single interpreted instruction.
+
+        Returns:
+            int: the number of instructions run.
+        """
+        self.step_counts[self.pc] += 1
+        return super()._step()
+
+
+class Profile(typing.NamedTuple):
+    """Cycles spent under each label of a program."""
+    labels: typing.List[str]      # every label, START first
+    functions: typing.List[str]   # the VM function each label is in
+    cycles: np.ndarray            # cycles spent under each label
+
+
+def attribute(counts: np.ndarray,
+              labels: typing.List[typing.Tuple[int, str]]) -> Profile:
+    """Charges the cycles of every address to the nearest label at or
+    before it, and every label to the VM function it is in. When several
+    labels share an address, the last one is charged.
+
+    The VM translator names functions "File.function", the labels inside
+    them "File.function$label", and may add helper labels ending with the
+    function's name, such as the loop that pushes its locals. Any other
+    label with a dot starts a new function.
+
+    Args:
+        counts (np.ndarray): the number of times each ROM address ran.
+        labels (typing.List[typing.Tuple[int, str]]): as returned by
+            find_labels.
+
+    Returns:
+        Profile: the cycles of every label.
+    """
+    names = [START] + [name for _, name in labels]
+    addresses = np.array([address for address, _ in labels], dtype=np.int64)
+    # Index into names of the label each address is charged to
+    owners = np.searchsorted(addresses, np.arange(len(counts)), side="right")
+    cycles = np.bincount(owners, weights=counts, minlength=len(names))
+
+    functions = []
+    function = START
+    for name in names:
+        if "." in name and "$" not in name and not name.endswith(function):
+            function = name
+        functions.append(function)
+    return Profile(names, functions, cycles.astype(np.int64))
+
+
+def report(profile: Profile, top: int) -> str:
+    """
+    Args:
+        profile (Profile): the profile.
+        top (int): number of labels to list.
+
+    Returns:
+        str: a table of the labels that took the most cycles, and of the
+        functions that did, from most to least.
+    """
+    total = max(int(profile.cycles.sum()), 1)
+    lines = [f"{'cycles':>12} {'share':>6}  label"]
+    for index in np.argsort(-profile.cycles, kind="stable")[:top]:
+        if not profile.cycles[index]:
+            break
+        lines.append(f"{profile.cycles[index]:12d} "
+                     f"{100 * profile.cycles[index] / total:5.1f}%  "
+                     f"{profile.labels[index]}")
+
+    by_function: typing.Dict[str, int] = {}
+    for function, cycles in zip(profile.functions, profile.cycles.tolist()):
+        by_function[function] = by_function.get(function, 0) + cycles
+    lines.append("")
+    lines.append(f"{'cycles':>12} {'share':>6}  function")
+    ranked = sorted(by_function.items(), key=lambda item: -item[1])
+    for function, cycles in ranked[:top]:
+        if not cycles:
+            break
+        lines.append(f"{cycles:12d} {100 * cycles / total:5.1f}%  {function}")
+    return "\n".join(lines) + "\n"
+
+
+def collapsed_stacks(profile: Profile) -> str:
+    """
+    Args:
+        profile (Profile): the profile.
+
+    Returns:
+        str: the profile in the collapsed stack format read by flame graph
+        tools, one "function;label cycles" line per label that ran. Call
+        stacks are not tracked, so every stack is two frames deep.
+    """
+    lines = []
+    for label, function, cycles in zip(
+            profile.labels, profile.functions, profile.cycles.tolist()):
+        if cycles:
+            stack = label if label == function else f"{function};{label}"
+            lines.append(f"{stack} {cycles}")
+    return "\n".join(lines) + "\n"
+
+
+if "__main__" == __name__:
+    argument_parser = argparse.ArgumentParser(prog="Profiler")
+    argument_parser.add_argument("path", help="an .asm file")
+    argument_parser.add_argument(
+        "--cycles", type=int, default=-1, metavar="N",
+        help="stop after N instructions")
+    argument_parser.add_argument(
+        "--until", type=int, default=-1, metavar="PC",
+        help="stop when PC reaches this address")
+    argument_parser.add_argument(
+        "--set", action="append", default=[], metavar="ADDRESS=VALUE",
+        help="set a RAM word before running (may be repeated)")
+    argument_parser.add_argument(
+        "--top", type=int, default=20, metavar="N",
+        help="number of labels and functions to list (default 20)")
+    argument_parser.add_argument(
+        "--collapsed", metavar="FILE",
+        help="write collapsed stacks for flame graph tools")
+    arguments = argument_parser.parse_args()
+    if arguments.cycles < 0 and arguments.until < 0:
+        argument_parser.error("give --cycles, --until or both")
+
+    parser = parse_path(arguments.path)
+    words, symbols = assemble_parsed(parser)
+    emulator = ProfilingEmulator()
+    emulator.load_words(words)
+    for assignment in arguments.set:
+        ram_address, ram_value = assignment.split("=")
+        emulator.ram[int(ram_address)] = int(ram_value) & 0xFFFF
+    emulator.run_until(arguments.until, arguments.cycles)
+
+    program_profile = attribute(emulator.counts, find_labels(parser, symbols))
+    print(f"{emulator.cycles} cycles")
+    print(report(program_profile, arguments.top), end="")
+    if arguments.collapsed:
+        with open(arguments.collapsed, 'w') as collapsed_file:
+            collapsed_file.write(collapsed_stacks(program_profile))
@@ -0,0 +1,464 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import os
+import re
+import sys
+import time
+import typing
+import HackFile
+from BlockEmulator import BlockEmulator
+from Emulator import RAM_SIZE, Emulator
+from HackAssembler import assemble_parsed, transform
+from Optimizer import Optimizer
+from Parser import parse_path
+
+# Tokens of the test-script language: quoted strings, braces, command
+# separators, and words
+TOKEN = re.compile(r'"[^"]*"|[{},;]|[^\s{},;]+')
+COMMENT = re.compile(r'//[^\n]*|/\*.*?\*/', re.DOTALL)
+
+# An output-list entry: a variable, optionally followed by its format
+OUTPUT_ENTRY = re.compile(r'^(.+?)(?:%([BDSX])(\d+)\.(\d+)\.(\d+))?$')
+
+# Chips the emulator stands in for; scripts for any other chip need the
+# hardware simulator
+COMPUTER_CHIPS = ("Computer.hdl",)
+
+# Variables that name the CPU's registers, with or without an index
+A_NAMES = ("A", "ARegister[]", "ARegister[0]", "ARegister")
+D_NAMES = ("D", "DRegister[]", "DRegister[0]", "DRegister")
+PC_NAMES = ("PC", "PC[]", "PC[0]", "pc")
+RAM_VARIABLE = re.compile(r'^(?:RAM|RAM16K|RAM32K|Memory)\[(\d+)\]$')
+ROM_VARIABLE = re.compile(r'^ROM32K\[(\d+)\]$')
+
+# Number of arguments the commands that take some need at least
+REQUIRED_ARGUMENTS = {"output-file": 1, "compare-to": 1, "set": 2}
+
+
+class ScriptError(Exception):
+    """A test script that cannot be run, or whose output differs from its
+    comparison file.
+    """
+
+
+class Repeat(typing.NamedTuple):
+    """A repeat block of a test script."""
+    count: int
+    body: list
+
+
+class OutputColumn(typing.NamedTuple):
+    """One column of an output-list."""
+    variable: str
+    format: str       # "B", "D", "S" or "X"
+    left: int         # padding to the value's left
+    width: int
+    right: int        # padding to the value's right
+
+
+class ScriptResult(typing.NamedTuple):
+    """The outcome of running a test script."""
+    path: str
+    passed: bool
+    message: str
+    seconds: float
+
+
+def parse_script(source: str) -> list:
+    """Parses a test script into a list of commands, each a list of words,
+    and Repeat blocks.
+
+    Args:
+        source (str): the script's source code.
+
+    Returns:
+        list: the script's commands.
+    """
+    tokens = TOKEN.findall(COMMENT.sub(" ", source))
+    commands, position = _parse_commands(tokens, 0)
+    if position != len(tokens):
+        raise ScriptError("unbalanced '}'")
+    return commands
+
+
+def _parse_commands(tokens: typing.List[str],
+                    position: int) -> typing.Tuple[list, int]:
+    """Parses commands until the end of a block.
+
+    Args:
+        tokens (typing.List[str]): all of the script's tokens.
+        position (int): index of the first token of the block.
+
+    Returns:
+        typing.Tuple[list, int]: the block's commands, and the index of the
+        closing '}' (or the end of the tokens).
+    """
+    commands = []
+    words = []
+    while position < len(tokens):
+        token = tokens[position]
+        position += 1
+        if token in (",", ";"):
+            if words:
+                commands.append(words)
+            words = []
+        elif token == "{":
+            if not words or words[0] != "repeat":
+                raise ScriptError(f"unsupported block: {' '.join(words)}")
+            if len(words) < 2:
+                raise ScriptError(
+                    "repeat without a count only runs interactively")
+            body, position = _parse_commands(tokens, position)
+            if position >= len(tokens):
+                raise ScriptError("missing '}'")
+            commands.append(Repeat(int(words[1]), body))
+            words = []
+            position += 1
+        elif token == "}":
+            if words:
+                commands.append(words)
+            return commands, position - 1
+        else:
+            words.append(token)
+    if words:
+        commands.append(words)
+    return commands, position
+
+
+def parse_value(text: str) -> int:
+    """
+    Args:
+        text (str): a value in a set command: decimal, or %B / %X / %D
+            prefixed.
+
+    Returns:
+        int: the value as a 16-bit word.
+    """
+    if text.startswith("%B"):
+        return int(text[2:], 2) & 0xFFFF
+    if text.startswith("%X"):
+        return int(text[2:], 16) & 0xFFFF
+    if text.startswith("%D"):
+        text = text[2:]
+    return int(text) & 0xFFFF
+
+
+def format_value(value: typing.Union[int, str], column: OutputColumn) -> str:
+    """Formats a value as the hardware simulator and CPU emulator do.
+
+    Args:
+        value (typing.Union[int, str]): a 16-bit word, or a string for %S.
+        column (OutputColumn): the column to format it for.
+
+    Returns:
+        str: the formatted value, padded to the column's width.
+    """
+    if column.format == "S":
+        return str(value).ljust(column.width)[:column.width]
+    if column.format == "D":
+        signed = value - 0x10000 if value & 0x8000 else value
+        return str(signed).rjust(column.width)
+    if column.format == "X":
+        return format(value, '04X')[-column.width:].rjust(column.width)
+    return format(value, '016b')[-column.width:].rjust(column.width)
+
+
+class ScriptRunner:
+    """Runs a CPU-level .tst script headlessly on the Python emulator, and
+    compares its output with the script's .cmp file line by line, as the
+    course's CPU emulator and hardware simulator do. Scripts may load an
+    .asm file (which is assembled first), a .hack file, or Computer.hdl
+    followed by "ROM32K load".
+    """
+
+    def __init__(self, script_path: str,
+                 output_directory: typing.Optional[str] = None,
+                 engine: typing.Type[Emulator] = BlockEmulator,
+                 optimizer: typing.Optional[Optimizer] = None) -> None:
+        """Reads a test script.
+
+        Args:
+            script_path (str): path of the .tst file.
+            output_directory (typing.Optional[str]): if given, the output
+                file the script names is written to this directory. The
+                output is always compared in memory, so by default no file
+                is written and the source tree is left untouched.
+            engine (typing.Type[Emulator]): the emulator class to run on.
+            optimizer (typing.Optional[Optimizer]): if given, runs its
+                peephole rules over the .asm files the script loads.
+        """
+        self.script_path = script_path
+        self.output_directory = output_directory
+        self.directory = os.path.dirname(os.path.abspath(script_path))
+        with open(script_path, 'r') as script_file:
+            self.source = script_file.read()
+        self.emulator = engine()
+        self.optimizer = optimizer
+        self.time = 0
+        self.half_cycle = False  # between a tick and its tock
+        self.reset = 0
+        self.output_list: typing.List[OutputColumn] = []
+        self.output_path: typing.Optional[str] = None
+        self.output_lines: typing.List[str] = []
+        self.compare_lines: typing.Optional[typing.List[str]] = None
+
+    def run(self) -> ScriptResult:
+        """Runs the whole script, and writes its output file if there is
+        an output directory.
+
+        Returns:
+            ScriptResult: whether the output matched the comparison file.
+        """
+        start = time.perf_counter()
+        try:
+            self.execute(parse_script(self.source))
+            passed = True
+            if self.compare_lines is None:
+                message = "End of script"
+            else:
+                message = "End of script - Comparison ended successfully"
+        except (ScriptError, OSError, ValueError) as error:
+            passed = False
+            message = str(error)
+        finally:
+            if self.output_path is not None:
+                with open(self.output_path, 'w') as output_file:
+                    output_file.writelines(
+                        line + "\n" for line in self.output_lines)
+        return ScriptResult(self.script_path, passed, message,
+                            time.perf_counter() - start)
+
+    def execute(self, commands: list) -> None:
+        """Executes commands, in order.
+
+        Args:
+            commands (list): commands as returned by parse_script.
+        """
+        for command in commands:
+            if isinstance(command, Repeat):
+                if command.body in (
+                        [["ticktock"]], [["tick"], ["tock"]]) \
+                        and not self.reset and not self.half_cycle:
+                    # Only clock cycles in between: run them in one go
+                    self.emulator.run(command.count)
+                    self.time += command.count
+                else:
+                    for _ in range(command.count):
+                        self.execute(command.body)
+            else:
+                self.execute_command(command)
+
+    def execute_command(self, words: typing.List[str]) -> None:
+        """Executes a single command.
+
+        Args:
+            words (typing.List[str]): the command's words.
+        """
+        name, arguments = words[0], words[1:]
+        if len(arguments) < REQUIRED_ARGUMENTS.get(name, 0):
+            raise ScriptError(f"missing arguments: {' '.join(words)}")
+        if name == "load":
+            self.load(arguments[0] if arguments else "")
+        elif name == "ROM32K" and arguments[:1] == ["load"] \
+                and len(arguments) > 1:
+            self.emulator.load(os.path.join(self.directory, arguments[1]))
+        elif name == "output-file":
+            if self.output_directory is not None:
+                self.output_path = os.path.join(
+                    self.output_directory, os.path.basename(arguments[0]))
+        elif name == "compare-to":
+            with open(os.path.join(self.directory, arguments[0]),
+                      'r') as compare_file:
+                self.compare_lines = compare_file.read().splitlines()
+        elif name == "output-list":
+            self.set_output_list(arguments)
+        elif name == "set":
+            self.set(arguments[0], parse_value(arguments[1]))
+        elif name == "tick":
+            self.half_cycle = True
+        elif name == "tock":
+            self.tock()
+        elif name == "ticktock":
+            self.half_cycle = True
+            self.tock()
+        elif name == "output":
+            self.output(self.format_line())
+        elif name in ("echo", "clear-echo"):
+            pass
+        else:
+            raise ScriptError(f"unsupported command: {' '.join(words)}")
+
+    def load(self, filename: str) -> None:
+        """Loads a program, or the computer chip, as the load command does.
+
+        Args:
+            filename (str): the file named by the command.
+        """
+        path = os.path.join(self.directory, filename)
+        extension = os.path.splitext(filename)[1].lower()
+        if extension == ".asm":
+            parser = parse_path(path)
+            transform(parser, self.optimizer)
+            words, _ = assemble_parsed(parser)
+            self.emulator.load_words(words)
+        elif extension in (".hack", ".hackbin"):
+            self.emulator.load(path)
+        elif filename not in COMPUTER_CHIPS:
+            raise ScriptError(
+                f"{filename or 'this script'} needs the hardware simulator")
+
+    def set_output_list(self, entries: typing.List[str]) -> None:
+        """Sets the columns of the output, and outputs their header.
+
+        Args:
+            entries (typing.List[str]): entries of the output-list command.
+        """
+        self.output_list = []
+        for entry in entries:
+            match = OUTPUT_ENTRY.match(entry)
+            if match is None:
+                raise ScriptError(f"bad output-list entry: {entry}")
+            variable, kind, left, width, right = match.groups()
+            if kind is None:
+                kind, left, width, right = "B", 1, 16, 1
+            self.output_list.append(OutputColumn(
+                variable, kind, int(left), int(width), int(right)))
+        header = ""
+        for column in self.output_list:
+            size = column.left + column.width + column.right
+            title = column.variable[:size]
+            margin = (size - len(title)) // 2
+            header += "|" + " " * margin + title \
+                + " " * (size - len(title) - margin)
+        self.output(header + "|")
+
+    def format_line(self) -> str:
+        """
+        Returns:
+            str: the current values of the output-list, as an output line.
+        """
+        return "".join(
+            "|" + " " * column.left
+            + format_value(self.get(column.variable), column)
+            + " " * column.right for column in self.output_list) + "|"
+
+    def output(self, line: str) -> None:
+        """Writes an output line, and compares it with the comparison file.
+
+        Args:
+            line (str): the line, without a line break.
+        """
+        self.output_lines.append(line)
+        if self.compare_lines is None:
+            return
+        number = len(self.output_lines)
+        if (number > len(self.compare_lines)
+                or self.compare_lines[number - 1] != line):
+            raise ScriptError(f"Comparison failure at line {number}")
+
+    def tock(self) -> None:
+        """Ends a clock cycle: the current instruction takes effect."""
+        self.emulator.run(1)
+        if self.reset:
+            self.emulator.reset()
+        self.time += 1
+        self.half_cycle = False
+
+    def get(self, variable: str) -> typing.Union[int, str]:
+        """
+        Args:
+            variable (str): a variable of an output-list.
+
+        Returns:
+            typing.Union[int, str]: its current value.
+        """
+        if variable == "time":
+            return f"{self.time}+" if self.half_cycle else str(self.time)
+        if variable == "reset":
+            return self.reset
+        if variable in A_NAMES:
+            return self.emulator.a
+        if variable in D_NAMES:
+            return self.emulator.d
+        if variable in PC_NAMES:
+            return self.emulator.pc
+        match = RAM_VARIABLE.match(variable)
+        if match:
+            return self.emulator.ram[self._index(variable, match, RAM_SIZE)]
+        match = ROM_VARIABLE.match(variable)
+        if match:
+            return self.emulator.rom[
+                self._index(variable, match, HackFile.ROM_SIZE)]
+        raise ScriptError(f"unknown variable: {variable}")
+
+    def set(self, variable: str, value: int) -> None:
+        """
+        Args:
+            variable (str): a variable of a set command.
+            value (int): its new value, as a 16-bit word.
+        """
+        if variable == "reset":
+            self.reset = value & 1
+        elif variable in A_NAMES:
+            self.emulator.a = value
+        elif variable in D_NAMES:
+            self.emulator.d = value
+        elif variable in PC_NAMES:
+            self.emulator.pc = value & 0x7FFF
+        else:
+            match = RAM_VARIABLE.match(variable)
+            if not match:
+                raise ScriptError(f"cannot set {variable}")
+            self.emulator.ram[self._index(variable, match, RAM_SIZE)] = value
+
+    @staticmethod
+    def _index(variable: str, match: typing.Match, size: int) -> int:
+        """
+        Args:
+            variable (str): a variable naming a memory word.
+            match (typing.Match): its match of RAM_VARIABLE or ROM_VARIABLE.
+            size (int): number of words in the memory.
+
+        Returns:
+            int: the index of the word in the memory.
+        """
+        index = int(match.group(1))
+        if index >= size:
+            raise ScriptError(f"{variable} is out of range")
+        return index
+
+
+if "__main__" == __name__:
+    argument_parser = argparse.ArgumentParser(prog="ScriptRunner")
+    argument_parser.add_argument(
+        "paths", nargs="+", help="CPU-level .tst scripts to run")
+    argument_parser.add_argument(
+        "--output-dir", metavar="DIR",
+        help="write the scripts' output files to this directory")
+    argument_parser.add_argument(
+        "--interpreter", action="store_true",
+        help="run on the plain interpreter rather than the basic-block "
+             "translator")
+    argument_parser.add_argument(
+        "--optimize", action="store_true",
+        help="run the peephole optimizer over the .asm files scripts load")
+    arguments = argument_parser.parse_args()
+    script_engine = Emulator if arguments.interpreter else BlockEmulator
+    if arguments.output_dir:
+        os.makedirs(arguments.output_dir, exist_ok=True)
+    all_passed = True
+    for script_path in arguments.paths:
+        result = ScriptRunner(
+            script_path, arguments.output_dir, script_engine,
+            Optimizer() if arguments.optimize else None).run()
+        all_passed = all_passed and result.passed
+        print(f"{'PASS' if result.passed else 'FAIL'} {script_path} "
+              f"({result.seconds:.2f}s): {result.message}")
+    if not all_passed:
+        sys.exit(1)
@@ -0,0 +1,185 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import array
+import io
+import mmap
+import os
+import struct
+import sys
+import typing
+import HackFile
+from BlockEmulator import BlockEmulator
+from Emulator import RAM_SIZE, Emulator
+
+# Snapshots start with this header: magic, format version, the registers
+# A, D and PC, the program's size, the number of ROM and RAM words that
+# follow, and the cycle count. The ROM words come first, then the RAM
+# words, all little-endian; words after the stored ones are zero.
+MAGIC = b"HSNP"
+VERSION = 1
+HEADER = struct.Struct("<4sHHHHHHHQ")
+
+# Extension of snapshot files
+EXTENSION = ".hacksnap"
+
+ZEROS = bytes(2 * max(HackFile.ROM_SIZE, RAM_SIZE))
+
+
+def stored_words(memory: array.array) -> int:
+    """
+    Args:
+        memory (array.array): a memory of typecode 'H'.
+
+    Returns:
+        int: the number of words up to and including the last nonzero one.
+    """
+    with memoryview(memory) as view, view.cast('B') as memory_bytes:
+        return (len(bytes(memory_bytes).rstrip(b"\0")) + 1) // 2
+
+
+def write(emulator: Emulator, output_file: typing.BinaryIO) -> None:
+    """Writes the machine's full state as a snapshot.
+
+    Args:
+        emulator (Emulator): the machine.
+        output_file (typing.BinaryIO): writes all output to this file.
+    """
+    rom_count = stored_words(emulator.rom)
+    ram_count = stored_words(emulator.ram)
+    output_file.write(HEADER.pack(
+        MAGIC, VERSION, emulator.a, emulator.d, emulator.pc,
+        emulator.program_size, rom_count, ram_count, emulator.cycles))
+    HackFile.write_words(emulator.rom[:rom_count], output_file)
+    HackFile.write_words(emulator.ram[:ram_count], output_file)
+
+
+def save(emulator: Emulator, path: str) -> None:
+    """Writes the machine's full state to a snapshot file.
+
+    Args:
+        emulator (Emulator): the machine.
+        path (str): path of the snapshot file.
+    """
+    with open(path, 'wb') as snapshot_file:
+        write(emulator, snapshot_file)
+
+
+def dumps(emulator: Emulator) -> bytes:
+    """
+    Args:
+        emulator (Emulator): the machine.
+
+    Returns:
+        bytes: a snapshot of the machine's full state, for restoring many
+        times without going through a file.
+    """
+    snapshot = io.BytesIO()
+    write(emulator, snapshot)
+    return snapshot.getvalue()
+
+
+def _copy_words(source: memoryview, memory: array.array) -> bool:
+    """Overwrites a memory with the given words followed by zeros.
+
+    Args:
+        source (memoryview): little-endian words, as bytes.
+        memory (array.array): memory of typecode 'H'.
+
+    Returns:
+        bool: True if the memory's contents changed.
+    """
+    size = len(source)
+    with memoryview(memory) as view, view.cast('B') as target:
+        padding = ZEROS[:len(target) - size]
+        # Unlike memoryviews, bytes objects compare with a single memcmp
+        changed = target.tobytes() != source.tobytes() + padding
+        if changed:
+            target[:size] = source
+            target[size:] = padding
+    if changed and sys.byteorder != "little":
+        memory.byteswap()
+    return changed
+
+
+def restore_from(emulator: Emulator, snapshot: typing.Any) -> None:
+    """Restores the machine's full state from a snapshot held in memory.
+    Both memories are copied in with a memcpy; ROM is only decoded again
+    if it changed, so restoring a snapshot of the same program many times
+    keeps the work an emulator did on it, such as compiled blocks.
+
+    Args:
+        emulator (Emulator): the machine.
+        snapshot (typing.Any): the snapshot, in any buffer such as bytes
+            or a memory-mapped file.
+    """
+    (magic, version, a, d, pc, program_size, rom_count, ram_count,
+     cycles) = HEADER.unpack_from(snapshot)
+    if magic != MAGIC:
+        raise ValueError("not a snapshot")
+    if version != VERSION:
+        raise ValueError(f"unsupported snapshot version {version}")
+    if rom_count > HackFile.ROM_SIZE or ram_count > RAM_SIZE:
+        raise ValueError("snapshot does not fit in memory")
+    rom_end = HEADER.size + 2 * rom_count
+    ram_end = rom_end + 2 * ram_count
+    with memoryview(snapshot) as view:
+        if ram_end > len(view):
+            raise ValueError("truncated snapshot")
+        with view.cast('B') as snapshot_bytes, \
+                snapshot_bytes[HEADER.size:rom_end] as rom, \
+                snapshot_bytes[rom_end:ram_end] as ram:
+            rom_changed = _copy_words(rom, emulator.rom)
+            _copy_words(ram, emulator.ram)
+    emulator.a, emulator.d, emulator.pc = a, d, pc
+    emulator.cycles = cycles
+    emulator.program_size = program_size
+    if rom_changed:
+        emulator.decode_rom()
+
+
+def restore(emulator: Emulator, path: str) -> None:
+    """Restores the machine's full state from a snapshot file, which is
+    memory-mapped rather than read.
+
+    Args:
+        emulator (Emulator): the machine.
+        path (str): path of the snapshot file.
+    """
+    with open(path, 'rb') as snapshot_file, \
+            mmap.mmap(snapshot_file.fileno(), 0,
+                      access=mmap.ACCESS_READ) as snapshot:
+        try:
+            restore_from(emulator, snapshot)
+        except ValueError as error:
+            raise ValueError(f"{path}: {error}") from None
+
+
+if "__main__" == __name__:
+    argument_parser = argparse.ArgumentParser(
+        prog="Snapshot", description="Runs a program, e.g. through the "
+                                     "OS's initialisation, and snapshots it.")
+    argument_parser.add_argument("path", help="a .hack or .hackbin file")
+    argument_parser.add_argument(
+        "output", help=f"path of the snapshot, usually ending with "
+                       f"{EXTENSION}")
+    argument_parser.add_argument(
+        "--cycles", type=int, default=-1, metavar="N",
+        help="stop after N instructions")
+    argument_parser.add_argument(
+        "--until", type=int, default=-1, metavar="PC",
+        help="stop when PC reaches this address")
+    arguments = argument_parser.parse_args()
+    if arguments.cycles < 0 and arguments.until < 0:
+        argument_parser.error("give --cycles, --until or both")
+
+    emulator = BlockEmulator(arguments.path)
+    emulator.run_until(arguments.until, arguments.cycles)
+    save(emulator, arguments.output)
+    print(f"{emulator.cycles} cycles, PC={emulator.pc}, "
+          f"{os.path.getsize(arguments.output)} bytes")
@@ -0,0 +1,356 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+import xml.etree.ElementTree as ElementTree
+from ScriptRunner import ScriptRunner
+
+# The repository's root, searched for scripts unless told otherwise
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Where test timings are kept between runs unless told otherwise
+DEFAULT_TIMINGS = os.path.join(
+    os.path.expanduser("~"), ".cache", "nand2tetris-tests", "timings.json")
+
+# Engines a script may need:
+# "cpu": a CPU program, run on the Python emulator by ScriptRunner
+# "hdl": a gate-level chip, run on the course's hardware simulator
+# "vm": VM code, run on the course's VM emulator
+# "interactive": needs a person at the keyboard, never run
+ENGINES = ("cpu", "hdl", "vm", "interactive")
+
+# Engine of the results of scripts that could not be classified
+UNKNOWN_ENGINE = "unknown"
+
+# The course's tool that runs each engine's scripts
+TOOLS = {"hdl": "HardwareSimulator", "vm": "VMEmulator"}
+
+# Chips whose scripts run on the Python emulator
+COMPUTER_CHIPS = ("Computer.hdl",)
+
+LOAD_COMMAND = re.compile(r'^\s*load\b([^,;]*)[,;]', re.MULTILINE)
+UNBOUNDED_REPEAT = re.compile(r'\brepeat\s*\{')
+
+# Statuses of a finished test
+PASSED, FAILED, SKIPPED = "passed", "failed", "skipped"
+
+
+class TestResult(typing.NamedTuple):
+    """The outcome of a single test script."""
+    path: str
+    engine: str
+    status: str   # PASSED, FAILED or SKIPPED
+    message: str
+    seconds: float
+
+
+def find_scripts(paths: typing.Iterable[str]) -> typing.List[str]:
+    """
+    Args:
+        paths (typing.Iterable[str]): .tst files, and directories to search
+            recursively.
+
+    Returns:
+        typing.List[str]: absolute paths of all the .tst files, sorted.
+    """
+    scripts = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, filenames in os.walk(path):
+                scripts.extend(
+                    os.path.join(directory, filename)
+                    for filename in filenames if filename.endswith(".tst"))
+        else:
+            scripts.append(path)
+    return sorted(os.path.abspath(script) for script in scripts)
+
+
+def classify(script_path: str) -> str:
+    """Works out which engine a script needs from what it loads.
+
+    Args:
+        script_path (str): path of a .tst file.
+
+    Returns:
+        str: one of ENGINES.
+    """
+    with open(script_path, 'r') as script_file:
+        source = re.sub(r'//[^\n]*|/\*.*?\*/', " ", script_file.read(),
+                        flags=re.DOTALL)
+    if UNBOUNDED_REPEAT.search(source) or "compare-to" not in source:
+        return "interactive"
+    load = LOAD_COMMAND.search(source)
+    loaded = load.group(1).strip() if load else ""
+    extension = os.path.splitext(loaded)[1].lower()
+    if extension in (".asm", ".hack", ".hackbin") \
+            or loaded in COMPUTER_CHIPS:
+        return "cpu"
+    if extension == ".hdl":
+        return "hdl"
+    # .vm files, and directories of them (a bare load means the script's)
+    return "vm"
+
+
+def find_tool(engine: str) -> typing.Optional[str]:
+    """Finds the course's tool for an engine, in the directory named by the
+    NAND2TETRIS_TOOLS environment variable or on the PATH.
+
+    Args:
+        engine (str): "hdl" or "vm".
+
+    Returns:
+        typing.Optional[str]: the tool's path, or None if it is missing.
+    """
+    for name in (TOOLS[engine] + ".sh", TOOLS[engine]):
+        tools_directory = os.environ.get("NAND2TETRIS_TOOLS")
+        if tools_directory is not None:
+            path = os.path.join(tools_directory, name)
+            if os.access(path, os.X_OK):
+                return path
+        path = shutil.which(name)
+        if path is not None:
+            return path
+    return None
+
+
+def run_test(script_path: str,
+             output_directory: typing.Optional[str] = None) -> TestResult:
+    """Classifies a single test script and runs it on the engine it needs,
+    without writing into the script's directory. Both happen in the
+    worker, so a script that cannot be read only fails itself.
+
+    Args:
+        script_path (str): path of the .tst file.
+        output_directory (typing.Optional[str]): if given, CPU-level
+            scripts write their output files to this directory.
+
+    Returns:
+        TestResult: the outcome.
+    """
+    start = time.perf_counter()
+    try:
+        engine = classify(script_path)
+    except (OSError, ValueError) as error:
+        return TestResult(script_path, UNKNOWN_ENGINE, FAILED,
+                          f"cannot classify: {error}", 0.0)
+    if engine == "cpu":
+        result = ScriptRunner(script_path, output_directory).run()
+        return TestResult(script_path, engine,
+                          PASSED if result.passed else FAILED,
+                          result.message, result.seconds)
+    if engine == "interactive":
+        return TestResult(script_path, engine, SKIPPED,
+                          "needs a person at the keyboard", 0.0)
+    tool = find_tool(engine)
+    if tool is None:
+        return TestResult(script_path, engine, SKIPPED,
+                          f"{TOOLS[engine]} not found", 0.0)
+    # The course's tools write the output file next to the script, so
+    # they run on a copy of its directory
+    with tempfile.TemporaryDirectory() as directory:
+        copy = os.path.join(directory, "test")
+        shutil.copytree(os.path.dirname(os.path.abspath(script_path)), copy)
+        completed = subprocess.run(
+            [tool, os.path.join(copy, os.path.basename(script_path))],
+            capture_output=True, text=True)
+    message = (completed.stdout + completed.stderr).strip()
+    passed = completed.returncode == 0 and "successfully" in message
+    return TestResult(script_path, engine, PASSED if passed else FAILED,
+                      message.splitlines()[-1] if message else "",
+                      time.perf_counter() - start)
+
+
+def load_timings(timings_path: str) -> typing.Dict[str, float]:
+    """
+    Args:
+        timings_path (str): path of the timings file.
+
+    Returns:
+        typing.Dict[str, float]: seconds each test took in earlier runs, by
+        path relative to the root; empty if there is no timings file yet.
+    """
+    try:
+        with open(timings_path, 'r') as timings_file:
+            return json.load(timings_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_timings(timings_path: str, results: typing.List[TestResult],
+                 timings: typing.Dict[str, float]) -> None:
+    """Records how long each test that ran took, for future scheduling.
+
+    Args:
+        timings_path (str): path of the timings file.
+        results (typing.List[TestResult]): this run's results.
+        timings (typing.Dict[str, float]): the earlier timings, updated in
+            place.
+    """
+    for result in results:
+        if result.status != SKIPPED:
+            timings[os.path.relpath(result.path, ROOT)] = result.seconds
+    os.makedirs(os.path.dirname(timings_path), exist_ok=True)
+    with open(timings_path, 'w') as timings_file:
+        json.dump(timings, timings_file, indent=2, sort_keys=True)
+
+
+def run_farm(script_paths: typing.List[str], jobs: typing.Optional[int],
+             timings: typing.Dict[str, float],
+             output_directory: typing.Optional[str] = None
+             ) -> typing.List[TestResult]:
+    """Runs all the given scripts on a pool of worker processes, longest
+    first according to the given timings, so a long test never starts last.
+    Tests without a timing are assumed to be long.
+
+    Args:
+        script_paths (typing.List[str]): paths of the .tst files.
+        jobs (typing.Optional[int]): number of worker processes, the number
+            of CPUs if None.
+        timings (typing.Dict[str, float]): seconds each test took before.
+        output_directory (typing.Optional[str]): if given, CPU-level
+            scripts write their output files to this directory.
+
+    Returns:
+        typing.List[TestResult]: the results, in the order of script_paths.
+    """
+    order = sorted(script_paths, key=lambda path: -timings.get(
+        os.path.relpath(path, ROOT), float("inf")))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {path: pool.submit(run_test, path, output_directory)
+                   for path in order}
+        return [collect(path, futures[path]) for path in script_paths]
+
+
+def collect(script_path: str,
+            future: concurrent.futures.Future) -> TestResult:
+    """Waits for a test to finish. A test whose worker raised an exception
+    failed, and the rest of the farm goes on.
+
+    Args:
+        script_path (str): path of the .tst file.
+        future (concurrent.futures.Future): the test's run_test call.
+
+    Returns:
+        TestResult: the outcome.
+    """
+    try:
+        return future.result()
+    except Exception as error:
+        return TestResult(script_path, UNKNOWN_ENGINE, FAILED,
+                          f"{type(error).__name__}: {error}", 0.0)
+
+
+def json_report(results: typing.List[TestResult], seconds: float) -> dict:
+    """
+    Args:
+        results (typing.List[TestResult]): the results.
+        seconds (float): the run's total wall time.
+
+    Returns:
+        dict: a JSON report of the run.
+    """
+    return {
+        "seconds": seconds,
+        "summary": {status: sum(result.status == status for result in results)
+                    for status in (PASSED, FAILED, SKIPPED)},
+        "tests": [dict(result._asdict(), path=os.path.relpath(
+            result.path, ROOT)) for result in results],
+    }
+
+
+def junit_report(results: typing.List[TestResult],
+                 seconds: float) -> ElementTree.ElementTree:
+    """
+    Args:
+        results (typing.List[TestResult]): the results.
+        seconds (float): the run's total wall time.
+
+    Returns:
+        ElementTree.ElementTree: a JUnit-style XML report of the run, with
+        one test case per script, classed by its directory.
+    """
+    suite = ElementTree.Element("testsuite", {
+        "name": "nand2tetris",
+        "tests": str(len(results)),
+        "failures": str(sum(result.status == FAILED for result in results)),
+        "skipped": str(sum(result.status == SKIPPED for result in results)),
+        "time": f"{seconds:.3f}",
+    })
+    for result in results:
+        relative = os.path.relpath(result.path, ROOT)
+        case = ElementTree.SubElement(suite, "testcase", {
+            "classname": os.path.dirname(relative).replace(os.sep, "."),
+            "name": os.path.basename(relative),
+            "time": f"{result.seconds:.3f}",
+        })
+        if result.status == FAILED:
+            ElementTree.SubElement(case, "failure", {
+                "message": result.message})
+        elif result.status == SKIPPED:
+            ElementTree.SubElement(case, "skipped", {
+                "message": result.message})
+    return ElementTree.ElementTree(suite)
+
+
+if "__main__" == __name__:
+    argument_parser = argparse.ArgumentParser(prog="TestFarm")
+    argument_parser.add_argument(
+        "paths", nargs="*", default=[ROOT],
+        help=".tst files or directories to search (default: the repository)")
+    argument_parser.add_argument(
+        "--jobs", type=int, default=None, metavar="N",
+        help="number of worker processes (default: one per CPU)")
+    argument_parser.add_argument(
+        "--json", metavar="FILE", help="write a JSON report")
+    argument_parser.add_argument(
+        "--junit", metavar="FILE", help="write a JUnit-style XML report")
+    argument_parser.add_argument(
+        "--timings", default=DEFAULT_TIMINGS, metavar="FILE",
+        help=f"timings of earlier runs, used to schedule the longest tests "
+             f"first and updated afterwards (default {DEFAULT_TIMINGS})")
+    argument_parser.add_argument(
+        "--output-dir", metavar="DIR",
+        help="write the output files of CPU-level scripts to this directory; "
+             "by default they are only compared in memory")
+    arguments = argument_parser.parse_args()
+    if arguments.output_dir:
+        os.makedirs(arguments.output_dir, exist_ok=True)
+
+    all_scripts = find_scripts(arguments.paths)
+    saved_timings = load_timings(arguments.timings)
+    farm_start = time.perf_counter()
+    farm_results = run_farm(all_scripts, arguments.jobs, saved_timings,
+                            arguments.output_dir)
+    farm_seconds = time.perf_counter() - farm_start
+    save_timings(arguments.timings, farm_results, saved_timings)
+
+    for farm_result in farm_results:
+        print(f"{farm_result.status.upper():7} {farm_result.engine:11} "
+              f"{os.path.relpath(farm_result.path, ROOT)} "
+              f"({farm_result.seconds:.2f}s) {farm_result.message}")
+    report = json_report(farm_results, farm_seconds)
+    print(", ".join(f"{count} {status}"
+                    for status, count in report["summary"].items())
+          + f", {farm_seconds:.2f}s")
+    if arguments.json:
+        with open(arguments.json, 'w') as json_file:
+            json.dump(report, json_file, indent=2)
+    if arguments.junit:
+        junit_report(farm_results, farm_seconds).write(
+            arguments.junit, encoding="unicode", xml_declaration=True)
+    if report["summary"][FAILED]:
+        sys.exit(1)
@@ -0,0 +1,16 @@
+// This file is part of nand2tetris, as taught in The Hebrew University, and
+// was written by Aviv Yaish. It is an extension to the specifications given
+// [here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+// as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+// Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+
+// Regression case of the peephole optimizer: stores 1 in R1.
+// constant_d turns the first @1 / D=A into D=1, after which A no longer
+// holds 1, so redundant_load must keep the second @1.
+@1
+D=A
+@1
+M=D
+(END)
+@END
+0;JMP
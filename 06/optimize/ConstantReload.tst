@@ -0,0 +1,17 @@
+// This file is part of nand2tetris, as taught in The Hebrew University, and
+// was written by Aviv Yaish. It is an extension to the specifications given
+// [here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+// as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+// Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+
+load ConstantReload.asm,
+output-file ConstantReload.out,
+compare-to ConstantReload.cmp,
+output-list RAM[0]%D2.6.2 RAM[1]%D2.6.2;
+
+set RAM[0] 0,
+set RAM[1] 0;
+repeat 10 {
+  ticktock;
+}
+output;
@@ -0,0 +1,46 @@
+#!/bin/bash
+
+# Runs the CPU-level test scripts of projects 04 and 05 on the Python
+# emulators through ScriptRunner: once on the plain interpreter, and once
+# on the basic-block translator.
+
+cd "$(dirname "$0")" || exit 1
+status=0
+
+echo "Testing the emulator on Add, Max and Rect..."
+echo "============================================="
+
+# Each program is run both on Computer.hdl and as external machine code
+for program in Add Max Rect; do
+    for script in ../05/Computer${program}.tst ../05/Computer${program}-external.tst; do
+        python3 ScriptRunner.py --interpreter "$script" || status=1
+        python3 ScriptRunner.py "$script" || status=1
+    done
+done
+
+echo ""
+echo "Testing the 04 programs..."
+echo "=========================="
+
+# Fill.tst needs a person at the keyboard, FillAutomatic.tst does not
+for script in ../04/fill/FillAutomatic.tst ../04/mult/Mult.tst ../04/swap/Swap.tst; do
+    python3 ScriptRunner.py --interpreter "$script" || status=1
+    python3 ScriptRunner.py "$script" || status=1
+done
+
+echo ""
+echo "Testing the peephole optimizer..."
+echo "================================="
+
+# Regression cases of the optimizer, and the 04 programs once optimized
+for script in optimize/*.tst ../04/fill/FillAutomatic.tst ../04/mult/Mult.tst ../04/swap/Swap.tst; do
+    python3 ScriptRunner.py --optimize "$script" || status=1
+done
+
+echo ""
+if [ $status -eq 0 ]; then
+    echo "Testing complete!"
+else
+    echo "Some tests failed."
+fi
+exit $status
@@ -0,0 +1,527 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import array
+import os
+import time
+import typing
+from Parser import Parser
+
+# The standard mapping of the VM onto the Hack RAM, as in CodeWriter
+RAM_SIZE = 32768
+SP, LCL, ARG, THIS, THAT = 0, 1, 2, 3, 4
+TEMP = 5
+STATIC = 16
+STACK = 256
+
+# Segments whose base address is held in RAM, by the address holding it
+BASE_POINTERS = {"local": LCL, "argument": ARG, "this": THIS, "that": THAT}
+# Segments at fixed addresses, by their first address and size
+FIXED_SEGMENTS = {"pointer": (THIS, 2), "temp": (TEMP, 8)}
+
+# Blocks end after this many commands even without a jump
+MAX_BLOCK_SIZE = 256
+
+# Python expressions of the arithmetic commands, in terms of their
+# operands x (below the top of the stack) and y (the top), and of sx and sy,
+# the operands with their sign bit flipped, which compare as signed values
+BINARY_EXPRESSIONS = {
+    "add": "({x} + {y}) & 0xFFFF",
+    "sub": "({x} - {y}) & 0xFFFF",
+    "and": "{x} & {y}",
+    "or": "{x} | {y}",
+    "eq": "0xFFFF if {x} == {y} else 0",
+    "gt": "0xFFFF if {sx} > {sy} else 0",
+    "lt": "0xFFFF if {sx} < {sy} else 0",
+}
+UNARY_EXPRESSIONS = {
+    "neg": "-{y} & 0xFFFF",
+    "not": "{y} ^ 0xFFFF",
+    "shiftleft": "({y} << 1) & 0xFFFF",
+    "shiftright": "{y} >> 1 | {y} & 0x8000",
+}
+# Python conditions for when the results of comparisons, and of logical
+# commands on such results, are true (0xFFFF) rather than false (0). Here
+# x and y are the operands' own conditions in the logical commands
+CONDITIONS = {
+    "eq": "{x} == {y}",
+    "gt": "{sx} > {sy}",
+    "lt": "{sx} < {sy}",
+    "not": "not ({y})",
+    "and": "({x}) and ({y})",
+    "or": "({x}) or ({y})",
+}
+
+
+class Command(typing.NamedTuple):
+    """A parsed VM command. Labels are not commands: jumps go to the
+    command that follows the label."""
+    kind: str      # the parser's command type, e.g. "C_PUSH"
+    arg1: str      # the segment, function, label or arithmetic command
+    arg2: int      # the index, or the number of arguments or locals
+    address: int   # RAM address of a static, or index of a jump's target
+
+
+class Block(typing.NamedTuple):
+    """A compiled run of commands."""
+    function: typing.Callable  # f(ram) -> index of the next command
+    start: int                 # index of the first command
+    end: int                   # one past the index of the last one
+    source: str                # the generated Python code, for debugging
+
+
+class VMEmulator:
+    """Runs VM programs directly, without translating them to assembly.
+
+    All of the VM's state lives in a single 32K-word RAM laid out as the
+    translator lays it out: SP, LCL, ARG, THIS and THAT at addresses 0-4,
+    temp at 5-12, statics from 16, the stack from 256, and the heap and
+    memory maps above it. The commands of every loaded file are kept in one
+    list, and the VM's program counter is an index into it; return
+    addresses on the stack are such indices.
+
+    Like BlockEmulator, runs of commands without jumps are translated into
+    Python functions the first time they are reached. Values pushed and
+    popped within a run never touch RAM: they become Python expressions,
+    and only those still on the stack when the run ends are stored. So
+    while SP, the segments and the live part of the stack always match
+    the translated program's, the words above SP may differ. Runs that
+    would stop in the middle of a block finish one command at a time, so
+    results are exact to the command.
+    """
+
+    def __init__(self, paths: typing.Sequence[str] = ()) -> None:
+        """Creates a machine with cleared RAM.
+
+        Args:
+            paths (typing.Sequence[str]): .vm files, or directories of
+                them, to load.
+        """
+        self.ram = array.array('H', bytes(2 * RAM_SIZE))
+        self.commands: typing.List[Command] = []
+        self.functions: typing.Dict[str, int] = {}
+        self.statics: typing.Dict[typing.Tuple[str, int], int] = {}
+        self.jump_targets: typing.Set[int] = set()
+        self.blocks: typing.Dict[int, Block] = {}
+        self.single_steps: typing.Dict[int, Block] = {}
+        self.pc = 0
+        self.steps = 0
+        for path in paths:
+            self.load(path)
+
+    def load(self, path: str) -> None:
+        """Adds the commands of a .vm file, or of every .vm file in a
+        directory, to the program, and resets the machine. Load a compiled
+        program and the OS's .vm files by loading both directories.
+
+        Args:
+            path (str): path of a .vm file or a directory.
+        """
+        if os.path.isdir(path):
+            file_paths = [os.path.join(path, filename)
+                          for filename in sorted(os.listdir(path))
+                          if filename.endswith(".vm")]
+        else:
+            file_paths = [path]
+        for file_path in file_paths:
+            with open(file_path, 'r') as input_file:
+                try:
+                    self._add_file(os.path.splitext(
+                        os.path.basename(file_path))[0], Parser(input_file))
+                except ValueError as error:
+                    raise ValueError(f"{file_path}: {error}") from None
+        self.blocks = {}
+        self.single_steps = {}
+        self.reset()
+
+    def _add_file(self, name: str, parser: Parser) -> None:
+        """Adds the commands of a parsed file to the program.
+
+        Args:
+            name (str): the file's name without its extension, which
+                qualifies its static variables.
+            parser (Parser): the file's parser.
+        """
+        first = len(self.commands)
+        function = ""
+        labels: typing.Dict[str, int] = {}
+        while parser.has_more_commands():
+            parser.advance()
+            kind = parser.command_type()
+            arg1 = parser.arg1() if kind != "C_RETURN" else ""
+            arg2 = parser.arg2() if kind in (
+                "C_PUSH", "C_POP", "C_FUNCTION", "C_CALL") else 0
+            address = -1
+            if kind == "C_LABEL":
+                labels[f"{function}${arg1}"] = len(self.commands)
+                self.jump_targets.add(len(self.commands))
+                continue
+            if kind == "C_FUNCTION":
+                if arg1 in self.functions:
+                    raise ValueError(f"function {arg1} is defined twice")
+                function = arg1
+                self.functions[arg1] = len(self.commands)
+                self.jump_targets.add(len(self.commands))
+            elif kind in ("C_PUSH", "C_POP"):
+                if kind == "C_POP" and arg1 == "constant":
+                    raise ValueError("cannot pop into constant")
+                if arg1 == "static":
+                    address = self.statics.setdefault(
+                        (name, arg2), STATIC + len(self.statics))
+                elif arg1 in FIXED_SEGMENTS:
+                    if not 0 <= arg2 < FIXED_SEGMENTS[arg1][1]:
+                        raise ValueError(f"{arg1} {arg2} is out of range")
+                elif arg1 not in BASE_POINTERS and arg1 != "constant":
+                    raise ValueError(f"unknown segment {arg1}")
+            elif kind in ("C_GOTO", "C_IF"):
+                arg1 = f"{function}${arg1}"
+            self.commands.append(Command(kind, arg1, arg2, address))
+
+        for index in range(first, len(self.commands)):
+            command = self.commands[index]
+            if command.kind in ("C_GOTO", "C_IF"):
+                if command.arg1 not in labels:
+                    raise ValueError(f"unknown label {command.arg1}")
+                self.commands[index] = command._replace(
+                    address=labels[command.arg1])
+        # Return addresses are stored in RAM words
+        if len(self.commands) > 0xFFFF:
+            raise ValueError("program does not fit in memory")
+
+    @property
+    def halted(self) -> bool:
+        """bool: whether the program ran past its last command, or returned
+        from Sys.init."""
+        return self.pc >= len(self.commands)
+
+    def reset(self) -> None:
+        """Restarts the program. As with the translator's bootstrap code,
+        if the program has a Sys.init function then SP is set to 256 and
+        Sys.init is called, returning to past the last command; otherwise
+        the program starts at its first command. RAM keeps its values.
+        """
+        self.pc = 0
+        if "Sys.init" in self.functions:
+            ram = self.ram
+            ram[SP] = STACK
+            self._call(len(self.commands), 0)
+            self.pc = self.functions["Sys.init"]
+
+    def _call(self, return_index: int, arguments: int) -> None:
+        """Pushes a call's frame, and sets ARG and LCL for the callee.
+
+        Args:
+            return_index (int): the command to return to.
+            arguments (int): the number of arguments already pushed.
+        """
+        ram = self.ram
+        sp = ram[SP]
+        ram[sp] = return_index
+        for offset in range(1, 5):
+            ram[sp + offset] = ram[offset]
+        ram[ARG] = (sp - arguments) & 0xFFFF
+        ram[LCL] = ram[SP] = (sp + 5) & 0xFFFF
+
+    def step(self) -> None:
+        """Runs a single command."""
+        self.run(1)
+
+    def run(self, steps: int) -> int:
+        """Runs the given number of commands, or until the program halts.
+
+        Args:
+            steps (int): number of commands to run.
+
+        Returns:
+            int: the number of commands run.
+        """
+        return self._run(steps, -1)
+
+    def run_until(self, index: int, max_steps: int = -1) -> int:
+        """Runs until the program counter reaches the given command, or the
+        program halts.
+
+        Args:
+            index (int): the command to stop at, before running it, e.g.
+                self.functions["Sys.halt"].
+            max_steps (int): if not negative, stop after this many commands
+                even if the command was not reached.
+
+        Returns:
+            int: the number of commands run.
+        """
+        return self._run(max_steps, index)
+
+    def _run(self, steps: int, stop: int) -> int:
+        """The block dispatch loop behind run and run_until.
+
+        Args:
+            steps (int): stop after this many commands, never if negative.
+            stop (int): stop when the program counter reaches this command,
+                never if negative.
+
+        Returns:
+            int: the number of commands run.
+        """
+        blocks, single_steps, ram = self.blocks, self.single_steps, self.ram
+        end = len(self.commands)
+        pc = self.pc
+        executed = 0
+        while executed != steps and pc != stop and pc < end:
+            block = blocks.get(pc)
+            if block is None:
+                block = blocks[pc] = self.compile_block(pc, MAX_BLOCK_SIZE)
+            if ((steps >= 0 and executed + block.end - pc > steps)
+                    or pc < stop < block.end):
+                # The run ends inside this block: step through it
+                block = single_steps.get(pc)
+                if block is None:
+                    block = single_steps[pc] = self.compile_block(pc, 1)
+            executed += block.end - pc
+            pc = block.function(ram)
+        self.pc = pc
+        self.steps += executed
+        return executed
+
+    def compile_block(self, start: int, limit: int) -> Block:
+        """Translates the commands from the given one up to the next jump,
+        call, return or jump target into a Python function.
+
+        While translating, the values the block pushed and has not yet
+        popped are kept as a list of Python expressions, of constants and
+        of locals holding the words it read from RAM. The expressions have
+        no side effects and each is popped at most once, so arithmetic
+        nests them, and constant operands are folded.
+
+        Args:
+            start (int): index of the block's first command.
+            limit (int): the most commands to translate.
+
+        Returns:
+            Block: the compiled block.
+        """
+        lines = [f"def block_{start}(ram):"]
+        # Values pushed by the block and not yet stored, above the words
+        # of the stack in RAM, whose top is this far from SP's initial value
+        stack: typing.List[str] = []
+        # Conditions of the values on the stack that are booleans
+        conditions: typing.Dict[str, str] = {}
+        stored = 0
+        words_read = 0
+        values_bound = 0
+        uses_sp = False
+
+        def sp_plus(offset: int) -> str:
+            nonlocal uses_sp
+            uses_sp = True
+            return f"sp + {offset}"
+
+        def read(address: str) -> str:
+            nonlocal words_read
+            words_read += 1
+            lines.append(f"    m{words_read} = ram[{address}]")
+            return f"m{words_read}"
+
+        def bind(value: str) -> str:
+            """Computes the value into a local of its own, so expressions
+            can use it more than once without their source doubling."""
+            nonlocal values_bound
+            if value.isdigit() or value.isidentifier():
+                return value
+            values_bound += 1
+            lines.append(f"    t{values_bound} = {value}")
+            return f"t{values_bound}"
+
+        def pop() -> str:
+            nonlocal stored
+            if stack:
+                return stack.pop()
+            stored -= 1
+            return read(sp_plus(stored))
+
+        def store() -> None:
+            nonlocal stored
+            for value in stack:
+                lines.append(f"    ram[{sp_plus(stored)}] = {value}")
+                stored += 1
+            stack.clear()
+
+        def flush() -> int:
+            """Stores the values still on the stack, and SP. Returns the
+            offset of SP from its value at the block's start."""
+            store()
+            if stored:
+                lines.append(f"    ram[0] = ({sp_plus(stored)}) & 0xFFFF")
+            return stored
+
+        index = start
+        while True:
+            command = self.commands[index]
+            kind, arg1, arg2, address = command
+            index += 1
+            if kind == "C_ARITHMETIC":
+                operands = [pop()]
+                if arg1 in BINARY_EXPRESSIONS:
+                    operands.insert(0, pop())
+                    x, y = operands
+                    value = BINARY_EXPRESSIONS[arg1].format(
+                        x=x, y=y, sx=self._flip_sign(x), sy=self._flip_sign(y))
+                else:
+                    x, y = "", operands[0]
+                    expression = UNARY_EXPRESSIONS[arg1]
+                    if expression.count("{y}") > 1:
+                        y = operands[0] = bind(y)
+                    value = expression.format(y=y)
+                condition = None
+                if arg1 in ("eq", "gt", "lt"):
+                    condition = CONDITIONS[arg1].format(
+                        x=x, y=y, sx=self._flip_sign(x), sy=self._flip_sign(y))
+                elif arg1 in CONDITIONS and all(
+                        operand in conditions for operand in operands):
+                    condition = CONDITIONS[arg1].format(
+                        x=conditions.get(x), y=conditions[y])
+                if condition is not None:
+                    value = f"0xFFFF if {condition} else 0"
+                # Every operand is a constant or a local, so a value whose
+                # operands are all constants can be computed right away
+                if all(operand.isdigit() for operand in operands):
+                    stack.append(str(eval(value)))
+                else:
+                    stack.append(f"({value})")
+                    if condition is not None:
+                        conditions[stack[-1]] = condition
+            elif kind == "C_PUSH":
+                if arg1 == "constant":
+                    stack.append(str(arg2 & 0xFFFF))
+                else:
+                    stack.append(read(self._address(command)))
+            elif kind == "C_POP":
+                value = pop()
+                lines.append(f"    ram[{self._address(command)}] = {value}")
+            elif kind == "C_FUNCTION":
+                # The local segment is read through LCL, so unlike other
+                # pushes its words go straight to RAM
+                stack.extend(["0"] * arg2)
+                store()
+            elif kind == "C_GOTO":
+                flush()
+                lines.append(f"    return {address}")
+                break
+            elif kind == "C_IF":
+                value = pop()
+                flush()
+                if value.isdigit():
+                    lines.append(
+                        f"    return {address if int(value) else index}")
+                else:
+                    condition = conditions.get(value, value)
+                    lines.append(
+                        f"    return {address} if {condition} else {index}")
+                break
+            elif kind == "C_CALL":
+                if arg1 not in self.functions:
+                    raise ValueError(f"call to undefined function {arg1}")
+                top = flush()
+                lines.append(f"    frame = {sp_plus(top)}")
+                lines.append(f"    ram[frame] = {index}")
+                for offset in range(1, 5):
+                    lines.append(f"    ram[frame + {offset}] = ram[{offset}]")
+                lines.append(f"    ram[2] = (frame - {arg2}) & 0xFFFF")
+                lines.append("    ram[1] = ram[0] = (frame + 5) & 0xFFFF")
+                lines.append(f"    return {self.functions[arg1]}")
+                break
+            elif kind == "C_RETURN":
+                # The rest of the stack is dropped, so it is never stored;
+                # the return address is read first, as with no arguments it
+                # is where the return value goes
+                value = pop()
+                lines.append("    frame = ram[1]")
+                lines.append("    return_index = ram[frame - 5]")
+                lines.append(f"    ram[ram[2]] = {value}")
+                lines.append("    ram[0] = (ram[2] + 1) & 0xFFFF")
+                for offset in range(4, 0, -1):
+                    lines.append(
+                        f"    ram[{5 - offset}] = ram[frame - {offset}]")
+                lines.append("    return return_index")
+                break
+            if (index - start >= limit or index == len(self.commands)
+                    or index in self.jump_targets):
+                flush()
+                lines.append(f"    return {index}")
+                break
+
+        if uses_sp:
+            lines.insert(1, "    sp = ram[0]")
+        source = "\n".join(lines) + "\n"
+        namespace: typing.Dict[str, typing.Any] = {}
+        exec(compile(source, f"<block {start}>", "exec"), namespace)
+        return Block(namespace[f"block_{start}"], start, index, source)
+
+    @staticmethod
+    def _flip_sign(operand: str) -> str:
+        """
+        Args:
+            operand (str): a Python expression of a word.
+
+        Returns:
+            str: a Python expression of the word with its sign bit flipped,
+            folded if the word is a constant.
+        """
+        if operand.isdigit():
+            return str(int(operand) ^ 0x8000)
+        return f"{operand} ^ 0x8000"
+
+    @staticmethod
+    def _address(command: Command) -> str:
+        """
+        Args:
+            command (Command): a push or pop of a segment other than
+                constant.
+
+        Returns:
+            str: a Python expression of the RAM address the command
+            accesses.
+        """
+        _, segment, index, address = command
+        if segment == "static":
+            return str(address)
+        if segment in FIXED_SEGMENTS:
+            return str(FIXED_SEGMENTS[segment][0] + index)
+        base = f"ram[{BASE_POINTERS[segment]}]"
+        return f"{base} + {index}" if index else base
+
+
+if "__main__" == __name__:
+    argument_parser = argparse.ArgumentParser(
+        prog="VMEmulator",
+        description="Runs .vm files directly, without translating them.")
+    argument_parser.add_argument(
+        "paths", nargs="+",
+        help=".vm files or directories, e.g. a compiled program and the OS")
+    argument_parser.add_argument(
+        "--steps", type=int, default=-1, metavar="N",
+        help="stop after N commands")
+    argument_parser.add_argument(
+        "--until", default="Sys.halt", metavar="FUNCTION",
+        help="stop when this function is called, if the program has it "
+             "(default Sys.halt)")
+    argument_parser.add_argument(
+        "--ram", default="0-15", metavar="FIRST-LAST",
+        help="range of RAM words to print afterwards (default 0-15)")
+    arguments = argument_parser.parse_args()
+
+    emulator = VMEmulator(arguments.paths)
+    start_time = time.perf_counter()
+    emulator.run_until(emulator.functions.get(arguments.until, -1),
+                       arguments.steps)
+    elapsed = time.perf_counter() - start_time
+    first, last = (int(bound) for bound in arguments.ram.split("-"))
+    for ram_address in range(first, last + 1):
+        print(f"RAM[{ram_address}] = {emulator.ram[ram_address]}")
+    print(f"PC = {emulator.pc}, {emulator.steps} commands, "
+          f"{emulator.steps / max(elapsed, 1e-9):,.0f} commands/s")